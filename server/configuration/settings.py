@@ -48,6 +48,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'controller.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -57,6 +58,20 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Prometheus metrics at /metrics, for these client addresses. Under gunicorn, set PROMETHEUS_MULTIPROC_DIR to a
+# directory that is emptied before each start, so every worker writes its samples there and any worker's /metrics
+# reports the sum
+METRICS_ALLOWED_IPS = os.environ.get('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')
+
+# Request timing: REQUEST_TIMING=true reports the query count, SQL, auth and serializer time of every request in a
+# Server-Timing header and a log line; requests over REQUEST_TIMING_SLOW_MS also log their slowest statements
+REQUEST_TIMING_SLOW_MS = float(os.environ.get('REQUEST_TIMING_SLOW_MS', 500))
+REQUEST_TIMING_SLOW_QUERIES = 5
+
+if os.environ.get('REQUEST_TIMING', 'false') == 'true':
+    # outermost, so the total covers every other middleware
+    MIDDLEWARE.insert(0, 'controller.instrumentation.RequestTimingMiddleware')
+
 ROOT_URLCONF = 'configuration.urls'
 
 TEMPLATES = [
@@ -98,6 +113,33 @@ else:
         'PORT': os.environ.get('POSTGRES_PORT'),
     }
 
+# Caches
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# List responses are keyed by the version of their data (controller/response_cache.py), so writes retire them
+# precisely and TIMEOUT only bounds how long unused entries are kept
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+if os.environ.get('RESPONSE_CACHE', 'locmem') == 'file':
+    # shared by every worker on the host
+    CACHES['responses'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('RESPONSE_CACHE_DIR', BASE_DIR / 'response_cache'),
+        'TIMEOUT': 3600,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+else:
+    CACHES['responses'] = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'responses',
+        'TIMEOUT': 3600,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -141,7 +183,34 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.BasicAuthentication',
-        'rest_framework.authentication.SessionAuthentication',
-    ]
+        'controller.authentication.BasicAuthentication',
+        'controller.authentication.SessionAuthentication',
+        'controller.authentication.ExpiringTokenAuthentication',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'controller.instrumentation.TimedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
+
+# RequestTimingMiddleware lines go to the console, where the process manager collects them
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'controller.timing': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
+# Lifetime of tokens issued by user/login/
+AUTH_TOKEN_LIFETIME_DAYS = int(os.environ.get('AUTH_TOKEN_LIFETIME_DAYS', 30))
+
+# Net worth history older than older_than_days is compacted to the last point per resolution bucket,
+# coarsest rule winning; run `manage.py compact_net_worth` on a schedule to apply it
+NET_WORTH_COMPACTION = [
+    {'older_than_days': 90, 'resolution': 'day'},
+    {'older_than_days': 365, 'resolution': 'week'},
+]
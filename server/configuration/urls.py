@@ -27,6 +27,7 @@ from controller.control import entity_controller
 urlpatterns = [
     path('', views.index, name='home'),
     path('admin/', admin.site.urls, name='admin'),
+    path('metrics', views.metrics, name='metrics'),
 
     # api calls
     # admin
@@ -35,11 +36,14 @@ urlpatterns = [
 
     # user control
     path('user/register/', user_controller.user_register),
+    path('user/login/', user_controller.user_login),
+    path('user/logout/', user_controller.user_logout),
     path('user/details/', user_controller.user_info),
     path('user/modify/', user_controller.user_info),
 
     # pusher and pusher access
     path('pusher/all/', pusher_controller.pusher_all),
+    path('pusher/dashboard/', pusher_controller.pusher_dashboard),
     path('pusher/new/', pusher_controller.pusher_new),
     path('pusher/', pusher_controller.pusher_func),
     path('pusher/access/new', pusher_controller.pusher_access_new),
@@ -51,13 +55,25 @@ urlpatterns = [
     path('encapsulation/', encapsulation_controller.encapsulation_func),
     path('encapsulation/value/new/', encapsulation_controller.encapsulation_value_new),
     path('encapsulation/value/', encapsulation_controller.encapsulation_value_func),
+    path('encapsulation/budget/usage/', encapsulation_controller.budget_usage),
 
     # Net Worth
     path('net_worth/', encapsulation_controller.net_worth_history),
+    path('net_worth/series/', encapsulation_controller.net_worth_series),
 
     # Entities
     path('entity/new/', entity_controller.entity_new),
+    path('entity/bulk/', entity_controller.entity_bulk),
+    path('entity/export/', entity_controller.entity_export),
+    path('entity/import/', entity_controller.entity_import),
+    path('entity/search/', entity_controller.entity_search),
     path('entity/', entity_controller.entity_func),
+
+    # Spending summary
+    path('summary/', entity_controller.entity_summary),
+
+    # Upcoming subscription and bill outflows
+    path('forecast/', entity_controller.entity_forecast),
 ]
 
 urlpatterns = format_suffix_patterns(urlpatterns)
\ No newline at end of file
@@ -0,0 +1,75 @@
+import hashlib
+import secrets
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import authentication, exceptions
+
+from .instrumentation import TimedAuthenticationMixin
+from .lru_cache import ExpiringLRUCache
+from .models import AuthToken
+
+# token digest -> (user, expires); revocations in other workers are seen once the entry expires
+TOKEN_CACHE = ExpiringLRUCache('token', max_size=4096, ttl=60)
+
+
+def token_digest(key):
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def issue_token(user):
+    key = secrets.token_urlsafe(32)
+    token = AuthToken.objects.create(
+        user=user,
+        digest=token_digest(key),
+        expires=timezone.now() + timedelta(days=settings.AUTH_TOKEN_LIFETIME_DAYS)
+    )
+    return key, token
+
+
+def revoke_token(token):
+    TOKEN_CACHE.delete(token.digest)
+    token.delete()
+
+
+def revoke_user_tokens(user):
+    TOKEN_CACHE.delete_where(lambda key, value: value[0].id == user.id)
+    AuthToken.objects.filter(user=user).delete()
+
+
+# DRF's session and basic authentication, timed for RequestTimingMiddleware like the token authentication below
+class SessionAuthentication(TimedAuthenticationMixin, authentication.SessionAuthentication):
+    pass
+
+
+class BasicAuthentication(TimedAuthenticationMixin, authentication.BasicAuthentication):
+    pass
+
+
+class ExpiringTokenAuthentication(TimedAuthenticationMixin, authentication.TokenAuthentication):
+    """
+    'Authorization: Token <key>' authentication against tokens issued by user/login/. Verified tokens are
+    cached in memory, so a request costs a hash and a dictionary lookup instead of a password hash.
+    """
+
+    def authenticate_credentials(self, key):
+        digest = token_digest(key)
+
+        cached = TOKEN_CACHE.get(digest)
+        if cached is None:
+            token = AuthToken.objects.select_related('user').filter(digest=digest).first()
+            if token is None:
+                raise exceptions.AuthenticationFailed("Invalid token.")
+            cached = (token.user, token.expires)
+            TOKEN_CACHE.set(digest, cached)
+
+        # the digest found the entry, so there is nothing left to compare
+        user, expires = cached
+        if expires <= timezone.now():
+            TOKEN_CACHE.delete(digest)
+            raise exceptions.AuthenticationFailed("Token has expired.")
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed("User inactive or deleted.")
+
+        return user, digest
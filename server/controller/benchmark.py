@@ -0,0 +1,354 @@
+import http.client
+import itertools
+import json
+import random
+import threading
+import time
+import uuid
+from datetime import timedelta
+from urllib.parse import urlencode, urlsplit
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError, connection
+from django.test.client import encode_multipart
+from django.utils import timezone
+
+from .authentication import issue_token
+from .models import *
+from .serializers import adjust_rollup
+from .synthetic import SyntheticData
+
+BENCHMARK_PASSWORD = 'benchmark-password'
+
+
+# ------- SEED DATA -------
+def seed_benchmark_data(rows, seed=0):
+    """
+    A synthetic pusher with about `rows` of each entity and value type over the last two years, its user and an
+    admin user for the admin routes. Every user the benchmark creates has the fixture's suffix in its name, and
+    deleting those users removes everything else.
+    """
+    suffix = uuid.uuid4().hex[:8]
+    pusher, (user,) = SyntheticData(seed).pusher(
+        'bench_' + suffix, users=1, years=2, expenses=max(1, rows // 24), incomes=max(1, rows // 24),
+        bills=max(1, rows // 24), subscriptions=10, trades=10, value_hours=max(1, 2 * 8766 // rows))
+    user.set_password(BENCHMARK_PASSWORD)
+    user.save(update_fields=['password'])
+    admin = User.objects.create_superuser('bench_admin_' + suffix, 'bench_admin_%s@bench.test' % suffix,
+                                          BENCHMARK_PASSWORD)
+
+    return {
+        'suffix': suffix,
+        'user': user,
+        'admin': admin,
+        'pusher': pusher,
+        'subscriptions': list(Subscription.objects.filter(pusher=pusher).values_list('item', flat=True)),
+        'token': issue_token(user)[0],
+        'admin_token': issue_token(admin)[0],
+        # disposable expenses are stamped from here on, one microsecond apart, clear of the seeded ones
+        'epoch': timezone.now() - timedelta(days=3650),
+        # numbers the requests of every run against the fixture, keeping the names they create unique
+        'sequence': itertools.count(),
+    }
+
+
+def remove_benchmark_data(fixture):
+    User.objects.filter(username__contains=fixture['suffix']).delete()
+
+
+# ------- SCENARIOS -------
+def request(fixture, method, path, params=None, data=None, format='json', token=None):
+    return {'method': method, 'path': path, 'params': params or {}, 'data': data, 'format': format,
+            'token': fixture['token'] if token is None else token}
+
+
+def disposable_user(fixture, n):
+    # without a usable password, as hashing one would dwarf the request it is built for
+    username = 'bench_%s_n%d' % (fixture['suffix'], n)
+    return User.objects.create_user(username, username + '@bench.test')
+
+
+def disposable_expense(fixture, n):
+    expense = Expense.objects.create(pusher=fixture['pusher'], user=fixture['user'], item='disposable', amount=1,
+                                     party='party', category='other',
+                                     timestamp=fixture['epoch'] + timedelta(microseconds=n))
+    adjust_rollup('expense', expense, 1)
+    return expense
+
+
+def statement(n):
+    # distinct descriptions, so the import's duplicate detection does not skip the rows
+    rows = ["2023-03-%02d,Merchant %d-%d,-%d.50,groceries" % (day, n, day, day) for day in range(1, 11)]
+    return SimpleUploadedFile('statement.csv', ("Date,Description,Amount,Category\n" + "\n".join(rows)).encode())
+
+
+def get_list(path, **params):
+    return lambda fixture, n: request(fixture, 'GET', path, dict(params, pusher_key=fixture['pusher'].key))
+
+
+def expense_data(n):
+    return {'item': 'expense %d' % n, 'amount': '12.00', 'party': 'cafe', 'category': 'café', 'budget': 'food'}
+
+
+def subscription_data(fixture, n):
+    return {'item': fixture['subscriptions'][n % len(fixture['subscriptions'])], 'amount': '%d.99' % (n % 50),
+            'pay_period': 'Monthly', 'start_date': '2023-01-01', 'status': 'active'}
+
+
+def user_modify(fixture, n):
+    user = disposable_user(fixture, n)
+    return request(fixture, 'PUT', '/user/modify/', data={
+        'username': user.username, 'email': user.email, 'password': BENCHMARK_PASSWORD,
+        'first_name': 'bench', 'last_name': str(n)}, token=issue_token(user)[0])
+
+
+def pusher_delete(fixture, n):
+    pusher = Pusher.objects.create(primaryUser=fixture['user'], name='disposable', key=uuid.uuid4().hex[:8].upper())
+    PusherAccess.objects.create(user=fixture['user'], pusher=pusher)
+    return request(fixture, 'DELETE', '/pusher/', {'pusher_key': pusher.key})
+
+
+def pusher_access_delete(fixture, n):
+    user = disposable_user(fixture, n)
+    PusherAccess.objects.create(user=user, pusher=fixture['pusher'])
+    return request(fixture, 'DELETE', '/pusher/access/', {'pusher_key': fixture['pusher'].key,
+                                                          'username': user.username})
+
+
+def encapsulation_delete(fixture, n):
+    budget = Budget.objects.create(pusher=fixture['pusher'], name='tmp %d' % n, alloc_amt=1,
+                                   pay_start='2023-01-01')
+    return request(fixture, 'DELETE', '/encapsulation/', {'pusher_key': fixture['pusher'].key, 'type': 'budget',
+                                                          'name': budget.name})
+
+
+def entity_delete(fixture, n):
+    expense = disposable_expense(fixture, n)
+    return request(fixture, 'DELETE', '/entity/', {'pusher_key': fixture['pusher'].key, 'type': 'expense',
+                                                   'timestamp': expense.timestamp.strftime('%Y-%m-%dT%H:%M:%S.%fZ')})
+
+
+def bulk_records(n):
+    return [dict(expense_data(n), type='expense') if i % 2 else
+            {'type': 'income', 'item': 'income %d' % n, 'amount': '20.00', 'source': 'bench', 'category': 'gift'}
+            for i in range(20)]
+
+
+# (name, kind, build) for every route in configuration/urls.py. build(fixture, n) prepares whatever the request
+# needs, untimed, and returns it; n is unique within the fixture. Reads and writes make up the mixed workload, while
+# account administration (users, pushers, access) only runs on its own.
+SCENARIOS = [
+    ('GET /', 'read', lambda fixture, n: request(fixture, 'GET', '/')),
+    ('GET /admin/', 'read', lambda fixture, n: request(fixture, 'GET', '/admin/')),
+    ('GET /metrics', 'read', lambda fixture, n: request(fixture, 'GET', '/metrics')),
+
+    ('GET /users/all/', 'admin', lambda fixture, n: request(fixture, 'GET', '/users/all/',
+                                                            token=fixture['admin_token'])),
+    ('DELETE /user/delete/', 'admin', lambda fixture, n: request(
+        fixture, 'DELETE', '/user/delete/', data={'user': disposable_user(fixture, n).username},
+        token=fixture['admin_token'])),
+    ('POST /user/register/', 'admin', lambda fixture, n: request(fixture, 'POST', '/user/register/', data={
+        'username': 'bench_%s_n%d' % (fixture['suffix'], n), 'email': 'bench_%d@bench.test' % n,
+        'password': BENCHMARK_PASSWORD, 'first_name': 'bench', 'last_name': str(n)}, token='')),
+    ('POST /user/login/', 'admin', lambda fixture, n: request(fixture, 'POST', '/user/login/', data={
+        'username': fixture['user'].username, 'password': BENCHMARK_PASSWORD}, token='')),
+    ('POST /user/logout/', 'admin', lambda fixture, n: request(fixture, 'POST', '/user/logout/',
+                                                               token=issue_token(fixture['user'])[0])),
+    ('GET /user/details/', 'read', lambda fixture, n: request(fixture, 'GET', '/user/details/')),
+    ('PUT /user/modify/', 'admin', user_modify),
+
+    ('GET /pusher/all/', 'read', lambda fixture, n: request(fixture, 'GET', '/pusher/all/')),
+    ('GET /pusher/dashboard/', 'read', get_list('/pusher/dashboard/')),
+    ('POST /pusher/new/', 'admin', lambda fixture, n: request(fixture, 'POST', '/pusher/new/',
+                                                              data={'name': 'pusher %d' % n})),
+    ('GET /pusher/', 'read', get_list('/pusher/')),
+    ('PUT /pusher/', 'admin', lambda fixture, n: request(fixture, 'PUT', '/pusher/', data={
+        'key': fixture['pusher'].key, 'name': 'benchmark', 'user': fixture['user'].id})),
+    ('DELETE /pusher/', 'admin', pusher_delete),
+    ('POST /pusher/access/new', 'admin', lambda fixture, n: request(fixture, 'POST', '/pusher/access/new', data={
+        'pusher_key': fixture['pusher'].key, 'username': disposable_user(fixture, n).username})),
+    ('GET /pusher/access/all/', 'read', get_list('/pusher/access/all/')),
+    ('GET /pusher/access/', 'read', get_list('/pusher/access/')),
+    ('DELETE /pusher/access/', 'admin', pusher_access_delete),
+
+    ('POST /encapsulation/new/', 'write', lambda fixture, n: request(fixture, 'POST', '/encapsulation/new/', data={
+        'pusher_key': fixture['pusher'].key, 'type': 'fund', 'name': 'fund %d' % n,
+        'data': {'goal_amt': '500.00', 'priority': 2, 'category': 'savings'}})),
+    ('GET /encapsulation/ budget', 'read', get_list('/encapsulation/', type='budget')),
+    ('PUT /encapsulation/', 'write', lambda fixture, n: request(fixture, 'PUT', '/encapsulation/', data={
+        'pusher_key': fixture['pusher'].key, 'type': 'budget', 'name': 'food', 'data': {
+            'alloc_amt': '%d.00' % (400 + n % 100), 'priority': 1, 'pay_period': 'Monthly',
+            'pay_start': '2023-01-01', 'category': 'food'}})),
+    ('PATCH /encapsulation/', 'write', lambda fixture, n: request(fixture, 'PATCH', '/encapsulation/', data={
+        'pusher_key': fixture['pusher'].key, 'type': 'fund', 'name': 'car',
+        'data': {'goal_amt': '%d.00' % (5000 + n % 100)}})),
+    ('DELETE /encapsulation/', 'write', encapsulation_delete),
+    ('POST /encapsulation/value/new/', 'write', lambda fixture, n: request(
+        fixture, 'POST', '/encapsulation/value/new/', data={
+            'pusher_key': fixture['pusher'].key, 'type': 'account', 'account': 'checking',
+            'value': '%d.00' % (1000 + n % 500)})),
+    ('GET /encapsulation/value/ account', 'read', get_list('/encapsulation/value/', type='account', name='checking')),
+    ('GET /encapsulation/budget/usage/', 'read', get_list('/encapsulation/budget/usage/')),
+
+    ('GET /net_worth/', 'read', get_list('/net_worth/')),
+    ('GET /net_worth/series/ day', 'read', get_list('/net_worth/series/', resolution='day')),
+    ('GET /net_worth/series/ lttb', 'read', get_list('/net_worth/series/', resolution='lttb', points=200)),
+
+    ('POST /entity/new/', 'write', lambda fixture, n: request(fixture, 'POST', '/entity/new/', data={
+        'pusher_key': fixture['pusher'].key, 'type': 'expense', 'data': expense_data(n)})),
+    ('POST /entity/bulk/', 'write', lambda fixture, n: request(fixture, 'POST', '/entity/bulk/', data={
+        'pusher_key': fixture['pusher'].key, 'data': bulk_records(n)})),
+    ('GET /entity/export/ expense', 'read', get_list('/entity/export/', type='expense')),
+    ('POST /entity/import/', 'write', lambda fixture, n: request(fixture, 'POST', '/entity/import/', data={
+        'pusher_key': fixture['pusher'].key, 'file': statement(n)}, format='multipart')),
+    ('GET /entity/search/ expense', 'read', get_list('/entity/search/', type='expense', q='groc 1')),
+    ('GET /entity/ expense', 'read', get_list('/entity/', type='expense')),
+    ('GET /entity/ expense filtered', 'read', get_list('/entity/', type='expense', category='groceries',
+                                                       min_amount='20', sort='-amount')),
+    ('GET /entity/ income', 'read', get_list('/entity/', type='income')),
+    ('GET /entity/ paycheck', 'read', get_list('/entity/', type='paycheck')),
+    ('GET /entity/ bill', 'read', get_list('/entity/', type='bill')),
+    ('GET /entity/ subscription', 'read', get_list('/entity/', type='subscription')),
+    ('PUT /entity/', 'write', lambda fixture, n: request(fixture, 'PUT', '/entity/', data={
+        'pusher_key': fixture['pusher'].key, 'type': 'subscription', 'data': subscription_data(fixture, n)})),
+    ('PATCH /entity/', 'write', lambda fixture, n: request(fixture, 'PATCH', '/entity/', data={
+        'pusher_key': fixture['pusher'].key, 'type': 'subscription',
+        'data': {'item': subscription_data(fixture, n)['item'], 'amount': '%d.49' % (n % 50)}})),
+    ('DELETE /entity/', 'write', entity_delete),
+
+    ('GET /summary/', 'read', get_list('/summary/')),
+    ('GET /forecast/', 'read', get_list('/forecast/')),
+]
+
+
+def encode_request(request):
+    """
+    The (method, url, body, headers) a scenario request is sent as, over HTTP or through the test client.
+    """
+    url = request['path']
+    if request['params']:
+        url += '?' + urlencode(request['params'])
+
+    headers = {}
+    if request['token']:
+        headers['Authorization'] = 'Token ' + request['token']
+
+    body = b''
+    if request['data'] is not None:
+        if request['format'] == 'multipart':
+            boundary = uuid.uuid4().hex
+            body = encode_multipart(boundary, request['data'])
+            headers['Content-Type'] = 'multipart/form-data; boundary=' + boundary
+        else:
+            body = json.dumps(request['data']).encode()
+            headers['Content-Type'] = 'application/json'
+    return request['method'], url, body, headers
+
+
+# ------- LOAD -------
+class QueryCounter:
+    """
+    WSGI wrapper for the in-process server counting the queries of each request, by the scenario named in its
+    X-Benchmark-Scenario header.
+    """
+
+    def __init__(self, application):
+        self.application = application
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        queries = [0]
+
+        def count(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count):
+            response = self.application(environ, start_response)
+            # streamed bodies run their queries while being iterated
+            body = b''.join(response)
+            response.close()
+
+        scenario = environ.get('HTTP_X_BENCHMARK_SCENARIO')
+        if scenario is not None:
+            with self.lock:
+                self.counts.setdefault(scenario, []).append(queries[0])
+        return [body]
+
+
+def drive(base_url, fixture, pick, concurrency, seconds, seed=0):
+    """
+    Sends requests from `concurrency` connections for `seconds`, each for the scenario pick(rng) returns. Returns
+    the latencies and status codes of every scenario that ran.
+    """
+    parts = urlsplit(base_url)
+    results = {}
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        client = http.client.HTTPConnection(parts.hostname, parts.port, timeout=60)
+        try:
+            while time.monotonic() < deadline:
+                name, kind, build = pick(rng)
+                code, elapsed = 0, None
+                try:
+                    method, url, body, headers = encode_request(build(fixture, next(fixture['sequence'])))
+                except DatabaseError:
+                    # the rows a request needs could not be written, e.g. while SQLite is locked by the server
+                    method = None
+
+                if method is not None:
+                    headers['X-Benchmark-Scenario'] = name
+                    start = time.perf_counter()
+                    try:
+                        client.request(method, parts.path.rstrip('/') + url, body, headers)
+                        response = client.getresponse()
+                        response.read()
+                        code = response.status
+                        if code == 204:
+                            # custom_response sends a body with 204 No Content, which http.client leaves unread
+                            client.close()
+                    except (OSError, http.client.HTTPException):
+                        client.close()
+                    elapsed = time.perf_counter() - start
+
+                # status 0: not sent, or no response
+                with lock:
+                    result = results.setdefault(name, {'latencies': [], 'statuses': {}})
+                    if elapsed is not None:
+                        result['latencies'].append(elapsed)
+                    result['statuses'][code] = result['statuses'].get(code, 0) + 1
+        finally:
+            client.close()
+            # disposable rows are built from this thread
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1000 if ordered else None
+
+
+def summarize(result, seconds, queries=None):
+    ordered = sorted(result['latencies'])
+    errors = sum(count for code, count in result['statuses'].items() if not 0 < code < 400)
+    requests = sum(result['statuses'].values())
+    return {
+        'requests': requests,
+        'errors': errors,
+        'throughput': (requests - errors) / seconds,
+        'p50_ms': percentile(ordered, 0.50),
+        'p95_ms': percentile(ordered, 0.95),
+        'p99_ms': percentile(ordered, 0.99),
+        'queries': sorted(queries)[len(queries) // 2] if queries else None,
+        'statuses': {str(code): count for code, count in sorted(result['statuses'].items())},
+    }
@@ -0,0 +1,173 @@
+import bisect
+import calendar
+import decimal
+from datetime import datetime, timedelta
+
+from django.core.cache import caches
+from django.db.models import Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .metrics import record_cache_lookup
+from .models import Bills, Expense, PusherVersion
+from .response_cache import RESPONSE_CACHE_ALIAS
+
+# TIME_PERIOD_CHOICES -> (months, days) between the starts of two pay periods
+PERIOD_STEPS = {
+    'daily': (0, 1),
+    'weekly': (0, 7),
+    'bi-weekly': (0, 14),
+    'monthly': (1, 0),
+    'quarterly': (3, 0),
+    'bi-yearly': (6, 0),
+    'yearly': (12, 0),
+}
+
+# entity types whose writes can change what a budget spent; their versions are part of every closed period key
+SPENDING_TYPES = ['expense', 'bill']
+
+
+def add_months(day, months):
+    month = day.month - 1 + months
+    year = day.year + month // 12
+    month = month % 12 + 1
+    return day.replace(year=year, month=month, day=min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def period_start(pay_start, step, index):
+    # always stepped from pay_start so month-end starts do not drift
+    months, days = step
+    if months:
+        return add_months(pay_start, months * index)
+    return pay_start + timedelta(days=days * index)
+
+
+def current_period_index(pay_start, step, today):
+    months, days = step
+    if days:
+        return (today - pay_start).days // days
+
+    index = ((today.year - pay_start.year) * 12 + today.month - pay_start.month) // months
+    if period_start(pay_start, step, index) > today:
+        index -= 1
+    return index
+
+
+def budget_periods(budget, today, periods):
+    """
+    Returns the [start, end) date windows of the budget's last `periods` pay periods, oldest first, ending with
+    the period containing today. Budgets that have not started yet have no periods.
+    """
+    step = PERIOD_STEPS[budget.pay_period.lower()]
+    if today < budget.pay_start:
+        return []
+
+    current = current_period_index(budget.pay_start, step, today)
+    first = max(0, current - periods + 1)
+    starts = [period_start(budget.pay_start, step, index) for index in range(first, current + 2)]
+    return list(zip(starts[:-1], starts[1:]))
+
+
+def day_start(day):
+    # aware midnight, so timestamp bounds stay plain comparisons on the indexed column
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+
+def daily_spending(conditions):
+    # one grouped query over both expense tables, per budget and day
+    def per_day(model):
+        return model.objects.filter(conditions).annotate(day=TruncDate('timestamp')) \
+            .values('budget', 'day').annotate(total=Sum('amount')).order_by()
+
+    return per_day(Expense).union(per_day(Bills), all=True)
+
+
+def utilization(spent, alloc_amt):
+    if not alloc_amt:
+        return None
+    return round(float(spent / alloc_amt), 4)
+
+
+def period_data(start, end, spent, alloc_amt):
+    return {
+        'start': start,
+        'end': end - timedelta(days=1),
+        'spent': spent,
+        'remaining': alloc_amt - spent,
+        'utilization': utilization(spent, alloc_amt),
+    }
+
+
+def closed_period_key(budget, start, periods, versions):
+    # a write to the pusher's expenses or bills bumps a version and retires the key in every worker at once
+    return 'closed_period:%d:%s:%s:%s:%d:%s' % (budget.id, budget.pay_start, budget.pay_period.lower(), start,
+                                                 periods, ':'.join(str(version) for version in versions))
+
+
+def spending_versions(budgets):
+    # pusher id -> versions of SPENDING_TYPES, for every pusher the budgets belong to
+    rows = PusherVersion.objects.filter(pusher_id__in={budget.pusher_id for budget in budgets},
+                                        entity_type__in=SPENDING_TYPES).values_list('pusher_id', 'entity_type',
+                                                                                    'version')
+    found = {(pusher_id, e_type): version for pusher_id, e_type, version in rows}
+    return {pusher_id: [found.get((pusher_id, e_type), 0) for e_type in SPENDING_TYPES]
+            for pusher_id in {budget.pusher_id for budget in budgets}}
+
+
+def get_budget_usage(budgets, today, periods):
+    """
+    Spending of each budget over its last `periods` pay periods. Closed periods are kept in the shared response
+    cache, keyed on the pusher's spending versions, so only the current period is summed while nothing changes.
+    """
+    budgets = list(budgets)
+    versions = spending_versions(budgets) if budgets else {}
+    plans, errors = {}, []
+    for budget in budgets:
+        if budget.pay_period.lower() not in PERIOD_STEPS:
+            errors.append({'name': budget.name, 'description': "The pay period " + budget.pay_period +
+                                                                 " is not allowed."})
+            continue
+
+        windows = budget_periods(budget, today, periods)
+        key = closed_period_key(budget, windows[-1][0], periods, versions[budget.pusher_id]) if windows else None
+        plans[budget.id] = (budget, windows, key)
+
+    # closed periods come from the cache when possible, so only the current one is summed
+    cached = caches[RESPONSE_CACHE_ALIAS].get_many([key for _, _, key in plans.values() if key is not None])
+    closed_periods, conditions = {}, Q()
+    for budget_id, (budget, windows, key) in plans.items():
+        if key is None:
+            continue
+        closed = closed_periods[budget_id] = cached.get(key)
+        record_cache_lookup('closed_period', closed is not None)
+        since = windows[-1][0] if closed is not None else windows[0][0]
+        conditions |= Q(budget=budget_id, timestamp__gte=day_start(since), timestamp__lt=day_start(windows[-1][1]))
+
+    spent = {budget_id: [decimal.Decimal('0.00')] * len(plan[1]) for budget_id, plan in plans.items()}
+    starts = {budget_id: [start for start, _ in plan[1]] for budget_id, plan in plans.items()}
+    if conditions:
+        for row in daily_spending(conditions):
+            index = bisect.bisect_right(starts[row['budget']], row['day']) - 1
+            spent[row['budget']][index] += row['total']
+
+    usage, computed = [], {}
+    for budget_id, (budget, windows, key) in plans.items():
+        if key is not None:
+            closed = closed_periods[budget_id]
+            if closed is None:
+                computed[key] = spent[budget_id][:-1]
+            else:
+                spent[budget_id][:-1] = closed
+
+        history = [period_data(start, end, amount, budget.alloc_amt)
+                   for (start, end), amount in zip(windows, spent[budget_id])]
+        usage.append({
+            'name': budget.name,
+            'alloc_amt': budget.alloc_amt,
+            'pay_period': budget.pay_period,
+            'current': history[-1] if history else None,
+            'history': history[:-1],
+        })
+
+    caches[RESPONSE_CACHE_ALIAS].set_many(computed)
+    return usage, errors
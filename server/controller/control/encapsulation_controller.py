@@ -2,22 +2,16 @@ from datetime import datetime
 
 from .views_helper import *
 from rest_framework.decorators import api_view, permission_classes, authentication_classes
-from rest_framework.authentication import SessionAuthentication, BasicAuthentication
+from controller.authentication import BasicAuthentication, ExpiringTokenAuthentication, SessionAuthentication
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.pagination import PageNumberPagination
-
-
-class ResponsePagination(PageNumberPagination):
-    page_size = 50
-    page_size_query_param = 'page_size'
 
 
 # -------------------------------------------- BUDGET ------------------------------------------
 # @limits(key='ip', rate='100/h')
 @api_view(['POST'])
-@authentication_classes([SessionAuthentication, BasicAuthentication])
+@authentication_classes([SessionAuthentication, BasicAuthentication, ExpiringTokenAuthentication])
 @permission_classes([IsAuthenticated])
 def encapsulation_new(request, format=None):
     try:
@@ -46,13 +40,13 @@ def encapsulation_new(request, format=None):
 
 
 # @limits(key='ip', rate='100/h')
-@api_view(['GET', 'PUT', 'DELETE'])
-@authentication_classes([SessionAuthentication, BasicAuthentication])
+@api_view(['GET', 'PUT', 'PATCH', 'DELETE'])
+@authentication_classes([SessionAuthentication, BasicAuthentication, ExpiringTokenAuthentication])
 @permission_classes([IsAuthenticated])
 def encapsulation_func(request, format=None):
     # if call is accurate
     try:
-        if request.method == 'PUT':
+        if request.method in ['PUT', 'PATCH']:
             pusher_key = request.data['pusher_key']
             e_type = request.data['type']
         else:
@@ -65,18 +59,31 @@ def encapsulation_func(request, format=None):
             return pusher
 
         if request.method == 'GET':
-            # get all data
+            etag = handle_etag(request, pusher, e_type)
+            if isinstance(etag, Response):
+                return etag
+
+            # shared by every user of the pusher
+            key = response_cache_key('encapsulation', pusher.id, etag, request)
+            cached = get_cached_response('encapsulation', key)
+            if cached is not None:
+                return tagged(cached, etag)
+
+            # get all data, or a page of it in cursor mode
             entity_data = get_entity_list(e_type, pusher)
+            if cursor_requested(request):
+                return tagged(cache_response(key, get_page(request, e_type, entity_data)), etag)
+
             serializer = get_serializer(e_type, entity_data, True)
 
             if not serializer.is_valid():
                 serializer_data = serializer.data
-                return Response(data=serializer_data)
+                return tagged(cache_response(key, Response(data=serializer_data)), etag)
             else:
                 return custom_response("Invalid encapsulation_type: " + e_type,
                                        status.HTTP_400_BAD_REQUEST)
 
-        elif request.method == 'PUT':
+        elif request.method in ['PUT', 'PATCH']:
 
             # fixme i think i can make this a function call
             name = request.data['name']
@@ -88,11 +95,12 @@ def encapsulation_func(request, format=None):
             request_data = request.data['data']
             request_data.update({'name': name, 'pusher': pusher.id})
 
-            # handle_ingestion
-            serializer = get_serializer(e_type, request_data, False)
+            # updated in place, so value history and linked entities are kept; PATCH may send only the changes
+            serializer = get_serializer(e_type, request_data, False, instance=encapsulation,
+                                        partial=request.method == 'PATCH')
             if serializer.is_valid():
-                encapsulation.delete()
                 serializer.save()
+                bump_versions(pusher.id, [e_type])
                 return Response(serializer.data)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -102,7 +110,11 @@ def encapsulation_func(request, format=None):
                 return custom_response("The " + e_type + " [" + name + "] does not exist.",
                                        status.HTTP_400_BAD_REQUEST)
             encapsulation = get_encapsulation(e_type, name, pusher)
-            encapsulation.delete()
+            if e_type == 'account':
+                handle_account_removal(encapsulation)
+            else:
+                encapsulation.delete()
+                bump_versions(pusher.id, [e_type])
             return custom_response("Successful deletion of " + e_type + " [" + encapsulation.name + "].",
                                    status.HTTP_204_NO_CONTENT)
 
@@ -112,7 +124,7 @@ def encapsulation_func(request, format=None):
 
 # @limits(key='ip', rate='100/h')
 @api_view(['POST'])
-@authentication_classes([SessionAuthentication, BasicAuthentication])
+@authentication_classes([SessionAuthentication, BasicAuthentication, ExpiringTokenAuthentication])
 @permission_classes([IsAuthenticated])
 def encapsulation_value_new(request, format=None):
     try:
@@ -137,7 +149,7 @@ def encapsulation_value_new(request, format=None):
 # @limits(key='ip', rate='100/h')
 # @api_view(['GET', 'DELETE'])  # uncomment if I want to enable DELETE method
 @api_view(['GET'])
-@authentication_classes([SessionAuthentication, BasicAuthentication])
+@authentication_classes([SessionAuthentication, BasicAuthentication, ExpiringTokenAuthentication])
 @permission_classes([IsAuthenticated])
 def encapsulation_value_func(request, format=None):
     try:
@@ -157,18 +169,19 @@ def encapsulation_value_func(request, format=None):
         encapsulation = get_encapsulation(e_type, encapsulation_name, pusher)
 
         if request.method == 'GET':
-            # get page of data
-            paginator = ResponsePagination()
-            entity_data = get_encapsulation_value_list(e_type, encapsulation.id)
+            etag = handle_etag(request, pusher, e_type + '_value')
+            if isinstance(etag, Response):
+                return etag
 
-            # Paginate the queryset before serializing it
-            result_page = paginator.paginate_queryset(entity_data, request)
-            serializer = get_serializer(e_type + '_value', result_page, True)
+            # shared by every user of the pusher
+            key = response_cache_key('encapsulation_value', pusher.id, etag, request)
+            cached = get_cached_response('encapsulation_value', key)
+            if cached is not None:
+                return tagged(cached, etag)
 
-            if not serializer.is_valid():
-                return paginator.get_paginated_response(serializer.data)
-            else:
-                return Response(data=serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            # get page of data
+            entity_data = get_encapsulation_value_list(e_type, encapsulation.id)
+            return tagged(cache_response(key, get_page(request, e_type + '_value', entity_data)), etag)
 
         elif request.method == 'DELETE':
             timestamp = request.GET.get('timestamp')
@@ -179,6 +192,7 @@ def encapsulation_value_func(request, format=None):
 
             encapsulation_value = get_encapsulation_value(e_type, encapsulation.id, date_object)
             encapsulation_value.delete()
+            bump_versions(pusher.id, [e_type + '_value'])
             return custom_response("Successful deletion of " + e_type + " value at [" + encapsulation.name + "].",
                                    status.HTTP_204_NO_CONTENT)
 
@@ -187,32 +201,94 @@ def encapsulation_value_func(request, format=None):
 
 
 @api_view(['GET'])
-@authentication_classes([SessionAuthentication, BasicAuthentication])
+@authentication_classes([SessionAuthentication, BasicAuthentication, ExpiringTokenAuthentication])
 @permission_classes([IsAuthenticated])
 def net_worth_history(request, format=None):
     try:
         pusher_key = request.GET.get('pusher_key')
         user = request.user
 
-        if not pusher_exists(pusher_key):
-            return custom_response("The pusher_key " + pusher_key + " is not valid.", status.HTTP_400_BAD_REQUEST)
-        pusher = Pusher.objects.get(key=pusher_key)
-        if not user_has_access(user, pusher):
-            return custom_response("The user " + user + " does not have access to the pusher.",
-                                   status.HTTP_401_UNAUTHORIZED)
+        pusher = handle_valid_pusher(pusher_key, user)
+        if isinstance(pusher, Response):
+            return pusher
 
-        # get page of data
-        paginator = ResponsePagination()
-        entity_data = get_entity_list('net_worth', pusher)
+        etag = handle_etag(request, pusher, 'net_worth')
+        if isinstance(etag, Response):
+            return etag
 
-        # Paginate the queryset before serializing it
-        result_page = paginator.paginate_queryset(entity_data, request)
-        serializer = get_serializer('net_worth', result_page, True)
+        # shared by every user of the pusher
+        key = response_cache_key('net_worth', pusher.id, etag, request)
+        cached = get_cached_response('net_worth', key)
+        if cached is not None:
+            return tagged(cached, etag)
 
-        if not serializer.is_valid():
-            return paginator.get_paginated_response(serializer.data)
-        else:
-            return Response(data=serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        # get page of data
+        return tagged(cache_response(key, get_page(request, 'net_worth', get_entity_list('net_worth', pusher))), etag)
 
     except KeyError:
         return Response(status=status.HTTP_400_BAD_REQUEST)
+
+
+# @limits(key='ip', rate='100/h')
+@api_view(['GET'])
+@authentication_classes([SessionAuthentication, BasicAuthentication, ExpiringTokenAuthentication])
+@permission_classes([IsAuthenticated])
+def net_worth_series(request, format=None):
+    try:
+        pusher_key = request.GET.get('pusher_key')
+        resolution = request.GET.get('resolution', 'day')
+        mode = request.GET.get('mode', 'last')
+        points = int(request.GET.get('points', 500))
+        user = request.user
+
+        pusher = handle_valid_pusher(pusher_key, user)
+        if isinstance(pusher, Response):
+            return pusher
+
+        # defaults to the last year
+        end = parse_timestamp(request.GET.get('to'), timezone.now())
+        start = parse_timestamp(request.GET.get('from'), end - timedelta(days=365))
+
+        if resolution == 'lttb':
+            if not 3 <= points <= MAX_SERIES_POINTS:
+                return custom_response("The number of points must be between 3 and " + str(MAX_SERIES_POINTS) + ".",
+                                       status.HTTP_400_BAD_REQUEST)
+            series = downsampled_series(pusher, start, end, points)
+        elif resolution in SERIES_RESOLUTIONS:
+            if mode not in SERIES_MODES:
+                return custom_response("The mode " + mode + " is not allowed.", status.HTTP_400_BAD_REQUEST)
+            series = bucketed_series(pusher, start, end, resolution, mode)
+        else:
+            return custom_response("The resolution " + resolution + " is not allowed.", status.HTTP_400_BAD_REQUEST)
+
+        return Response(data={'from': start, 'to': end, 'resolution': resolution, 'series': series})
+
+    except ValueError:
+        return custom_response("The from and to values must be ISO dates or timestamps and points a number.",
+                               status.HTTP_400_BAD_REQUEST)
+
+
+# -------------------------------------------- BUDGET USAGE ------------------------------------------
+# @limits(key='ip', rate='100/h')
+@api_view(['GET'])
+@authentication_classes([SessionAuthentication, BasicAuthentication, ExpiringTokenAuthentication])
+@permission_classes([IsAuthenticated])
+def budget_usage(request, format=None):
+    try:
+        pusher_key = request.GET.get('pusher_key')
+        periods = int(request.GET.get('periods', 12))
+        user = request.user
+
+        pusher = handle_valid_pusher(pusher_key, user)
+        if isinstance(pusher, Response):
+            return pusher
+
+        if periods < 1:
+            return custom_response("The number of periods must be at least 1.", status.HTTP_400_BAD_REQUEST)
+
+        budgets = Budget.objects.filter(pusher=pusher).order_by('priority', 'name')
+        usage, errors = get_budget_usage(budgets, timezone.localdate(), periods)
+        return Response(data={'budgets': usage, 'errors': errors})
+
+    except ValueError:
+        return custom_response("The number of periods must be a number.", status.HTTP_400_BAD_REQUEST)
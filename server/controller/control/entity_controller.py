@@ -1,22 +1,18 @@
 from datetime import datetime
-from rest_framework.pagination import PageNumberPagination
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from .views_helper import *
 from rest_framework.decorators import api_view, permission_classes, authentication_classes
-from rest_framework.authentication import SessionAuthentication, BasicAuthentication
+from controller.authentication import BasicAuthentication, ExpiringTokenAuthentication, SessionAuthentication
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
 
 
-class ResponsePagination(PageNumberPagination):
-    page_size = 50
-    page_size_query_param = 'page_size'
-
-
 # -------------------------------------------- ENTITY ------------------------------------------
 # @limits(key='ip', rate='100/h')
 @api_view(['POST'])
-@authentication_classes([SessionAuthentication, BasicAuthentication])
+@authentication_classes([SessionAuthentication, BasicAuthentication, ExpiringTokenAuthentication])
 @permission_classes([IsAuthenticated])
 def entity_new(request, format=None):
     try:
@@ -40,13 +36,97 @@ def entity_new(request, format=None):
 
 
 # @limits(key='ip', rate='100/h')
-@api_view(['GET', 'DELETE', 'PUT'])
-@authentication_classes([SessionAuthentication, BasicAuthentication])
+@api_view(['POST'])
+@authentication_classes([SessionAuthentication, BasicAuthentication, ExpiringTokenAuthentication])
+@permission_classes([IsAuthenticated])
+def entity_bulk(request, format=None):
+    try:
+        pusher_key = request.data['pusher_key']
+        records = request.data['data']
+        user = request.user
+
+        pusher = handle_valid_pusher(pusher_key, user)
+        if isinstance(pusher, Response):
+            return pusher
+
+        if not isinstance(records, list):
+            return custom_response("The data of a bulk request must be a list of entities.",
+                                   status.HTTP_400_BAD_REQUEST)
+
+        # handling POST
+        return handle_bulk_ingestion(pusher, user, records)
+
+    except KeyError:
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+
+
+# @limits(key='ip', rate='100/h')
+@api_view(['POST'])
+@authentication_classes([SessionAuthentication, BasicAuthentication, ExpiringTokenAuthentication])
+@permission_classes([IsAuthenticated])
+def entity_import(request, format=None):
+    try:
+        pusher_key = request.data['pusher_key']
+        upload = request.FILES['file']
+        user = request.user
+
+        pusher = handle_valid_pusher(pusher_key, user)
+        if isinstance(pusher, Response):
+            return pusher
+
+        # file type defaults to the upload's extension
+        file_type = request.data.get('file_type') or upload.name.rsplit('.', 1)[-1]
+
+        return handle_statement_import(pusher, user, upload, file_type.lower())
+
+    except KeyError:
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+
+
+# @limits(key='ip', rate='100/h')
+@api_view(['GET'])
+@authentication_classes([SessionAuthentication, BasicAuthentication, ExpiringTokenAuthentication])
+@permission_classes([IsAuthenticated])
+def entity_export(request, format=None):
+    try:
+        pusher_key = request.GET.get('pusher_key')
+        output = request.GET.get('output', 'ndjson')
+        user = request.user
+
+        pusher = handle_valid_pusher(pusher_key, user)
+        if isinstance(pusher, Response):
+            return pusher
+
+        e_types = EXPORT_ENTITY_TYPES
+        if request.GET.get('type') is not None:
+            e_type = request.GET.get('type')
+            if e_type not in EXPORT_ENTITY_TYPES:
+                return custom_response("Entity types of " + e_type + " cannot be exported.",
+                                       status.HTTP_400_BAD_REQUEST)
+            e_types = [e_type]
+
+        if output == 'ndjson':
+            response = StreamingHttpResponse(export_ndjson(e_types, pusher), content_type='application/x-ndjson')
+        elif output == 'csv':
+            response = StreamingHttpResponse(export_csv(e_types, pusher), content_type='text/csv')
+        else:
+            return custom_response("The output " + output + " is not allowed.", status.HTTP_400_BAD_REQUEST)
+
+        response['Content-Disposition'] = 'attachment; filename="%s.%s"' % (pusher.key, output)
+        return response
+
+    except TypeError:
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+
+
+# @limits(key='ip', rate='100/h')
+@api_view(['GET', 'DELETE', 'PUT', 'PATCH'])
+@authentication_classes([SessionAuthentication, BasicAuthentication, ExpiringTokenAuthentication])
 @permission_classes([IsAuthenticated])
 def entity_func(request, format=None):
     # if call is accurate
     try:
-        if request.method == 'PUT':
+        if request.method in ['PUT', 'PATCH']:
             pusher_key = request.data['pusher_key']
             e_type = request.data['type']
         else:
@@ -59,20 +139,23 @@ def entity_func(request, format=None):
             return pusher
 
         if request.method == 'GET':
-            # get page of data
-            paginator = ResponsePagination()
-            entity_data = get_entity_list(e_type, pusher)
+            etag = handle_etag(request, pusher, e_type)
+            if isinstance(etag, Response):
+                return etag
 
-            # Paginate the queryset before serializing it
-            result_page = paginator.paginate_queryset(entity_data, request)
-            serializer = get_serializer(e_type, result_page, True)
+            # shared by every user of the pusher
+            key = response_cache_key('entity', pusher.id, etag, request)
+            cached = get_cached_response('entity', key)
+            if cached is not None:
+                return tagged(cached, etag)
 
-            if not serializer.is_valid():
-                return paginator.get_paginated_response(serializer.data)
-            else:
-                return Response(data=serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            # get page of data
+            entity_data = filter_entity_list(e_type, pusher, get_entity_list(e_type, pusher), request.GET)
+            if isinstance(entity_data, Response):
+                return entity_data
+            return tagged(cache_response(key, get_page(request, e_type, entity_data)), etag)
 
-        elif request.method == 'PUT':
+        elif request.method in ['PUT', 'PATCH']:
             # Electives only
             if e_type not in ['subscription', 'for_sale', 'desired_purchase', 'bill']:
                 return custom_response("Entity types of " + e_type + " cannot be modified.",
@@ -82,7 +165,7 @@ def entity_func(request, format=None):
             request_data.update({'pusher': pusher.id, 'user': user.id, 'type': e_type})
 
             # handling POST
-            return handle_modification(e_type, pusher, request_data)
+            return handle_modification(e_type, pusher, request_data, partial=request.method == 'PATCH')
 
         elif request.method == 'DELETE':
             item, timestamp = "", ""
@@ -100,7 +183,13 @@ def entity_func(request, format=None):
                                            status.HTTP_400_BAD_REQUEST)
                 entity = get_entity(e_type, pusher, date_object)
 
-            entity.delete()
+            with transaction.atomic():
+                # the row goes first, so a DELETE racing this one finds nothing left to take out of the rollups
+                if not entity.delete()[0]:
+                    return custom_response("The " + e_type + " was already deleted.", status.HTTP_400_BAD_REQUEST)
+                if e_type in ROLLUP_ENTITY_TYPES:
+                    adjust_rollup(e_type, entity, -1)
+                bump_versions(pusher.id, [e_type])
             if e_type in ['subscription', 'for_sale', 'desired_purchase']:
                 return custom_response("Successful deletion of the " + e_type + " [" + item + "].",
                                        status.HTTP_204_NO_CONTENT)
@@ -110,3 +199,109 @@ def entity_func(request, format=None):
 
     except KeyError:
         return Response(status=status.HTTP_400_BAD_REQUEST)
+
+
+# @limits(key='ip', rate='100/h')
+@api_view(['GET'])
+@authentication_classes([SessionAuthentication, BasicAuthentication, ExpiringTokenAuthentication])
+@permission_classes([IsAuthenticated])
+def entity_search(request, format=None):
+    try:
+        pusher_key = request.GET.get('pusher_key')
+        e_type = request.GET.get('type', '')
+        query = request.GET.get('q', '')
+        limit = int(request.GET.get('limit', 50))
+        user = request.user
+
+        pusher = handle_valid_request(pusher_key, e_type, user)
+        if isinstance(pusher, Response):
+            return pusher
+
+        if e_type not in SEARCH_MODELS:
+            return custom_response("Entity types of " + e_type + " cannot be searched.", status.HTTP_400_BAD_REQUEST)
+        if not 1 <= limit <= MAX_SEARCH_RESULTS:
+            return custom_response("The limit must be between 1 and %d." % MAX_SEARCH_RESULTS,
+                                   status.HTTP_400_BAD_REQUEST)
+
+        etag = handle_etag(request, pusher, e_type)
+        if isinstance(etag, Response):
+            return etag
+
+        key = response_cache_key('search', pusher.id, etag, request)
+        cached = get_cached_response('search', key)
+        if cached is not None:
+            return tagged(cached, etag)
+
+        results = get_search_results(e_type, pusher, query, limit)
+        if isinstance(results, Response):
+            return results
+        if not results:
+            return tagged(cache_response(key, Response(data=[])), etag)
+
+        serializer = get_serializer(e_type, results, True)
+        if not serializer.is_valid():
+            return tagged(cache_response(key, Response(data=serializer.data)), etag)
+        else:
+            return Response(data=serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    except ValueError:
+        return custom_response("The limit must be a number.", status.HTTP_400_BAD_REQUEST)
+
+
+# -------------------------------------------- SUMMARY ------------------------------------------
+# @limits(key='ip', rate='100/h')
+@api_view(['GET'])
+@authentication_classes([SessionAuthentication, BasicAuthentication, ExpiringTokenAuthentication])
+@permission_classes([IsAuthenticated])
+def entity_summary(request, format=None):
+    try:
+        pusher_key = request.GET.get('pusher_key')
+        user = request.user
+
+        pusher = handle_valid_pusher(pusher_key, user)
+        if isinstance(pusher, Response):
+            return pusher
+
+        # defaults to the current month
+        this_month = timezone.localdate().replace(day=1)
+        start = parse_period(request.GET.get('from'), this_month)
+        end = parse_period(request.GET.get('to'), start)
+
+        e_types = ROLLUP_ENTITY_TYPES
+        if request.GET.get('type') is not None:
+            e_type = request.GET.get('type')
+            if e_type not in ROLLUP_ENTITY_TYPES:
+                return custom_response("Entity types of " + e_type + " cannot be summarized.",
+                                       status.HTTP_400_BAD_REQUEST)
+            e_types = [e_type]
+
+        return Response(data=list(get_summary(pusher, start, end, e_types)))
+
+    except ValueError:
+        return custom_response("The from and to periods must be formatted as YYYY-MM.", status.HTTP_400_BAD_REQUEST)
+
+
+# @limits(key='ip', rate='100/h')
+@api_view(['GET'])
+@authentication_classes([SessionAuthentication, BasicAuthentication, ExpiringTokenAuthentication])
+@permission_classes([IsAuthenticated])
+def entity_forecast(request, format=None):
+    try:
+        pusher_key = request.GET.get('pusher_key')
+        months = int(request.GET.get('months', 24))
+        bucket = request.GET.get('bucket', 'monthly')
+        user = request.user
+
+        pusher = handle_valid_pusher(pusher_key, user)
+        if isinstance(pusher, Response):
+            return pusher
+
+        if not 1 <= months <= 120:
+            return custom_response("The number of months must be between 1 and 120.", status.HTTP_400_BAD_REQUEST)
+        if bucket not in FORECAST_BUCKETS:
+            return custom_response("The bucket " + bucket + " is not allowed.", status.HTTP_400_BAD_REQUEST)
+
+        return Response(data=get_forecast(pusher, timezone.localdate(), months, bucket))
+
+    except ValueError:
+        return custom_response("The number of months must be a number.", status.HTTP_400_BAD_REQUEST)
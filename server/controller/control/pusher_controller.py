@@ -1,6 +1,6 @@
 from .views_helper import *
 from rest_framework.decorators import api_view, permission_classes, authentication_classes
-from rest_framework.authentication import SessionAuthentication, BasicAuthentication
+from controller.authentication import BasicAuthentication, ExpiringTokenAuthentication, SessionAuthentication
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status, permissions
@@ -9,24 +9,53 @@ from rest_framework import status, permissions
 # -------------------------------------------- PUSHER ------------------------------------------
 # @limits(key='ip', rate='100/h')
 @api_view(['GET'])
-@authentication_classes([SessionAuthentication, BasicAuthentication])
+@authentication_classes([SessionAuthentication, BasicAuthentication, ExpiringTokenAuthentication])
 @permission_classes([IsAuthenticated])
 def pusher_all(request, format=None):
     try:
-        data = Pusher.objects.filter(primaryUser=request.user)
+        key = response_cache_key('pusher_all', request.user.id, get_user_pushers_version(request.user), request)
+        cached = get_cached_response('pusher_all', key)
+        if cached is not None:
+            return cached
+
+        data = Pusher.objects.filter(primaryUser=request.user).select_related('primaryUser')
         serializer = PusherSerializer(data=data, many=True)
 
         if not serializer.is_valid():
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return cache_response(key, Response(serializer.data, status=status.HTTP_200_OK))
         else:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     except TypeError as e:
         return Response(status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+# @limits(key='ip', rate='100/h')
+@api_view(['GET'])
+@authentication_classes([SessionAuthentication, BasicAuthentication, ExpiringTokenAuthentication])
+@permission_classes([IsAuthenticated])
+def pusher_dashboard(request, format=None):
+    try:
+        pusher_key = request.GET.get('pusher_key')
+        recent = int(request.GET.get('recent', 5))
+        user = request.user
+
+        pusher = handle_valid_pusher(pusher_key, user)
+        if isinstance(pusher, Response):
+            return pusher
+
+        if not 1 <= recent <= MAX_DASHBOARD_RECENT:
+            return custom_response("The number of recent entities must be between 1 and %d." % MAX_DASHBOARD_RECENT,
+                                   status.HTTP_400_BAD_REQUEST)
+
+        return Response(data=get_dashboard(pusher, recent, timezone.localdate()))
+
+    except ValueError:
+        return custom_response("The number of recent entities must be a number.", status.HTTP_400_BAD_REQUEST)
+
+
 # @limits(key='ip', rate='100/h')
 @api_view(['POST'])
-@authentication_classes([SessionAuthentication, BasicAuthentication])
+@authentication_classes([SessionAuthentication, BasicAuthentication, ExpiringTokenAuthentication])
 @permission_classes([permissions.IsAuthenticated])
 def pusher_new(request, format=None):
     try:
@@ -53,7 +82,7 @@ def pusher_new(request, format=None):
 
 # @limits(key='ip', rate='100/h')
 @api_view(['GET', 'PUT', 'DELETE'])
-@authentication_classes([SessionAuthentication, BasicAuthentication])
+@authentication_classes([SessionAuthentication, BasicAuthentication, ExpiringTokenAuthentication])
 @permission_classes([IsAuthenticated])
 def pusher_func(request, format=None):
     try:
@@ -65,13 +94,9 @@ def pusher_func(request, format=None):
 
         user = request.user
 
-        if not pusher_exists(pusher_key):
-            return custom_response("The pusher_key [" + pusher_key + "] is not valid.", status.HTTP_400_BAD_REQUEST)
-
-        pusher = Pusher.objects.get(key=pusher_key)
-        if not user_has_access(user, pusher):
-            return custom_response("The user [" + user + "] does not have access to the pusher.",
-                                   status.HTTP_401_UNAUTHORIZED)
+        pusher = handle_valid_pusher(pusher_key, user)
+        if isinstance(pusher, Response):
+            return pusher
 
         if request.method == 'GET':
             serializer = PusherSerializer(pusher)
@@ -84,10 +109,13 @@ def pusher_func(request, format=None):
             serializer = PusherSerializer(pusher, data=request_data)
             if serializer.is_valid():
                 serializer.save()
+                invalidate_pusher_access(pusher=pusher)
+                bump_versions(pusher.id, ['pusher'])
                 return Response(serializer.data)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
         elif request.method == 'DELETE':
+            invalidate_pusher_access(pusher=pusher)
             pusher.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
 
@@ -98,7 +126,7 @@ def pusher_func(request, format=None):
 # -------------------------------------------- PUSHER ACCESS ------------------------------------------
 # @limits(key='ip', rate='100/h')
 @api_view(['POST'])
-@authentication_classes([SessionAuthentication, BasicAuthentication])
+@authentication_classes([SessionAuthentication, BasicAuthentication, ExpiringTokenAuthentication])
 @permission_classes([IsAuthenticated])
 def pusher_access_new(request, format=None):
     try:
@@ -106,28 +134,24 @@ def pusher_access_new(request, format=None):
         pusher_key = request.data['pusher_key']
         request_user = request.user
 
-        if not pusher_exists(pusher_key):
-            return custom_response("The pusher_key " + pusher_key + " is not valid.", status.HTTP_400_BAD_REQUEST)
-        if not user_exists(username):
-            return custom_response("The user " + username + " does not exist.", status.HTTP_400_BAD_REQUEST)
+        pusher = handle_valid_pusher(pusher_key, request_user)
+        if isinstance(pusher, Response):
+            return pusher
 
-        pusher = Pusher.objects.get(key=pusher_key)
-        new_user = User.objects.get(username=username)
-        if not user_has_access(request_user.id, pusher.id):
-            return custom_response("The user " + request_user + " does not have access to the specified pusher.",
-                                   status.HTTP_401_UNAUTHORIZED)
+        new_user = User.objects.filter(username=username).first()
+        if new_user is None:
+            return custom_response("The user " + username + " does not exist.", status.HTTP_400_BAD_REQUEST)
         if user_has_access(new_user.id, pusher.id):
             return custom_response("The user " + username + " already has access to the specified pusher.",
                                    status.HTTP_400_BAD_REQUEST)
 
-        new_user = User.objects.get(username=username)
-
         request.data.update({'user': new_user.id, 'pusher': pusher.id})
 
         # add user access to pusher
         serializer = PusherAccessSerializer(data=request.data)
         if serializer.is_valid():
             serializer.save()
+            invalidate_pusher_access(user=new_user, pusher=pusher)
             return Response(data=serializer.data)
         return Response(data=serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -137,35 +161,36 @@ def pusher_access_new(request, format=None):
 
 # @limits(key='ip', rate='100/h')
 @api_view(['GET'])
-@authentication_classes([SessionAuthentication, BasicAuthentication])
+@authentication_classes([SessionAuthentication, BasicAuthentication, ExpiringTokenAuthentication])
 @permission_classes([IsAuthenticated])
 def pusher_access_all(request, format=None):
     pusher_key = request.GET.get('pusher_key')
     request_user = request.user
 
-    if not pusher_exists(pusher_key):
-        return custom_response("The pusher_key " + pusher_key + " is not valid.", status.HTTP_400_BAD_REQUEST)
-
-    pusher = Pusher.objects.get(key=pusher_key)
-    if not user_has_access(request_user, pusher):
-        return custom_response("The user " + request_user + " does not have access to the specified pusher.",
-                               status.HTTP_401_UNAUTHORIZED)
+    pusher = handle_valid_pusher(pusher_key, request_user)
+    if isinstance(pusher, Response):
+        return pusher
     if request.user != pusher.primaryUser:
-        return custom_response("The user " + request_user + " is not an admin of the specified pusher.",
+        return custom_response("The user " + request_user.username + " is not an admin of the specified pusher.",
                                status.HTTP_401_UNAUTHORIZED)
 
     # getting all users who have access to pusher
     if request.method == 'GET':
-        pusher_access = PusherAccess.objects.filter(pusher=pusher.id)
+        key = response_cache_key('pusher_access_all', pusher.id, get_version(pusher, 'pusher_access'), request)
+        cached = get_cached_response('pusher_access_all', key)
+        if cached is not None:
+            return cached
+
+        pusher_access = PusherAccess.objects.filter(pusher=pusher.id).select_related('user', 'pusher')
         serializer = PusherAccessSerializer(data=pusher_access, many=True)
         if not serializer.is_valid():  # fixme idk why this not valid
-            return Response(serializer.data)
+            return cache_response(key, Response(serializer.data))
         return Response(data=serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
 # @limits(key='ip', rate='100/h')
 @api_view(['GET', 'DELETE'])
-@authentication_classes([SessionAuthentication, BasicAuthentication])
+@authentication_classes([SessionAuthentication, BasicAuthentication, ExpiringTokenAuthentication])
 @permission_classes([IsAuthenticated])
 def pusher_access_func(request, format=None):
     # if call is accurate
@@ -173,17 +198,13 @@ def pusher_access_func(request, format=None):
         pusher_key = request.GET.get('pusher_key')
         request_user = request.user
 
-        if not pusher_exists(pusher_key):
-            return custom_response("The pusher_key " + pusher_key + " is not valid.", status.HTTP_400_BAD_REQUEST)
-
-        pusher = Pusher.objects.get(key=pusher_key)
-        if not user_has_access(request_user, pusher):
-            return custom_response("The user " + request_user + " does not have access to the specified pusher.",
-                                   status.HTTP_401_UNAUTHORIZED)
+        pusher = handle_valid_pusher(pusher_key, request_user)
+        if isinstance(pusher, Response):
+            return pusher
 
         # getting all pushers user has access to
         if request.method == 'GET':
-            pusher_access = PusherAccess.objects.filter(user=request_user.id)
+            pusher_access = PusherAccess.objects.filter(user=request_user.id).select_related('user', 'pusher')
             serializer = PusherAccessSerializer(data=pusher_access, many=True)
             if not serializer.is_valid():  # fixme idk why this not valid
                 return Response(serializer.data)
@@ -207,6 +228,8 @@ def pusher_access_func(request, format=None):
             if user != request.user:
                 pusher_access = PusherAccess.objects.get(pusher=pusher, user=user)
                 pusher_access.delete()
+                invalidate_pusher_access(user=user, pusher=pusher)
+                bump_versions(pusher.id, ['pusher_access'])
                 return Response(status=status.HTTP_204_NO_CONTENT)
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
@@ -1,6 +1,8 @@
 from .views_helper import *
 from rest_framework.decorators import api_view, permission_classes, authentication_classes
-from rest_framework.authentication import SessionAuthentication, BasicAuthentication
+from controller.authentication import BasicAuthentication, ExpiringTokenAuthentication, SessionAuthentication, \
+    issue_token, revoke_token, revoke_user_tokens
+from django.contrib.auth import authenticate
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
@@ -9,7 +11,7 @@ from rest_framework import permissions
 
 # @limits(key='ip', rate='100/h')
 @api_view(['GET'])
-@authentication_classes([SessionAuthentication, BasicAuthentication])
+@authentication_classes([SessionAuthentication, BasicAuthentication, ExpiringTokenAuthentication])
 @permission_classes([permissions.IsAdminUser])
 def user_all(request):
     data = User.objects.all()
@@ -19,11 +21,14 @@ def user_all(request):
 
 # @limits(key='ip', rate='100/h')
 @api_view(['DELETE'])
-@authentication_classes([SessionAuthentication, BasicAuthentication])
+@authentication_classes([SessionAuthentication, BasicAuthentication, ExpiringTokenAuthentication])
 @permission_classes([permissions.IsAdminUser])
 def user_delete(request):
     try:
         user = User.objects.get(username=request.data["user"])
+        invalidate_pusher_access(user=user)
+        revoke_user_tokens(user)
+        bump_user_versions(user)
         user.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
     except User.DoesNotExist:
@@ -47,9 +52,36 @@ def user_register(request):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+# @limits(key='ip', rate='100/h')
+@api_view(['POST'])
+@permission_classes([permissions.AllowAny])
+def user_login(request):
+    try:
+        user = authenticate(request, username=request.data['username'], password=request.data['password'])
+        if user is None:
+            return custom_response("The username or password is not valid.", status.HTTP_401_UNAUTHORIZED)
+
+        key, token = issue_token(user)
+        return Response(data={'token': key, 'expires': token.expires})
+
+    except KeyError:
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+
+
+# @limits(key='ip', rate='100/h')
+@api_view(['POST'])
+@authentication_classes([ExpiringTokenAuthentication])
+@permission_classes([IsAuthenticated])
+def user_logout(request):
+    token = AuthToken.objects.filter(digest=request.auth).first()
+    if token is not None:
+        revoke_token(token)
+    return Response(status=status.HTTP_204_NO_CONTENT)
+
+
 # @limits(key='ip', rate='100/h')
 @api_view(['GET', 'PUT'])
-@authentication_classes([SessionAuthentication, BasicAuthentication])
+@authentication_classes([SessionAuthentication, BasicAuthentication, ExpiringTokenAuthentication])
 @permission_classes([IsAuthenticated])
 def user_info(request):
     try:
@@ -62,7 +94,12 @@ def user_info(request):
         elif request.method == 'PUT':
             serializer = UserSerializer(user, data=request.data, many=False)
             if serializer.is_valid():
+                # the password is required on every PUT, so only a new one signs out every token of the user
+                password_changed = not user.check_password(serializer.validated_data['password'])
                 serializer.save()
+                bump_user_versions(user)
+                if password_changed:
+                    revoke_user_tokens(user)
                 return Response(serializer.data)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -1,6 +1,24 @@
-from django.http import HttpResponse
+import os
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest, multiprocess
+
 from configuration.settings import VERSION
 
 
 def index(request):
     return HttpResponse("Penny Pusher (v" + VERSION + ")")
+
+
+def metrics(request):
+    # scraped from the host or a trusted network only; it names every view and how busy it is
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        return HttpResponseForbidden()
+
+    registry = REGISTRY
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        # sum the samples every worker process has written, not just this one's
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
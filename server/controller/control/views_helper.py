@@ -1,8 +1,27 @@
+import csv
+import hashlib
+import json
 import uuid
-
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q, Subquery, Sum
+from django.utils.cache import parse_etags, quote_etag
+from django.utils.dateparse import parse_date, parse_datetime
 from rest_framework import status
+from rest_framework.pagination import PageNumberPagination, CursorPagination
 from rest_framework.response import Response
+from controller.budget_periods import day_start, get_budget_usage
+from controller.forecast import FORECAST_BUCKETS, PAID_BILL_STATUS, get_forecast
+from controller.metrics import record_cache_lookup
+from controller.net_worth_series import MAX_SERIES_POINTS, SERIES_MODES, SERIES_RESOLUTIONS, \
+    bucketed_series, downsampled_series
+from controller.search import MAX_SEARCH_RESULTS, SEARCH_MODELS, search_ids, search_terms
+from controller.response_cache import RESPONSE_CACHE_ALIAS, cache_response, get_cached_response, response_cache_key
 from controller.serializers import *
+from controller.statement_parser import StatementError, map_category, read_statement
 
 
 def generate_key():
@@ -36,19 +55,104 @@ def entity_type_exists(e_type):
     return e_type in allowed_types
 
 
-def handle_valid_request(pusher_key, e_type, user):
-    if not pusher_exists(pusher_key):
-        return custom_response("The pusher_key " + pusher_key + " is not valid.", status.HTTP_400_BAD_REQUEST)
-    pusher = Pusher.objects.get(key=pusher_key)
-    if not user_has_access(user, pusher):
-        return custom_response("The user " + user + " does not have access to the pusher.",
+# (user id, pusher key) -> pusher, for users that have access to the pusher. Entries live in the response cache,
+# shared by every worker with RESPONSE_CACHE=file, so dropping one revokes the access in all of them at once.
+PUSHER_ACCESS_TIMEOUT = 60
+
+
+def pusher_access_key(user_id, pusher_key):
+    # pusher keys come straight from the query string, so they are hashed into a safe cache key
+    return 'pusher_access:%d:%s' % (user_id, hashlib.sha1(str(pusher_key).encode()).hexdigest())
+
+
+def invalidate_pusher_access(user=None, pusher=None):
+    # call before the access rows go, as a pusher or user's entries are found through them
+    if user is not None and pusher is not None:
+        keys = [pusher_access_key(user.id, pusher.key)]
+    elif pusher is not None:
+        keys = [pusher_access_key(user_id, pusher.key)
+                for user_id in PusherAccess.objects.filter(pusher=pusher).values_list('user_id', flat=True)]
+    else:
+        keys = [pusher_access_key(user.id, pusher_key)
+                for pusher_key in PusherAccess.objects.filter(user=user).values_list('pusher__key', flat=True)]
+    caches[RESPONSE_CACHE_ALIAS].delete_many(keys)
+
+
+def handle_valid_pusher(pusher_key, user):
+    key = pusher_access_key(user.id, pusher_key)
+    cached = caches[RESPONSE_CACHE_ALIAS].get(key)
+    record_cache_lookup('pusher_access', cached is not None)
+    if cached is not None:
+        # unpickled afresh, so changes to it never reach the cache
+        return cached
+
+    # existence and access in one query
+    pusher = Pusher.objects.filter(key=pusher_key).select_related('primaryUser').annotate(
+        has_access=Exists(PusherAccess.objects.filter(pusher=OuterRef('pk'), user=user.id))).first()
+    if pusher is None:
+        return custom_response("The pusher_key " + str(pusher_key) + " is not valid.", status.HTTP_400_BAD_REQUEST)
+    if not pusher.has_access:
+        return custom_response("The user " + user.username + " does not have access to the pusher.",
                                status.HTTP_401_UNAUTHORIZED)
+
+    caches[RESPONSE_CACHE_ALIAS].set(key, pusher, PUSHER_ACCESS_TIMEOUT)
+    return pusher
+
+
+def handle_valid_request(pusher_key, e_type, user):
+    pusher = handle_valid_pusher(pusher_key, user)
+    if isinstance(pusher, Response):
+        return pusher
     if not entity_type_exists(e_type):
         return custom_response("The type " + e_type + " is not allowed.", status.HTTP_400_BAD_REQUEST)
 
     return pusher
 
 
+# ------------------------------------------ PAGINATION ------------------------------------------
+class ResponsePagination(PageNumberPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+
+
+class ResponseCursorPagination(CursorPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    ordering = ('-timestamp', '-id')
+
+
+def cursor_requested(request):
+    return request.GET.get('pagination') == 'cursor' or 'cursor' in request.GET
+
+
+def get_paginator(request, e_type):
+    if not cursor_requested(request):
+        return ResponsePagination()
+
+    # DRF keys the cursor on the first ordering field only and steps over rows that share its value with an
+    # offset, so the id just keeps ties in a stable order. Types without a timestamp are keyed on their id.
+    paginator = ResponseCursorPagination()
+    if e_type in ['budget', 'fund', 'account', 'subscription', 'for_sale', 'desired_purchase']:
+        paginator.ordering = ('id',)
+    # the sorts of the entity listing, which filter_entity_list checked; every other listing keeps its order
+    sort = request.GET.get('sort')
+    if sort is not None and sort.lstrip('-') in ENTITY_SORTS.get(e_type, []):
+        paginator.ordering = entity_ordering(sort)
+    return paginator
+
+
+def get_page(request, e_type, queryset):
+    # Paginate the queryset before serializing it
+    paginator = get_paginator(request, e_type)
+    result_page = paginator.paginate_queryset(queryset, request)
+    serializer = get_serializer(e_type, result_page, True)
+
+    # an empty page validates, as there is nothing in it to reject
+    if not serializer.is_valid() or not result_page:
+        return paginator.get_paginated_response(serializer.data)
+    return Response(data=serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
 def handle_ingestion(e_type, pusher, request_data):
     if e_type == 'bill':
         return handle_bill_ingestion(pusher, request_data)
@@ -66,14 +170,15 @@ def handle_ingestion(e_type, pusher, request_data):
     serializer = get_serializer(e_type, request_data, False)
     if serializer.is_valid():
         serializer.save()
+        bump_versions(pusher.id, [e_type])
         return Response(data=serializer.data)
     else:
         return Response(data=serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-def handle_modification(e_type, pusher, request_data):
+def handle_modification(e_type, pusher, request_data, partial=False):
     if e_type == 'bill':
-        return handle_bill_modification(pusher, request_data)
+        return handle_bill_modification(pusher, request_data, partial)
     if 'budget' in request_data or 'fund' in request_data or 'account' in request_data:
         request_data = check_encapsulation_validity(request_data, pusher)
         if isinstance(request_data, Response):
@@ -90,45 +195,46 @@ def handle_modification(e_type, pusher, request_data):
         name = request_data['name']
         original = get_encapsulation(e_type, name, pusher)
 
-    serializer = get_serializer(e_type, request_data, False)
+    # updated in place, so the row keeps its id and history
+    serializer = get_serializer(e_type, request_data, False, instance=original, partial=partial)
     if serializer.is_valid():
-        original.delete()
         serializer.save()
+        bump_versions(pusher.id, [e_type])
         return Response(data=serializer.data)
     else:
         return Response(data=serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-def get_serializer(e_type, data, many):
+def get_serializer(e_type, data, many, **kwargs):
     match e_type:
         case 'income':
-            return IncomeSerializer(data=data, many=many)
+            return IncomeSerializer(data=data, many=many, **kwargs)
         case 'expense':
-            return ExpenseSerializer(data=data, many=many)
+            return ExpenseSerializer(data=data, many=many, **kwargs)
         case 'paycheck':
-            return PaycheckSerializer(data=data, many=many)
+            return PaycheckSerializer(data=data, many=many, **kwargs)
         case 'budget':
-            return BudgetSerializer(data=data, many=many)
+            return BudgetSerializer(data=data, many=many, **kwargs)
         case 'fund':
-            return FundSerializer(data=data, many=many)
+            return FundSerializer(data=data, many=many, **kwargs)
         case 'account':
-            return AccountSerializer(data=data, many=many)
+            return AccountSerializer(data=data, many=many, **kwargs)
         case 'budget_value':
-            return BudgetValueSerializer(data=data, many=many)
+            return BudgetValueSerializer(data=data, many=many, **kwargs)
         case 'fund_value':
-            return FundValueSerializer(data=data, many=many)
+            return FundValueSerializer(data=data, many=many, **kwargs)
         case 'account_value':
-            return AccountValueSerializer(data=data, many=many)
+            return AccountValueSerializer(data=data, many=many, **kwargs)
         case 'net_worth':
-            return ExpNetWorthSerializer(data=data, many=many)
+            return ExpNetWorthSerializer(data=data, many=many, **kwargs)
         case 'bill':
-            return BillSerializer(data=data, many=many)
+            return BillSerializer(data=data, many=many, **kwargs)
         case 'subscription':
-            return SubscriptionSerializer(data=data, many=many)
+            return SubscriptionSerializer(data=data, many=many, **kwargs)
         case 'for_sale':
-            return TradeSerializer(data=data, many=many)
+            return TradeSerializer(data=data, many=many, **kwargs)
         case 'desired_purchase':
-            return TradeSerializer(data=data, many=many)
+            return TradeSerializer(data=data, many=many, **kwargs)
 
 
 # ------------------------------------------ ENTITY ------------------------------------------
@@ -157,19 +263,20 @@ def get_entity(e_type, pusher, timestamp):
 
 
 def get_entity_list(e_type, pusher):
+    # joins cover every relation read by the matching list serializer
     match e_type:
         case 'income':
-            return Income.objects.filter(pusher=pusher)
+            return Income.objects.filter(pusher=pusher).select_related('user')
         case 'expense':
-            return Expense.objects.filter(pusher=pusher)
+            return Expense.objects.filter(pusher=pusher).select_related('user', 'budget', 'fund')
         case 'paycheck':
-            return Paycheck.objects.filter(pusher=pusher)
+            return Paycheck.objects.filter(pusher=pusher).select_related('user')
         case 'budget':
-            return Budget.objects.filter(pusher=pusher)
+            return Budget.objects.filter(pusher=pusher).select_related('pusher')
         case 'fund':
-            return Fund.objects.filter(pusher=pusher)
+            return Fund.objects.filter(pusher=pusher).select_related('pusher')
         case 'account':
-            return Account.objects.filter(pusher=pusher)
+            return Account.objects.filter(pusher=pusher).select_related('pusher')
         case 'net_worth':
             return ExpNetWorth.objects.filter(pusher=pusher)
         case 'subscription':
@@ -179,7 +286,97 @@ def get_entity_list(e_type, pusher):
         case 'desired_purchase':
             return Trade.objects.filter(pusher=pusher, type='desired_purchase')
         case 'bill':
-            return Bills.objects.filter(pusher=pusher)
+            return Bills.objects.filter(pusher=pusher).select_related('user', 'budget', 'fund')
+
+
+def parse_amount(pusher, value):
+    amount = Decimal(value)
+    if not amount.is_finite():
+        raise ValueError(value)
+    return amount
+
+
+def parse_budget(pusher, name):
+    budget_id = Budget.objects.filter(pusher=pusher, name=name).values_list('id', flat=True).first()
+    if budget_id is None:
+        raise ValueError(name)
+    return budget_id
+
+
+def parse_fund(pusher, name):
+    fund_id = Fund.objects.filter(pusher=pusher, name=name).values_list('id', flat=True).first()
+    if fund_id is None:
+        raise ValueError(name)
+    return fund_id
+
+
+def parse_username(pusher, username):
+    user_id = User.objects.filter(username=username).values_list('id', flat=True).first()
+    if user_id is None:
+        raise ValueError(username)
+    return user_id
+
+
+# query parameter -> (lookup, parser) of the entity listing; names are resolved to ids first, so every filter
+# reads one of the (pusher | budget | fund, column, timestamp) indexes of the entity's table
+ENTITY_FILTERS = {
+    'from': ('timestamp__gte', lambda pusher, value: parse_timestamp(value, None)),
+    'to': ('timestamp__lt', lambda pusher, value: parse_timestamp(value, None)),
+    'category': ('category', lambda pusher, value: value),
+    'min_amount': ('amount__gte', parse_amount),
+    'max_amount': ('amount__lte', parse_amount),
+    'budget': ('budget_id', parse_budget),
+    'fund': ('fund_id', parse_fund),
+    'user': ('user_id', parse_username),
+}
+ENTITY_FILTER_TYPES = {
+    'income': ['from', 'to', 'category', 'min_amount', 'max_amount', 'user'],
+    'expense': list(ENTITY_FILTERS),
+    'paycheck': ['from', 'to', 'min_amount', 'max_amount', 'user'],
+    'bill': list(ENTITY_FILTERS),
+    'subscription': ['min_amount', 'max_amount'],
+    'for_sale': ['min_amount', 'max_amount'],
+    'desired_purchase': ['min_amount', 'max_amount'],
+}
+ENTITY_SORTS = {
+    'income': ['timestamp', 'amount'],
+    'expense': ['timestamp', 'amount'],
+    'paycheck': ['timestamp', 'amount'],
+    'bill': ['timestamp', 'amount'],
+    'subscription': ['amount'],
+    'for_sale': ['amount'],
+    'desired_purchase': ['amount'],
+}
+
+
+def entity_ordering(sort):
+    # the id breaks ties in the same direction, so pages neither overlap nor skip rows
+    return (sort, '-id' if sort.startswith('-') else 'id')
+
+
+def filter_entity_list(e_type, pusher, queryset, params):
+    filters = {}
+    for name, (lookup, parse) in ENTITY_FILTERS.items():
+        value = params.get(name)
+        if value is None:
+            continue
+        if name not in ENTITY_FILTER_TYPES.get(e_type, []):
+            return custom_response("Entity types of " + e_type + " cannot be filtered by " + name + ".",
+                                   status.HTTP_400_BAD_REQUEST)
+        try:
+            filters[lookup] = parse(pusher, value)
+        except (ValueError, ArithmeticError):
+            return custom_response("The " + name + " filter [" + value + "] is not valid.",
+                                   status.HTTP_400_BAD_REQUEST)
+
+    sort = params.get('sort')
+    if sort is not None:
+        if sort.lstrip('-') not in ENTITY_SORTS.get(e_type, []):
+            return custom_response("Entity types of " + e_type + " cannot be sorted by " + sort + ".",
+                                   status.HTTP_400_BAD_REQUEST)
+        queryset = queryset.order_by(*entity_ordering(sort))
+
+    return queryset.filter(**filters)
 
 
 # ------------------------------------------ ELECTIVE ------------------------------------------
@@ -284,11 +481,11 @@ def get_encapsulation_value(e_type, e_id, timestamp):
 def get_encapsulation_value_list(e_type, e_id):
     match e_type:
         case 'budget':
-            return BudgetValue.objects.filter(budget=e_id)
+            return BudgetValue.objects.filter(budget=e_id).select_related('budget__pusher')
         case 'fund':
-            return FundValue.objects.filter(fund=e_id)
+            return FundValue.objects.filter(fund=e_id).select_related('fund__pusher')
         case 'account':
-            return AccountValue.objects.filter(account=e_id)
+            return AccountValue.objects.filter(account=e_id).select_related('account__pusher')
 
 
 # -------------------------------------- BILL Handling --------------------------------------
@@ -308,16 +505,18 @@ def handle_bill_ingestion(pusher, request_data):
     serializer = get_serializer('bill', request_data, False)
     if serializer.is_valid():
         serializer.save()
+        bump_versions(pusher.id, ['bill'])
         return Response(data=serializer.data)
     else:
         return Response(data=serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-def handle_bill_modification(pusher, request_data):
+def handle_bill_modification(pusher, request_data, partial=False):
     # checking budget or fund validity
-    request_data = check_encapsulation_validity(request_data, pusher)
-    if isinstance(request_data, Response):
-        return request_data
+    if 'budget' in request_data or 'fund' in request_data:
+        request_data = check_encapsulation_validity(request_data, pusher)
+        if isinstance(request_data, Response):
+            return request_data
 
     # getting original bill
     item = request_data['item']
@@ -327,10 +526,372 @@ def handle_bill_modification(pusher, request_data):
                                status.HTTP_400_BAD_REQUEST)
     original = get_elective('bill', pusher, item, due_date)
 
-    serializer = get_serializer('bill', request_data, False)
+    serializer = get_serializer('bill', request_data, False, instance=original, partial=partial)
     if serializer.is_valid():
-        original.delete()
         serializer.save()
+        bump_versions(pusher.id, ['bill'])
         return Response(data=serializer.data)
     else:
         return Response(data=serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+# -------------------------------------- BULK Handling --------------------------------------
+BULK_ENTITY_MODELS = {
+    'income': Income,
+    'expense': Expense,
+    'paycheck': Paycheck,
+    'bill': Bills,
+}
+
+
+def build_entity(e_type, pusher, user, validated_data):
+    # mirrors the serializers' create() without the per-row pusher/user/budget/fund lookups
+    data = dict(validated_data)
+    data.update({'pusher': pusher, 'user': user})
+    for relation in ['budget', 'fund']:
+        if relation in data:
+            data[relation + '_id'] = relation_id(data.pop(relation))
+
+    if e_type == 'paycheck':
+        data['item'] = data['source'] + ' paycheck'
+    elif e_type == 'bill':
+        data['category'] = 'Bills'
+
+    return BULK_ENTITY_MODELS[e_type](**data)
+
+
+def resolve_bulk_encapsulations(pusher, records):
+    # one lookup per encapsulation type for every name referenced by the batch
+    names = {'budget': set(), 'fund': set()}
+    for record in records:
+        if isinstance(record, dict):
+            for e_type in names:
+                if isinstance(record.get(e_type), str):
+                    names[e_type].add(record[e_type])
+
+    return {
+        'budget': dict(Budget.objects.filter(pusher=pusher, name__in=names['budget']).values_list('name', 'id')),
+        'fund': dict(Fund.objects.filter(pusher=pusher, name__in=names['fund']).values_list('name', 'id')),
+    }
+
+
+def handle_bulk_ingestion(pusher, user, records):
+    encapsulations = resolve_bulk_encapsulations(pusher, records)
+    bill_items = {record.get('item') for record in records if isinstance(record, dict) and record.get('type') == 'bill'}
+    existing_bills = set(Bills.objects.filter(pusher=pusher, item__in=bill_items).values_list('item', 'due_date'))
+
+    errors = []
+    instances = {e_type: [] for e_type in BULK_ENTITY_MODELS}
+    for index, record in enumerate(records):
+        if not isinstance(record, dict) or record.get('type') not in BULK_ENTITY_MODELS:
+            errors.append({'index': index, 'errors': {'type': ["Must be one of " +
+                                                               ", ".join(BULK_ENTITY_MODELS) + "."]}})
+            continue
+
+        # same budget/fund resolution as check_encapsulation_validity
+        e_type = record['type']
+        request_data = dict(record)
+        request_data.update({'pusher': pusher.id, 'user': user.id})
+        encapsulation_error = None
+        for e_name, other in [('budget', 'fund'), ('fund', 'budget')]:
+            if e_name in request_data:
+                if request_data[e_name] not in encapsulations[e_name]:
+                    encapsulation_error = {e_name: ["The " + e_name + " [" + str(request_data[e_name]) +
+                                                    "] does not exist."]}
+                else:
+                    request_data.update({e_name: encapsulations[e_name][request_data[e_name]], other: None})
+                break
+        if encapsulation_error is not None:
+            errors.append({'index': index, 'errors': encapsulation_error})
+            continue
+
+        serializer = get_serializer(e_type, request_data, False)
+        if not serializer.is_valid():
+            errors.append({'index': index, 'errors': serializer.errors})
+            continue
+
+        if e_type == 'bill':
+            bill_key = (serializer.validated_data['item'], serializer.validated_data['due_date'])
+            if bill_key in existing_bills:
+                errors.append({'index': index, 'errors': {'item': ["The " + bill_key[0] + " bill due at [" +
+                                                                   str(bill_key[1]) + "] already exists."]}})
+                continue
+            existing_bills.add(bill_key)
+
+        instances[e_type].append(build_entity(e_type, pusher, user, serializer.validated_data))
+
+    created = {}
+    with transaction.atomic():
+        for e_type, objs in instances.items():
+            BULK_ENTITY_MODELS[e_type].objects.bulk_create(objs, batch_size=500)
+            created[e_type] = len(objs)
+        adjust_rollups((e_type, obj) for e_type, objs in instances.items() for obj in objs)
+        bump_versions(pusher.id, [e_type for e_type, objs in instances.items() if objs])
+
+    return Response(data={'created': created, 'errors': errors})
+
+
+# -------------------------------------- EXPORT Handling --------------------------------------
+EXPORT_ENTITY_TYPES = ['income', 'expense', 'paycheck', 'bill']
+EXPORT_CHUNK_SIZE = 2000
+
+
+class Echo:
+    # file-like object whose write() hands the written line back to the csv writer's caller
+    def write(self, value):
+        return value
+
+
+def export_rows(e_types, pusher):
+    # server-side cursor per type; only one chunk of rows is held in memory at a time
+    for e_type in e_types:
+        serializer = get_serializer(e_type, None, False)
+        for entity in get_entity_list(e_type, pusher).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            row = serializer.to_representation(entity)
+            row['type'] = e_type
+            yield row
+
+
+def export_ndjson(e_types, pusher):
+    for row in export_rows(e_types, pusher):
+        yield json.dumps(row) + '\n'
+
+
+def export_csv(e_types, pusher):
+    columns = ['type']
+    for e_type in e_types:
+        for name, field in get_serializer(e_type, None, False).fields.items():
+            if not field.write_only and name not in columns:
+                columns.append(name)
+
+    writer = csv.DictWriter(Echo(), fieldnames=columns, restval='')
+    yield writer.writeheader()
+    for row in export_rows(e_types, pusher):
+        yield writer.writerow(row)
+
+
+# -------------------------------------- IMPORT Handling --------------------------------------
+IMPORT_BATCH_SIZE = 500
+IMPORT_MAX_AMOUNT = Decimal('1000000')
+
+
+def statement_fingerprint(pusher, row, occurrence):
+    # occurrence tells apart identical transactions on the same day of one statement
+    key = "%d|%s|%s|%s|%d" % (pusher.id, row.date.isoformat(), row.amount, row.party.lower(), occurrence)
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def statement_day_offsets(model, pusher, days):
+    """
+    Imported rows are stamped with the microseconds after midnight UTC of their date, so the timestamp keeps
+    the date and stays unique per pusher for timestamp lookups. Returns the first free microsecond of each day,
+    past the rows earlier imports left in that first second.
+    """
+    offsets = dict.fromkeys(days, 0)
+    if not days:
+        return offsets
+    in_first_second = Q()
+    for day in days:
+        start = datetime.combine(day, time.min, tzinfo=dt_timezone.utc)
+        in_first_second |= Q(timestamp__gte=start, timestamp__lt=start + timedelta(seconds=1))
+    for timestamp in model.objects.filter(in_first_second, pusher=pusher).values_list('timestamp', flat=True):
+        timestamp = timestamp.astimezone(dt_timezone.utc)
+        offsets[timestamp.date()] = max(offsets[timestamp.date()], timestamp.microsecond + 1)
+    return offsets
+
+
+def build_statement_entity(pusher, user, row, fingerprint, timestamp):
+    party = row.party[:20] or 'unknown'
+    if row.is_income:
+        return Income(pusher=pusher, user=user, item=party, amount=row.amount, source=party,
+                      category=map_category(row.category, True), timestamp=timestamp, fingerprint=fingerprint)
+    return Expense(pusher=pusher, user=user, item=party, amount=-row.amount, party=party,
+                   category=map_category(row.category, False), timestamp=timestamp, fingerprint=fingerprint)
+
+
+def import_statement_batch(pusher, user, batch, result):
+    # fingerprints already hash in the pusher, so the lookup stays on the fingerprint index alone
+    fingerprints = [fingerprint for _, fingerprint in batch]
+    existing = set(Expense.objects.filter(fingerprint__in=fingerprints).values_list('fingerprint', flat=True))
+    existing.update(Income.objects.filter(fingerprint__in=fingerprints).values_list('fingerprint', flat=True))
+
+    rows = [(row, fingerprint) for row, fingerprint in batch if fingerprint not in existing]
+    result['duplicates'] += len(batch) - len(rows)
+
+    expenses, incomes = [], []
+    with transaction.atomic():
+        # imports of one pusher take turns, so two of them never hand out the same timestamps
+        Pusher.objects.select_for_update().get(id=pusher.id)
+        offsets = {}
+        for model, is_income in [(Expense, False), (Income, True)]:
+            days = {row.date for row, _ in rows if row.is_income == is_income}
+            offsets[is_income] = statement_day_offsets(model, pusher, days)
+
+        for row, fingerprint in rows:
+            offset = offsets[row.is_income][row.date]
+            offsets[row.is_income][row.date] += 1
+            timestamp = datetime.combine(row.date, time.min, tzinfo=dt_timezone.utc) + timedelta(microseconds=offset)
+            entity = build_statement_entity(pusher, user, row, fingerprint, timestamp)
+            (incomes if row.is_income else expenses).append(entity)
+
+        Expense.objects.bulk_create(expenses)
+        Income.objects.bulk_create(incomes)
+        adjust_rollups([('expense', expense) for expense in expenses] + [('income', income) for income in incomes])
+        bump_versions(pusher.id, ['expense', 'income'])
+    result['created']['expense'] += len(expenses)
+    result['created']['income'] += len(incomes)
+
+
+def handle_statement_import(pusher, user, upload, file_type):
+    result = {'created': {'expense': 0, 'income': 0}, 'duplicates': 0, 'errors': []}
+    occurrences = {}
+    batch = []
+
+    try:
+        for row in read_statement(upload, file_type):
+            if isinstance(row, StatementError):
+                result['errors'].append(str(row))
+                continue
+            if abs(row.amount) >= IMPORT_MAX_AMOUNT:
+                result['errors'].append("Line %d: The amount [%s] is too large." % (row.line, row.amount))
+                continue
+
+            row.amount = row.amount.quantize(Decimal('0.01'))
+            key = (row.date, row.amount, row.party.lower())
+            occurrences[key] = occurrences.get(key, 0) + 1
+            batch.append((row, statement_fingerprint(pusher, row, occurrences[key])))
+
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                import_statement_batch(pusher, user, batch, result)
+                batch = []
+        import_statement_batch(pusher, user, batch, result)
+
+    except StatementError as e:
+        return custom_response(str(e), status.HTTP_400_BAD_REQUEST)
+
+    return Response(data=result)
+
+
+# -------------------------------------- SEARCH Handling --------------------------------------
+def get_search_results(e_type, pusher, query, limit):
+    terms = search_terms(query)
+    if not terms:
+        return custom_response("The search must contain a word.", status.HTTP_400_BAD_REQUEST)
+
+    # ranked ids from the search index, then the rows with the joins of the entity listing, in rank order
+    ids = search_ids(e_type, pusher, terms, limit)
+    entities = get_entity_list(e_type, pusher).in_bulk(ids)
+    return [entities[entity_id] for entity_id in ids if entity_id in entities]
+
+
+# -------------------------------------- DASHBOARD Handling --------------------------------------
+DASHBOARD_ENCAPSULATIONS = [
+    ('budget', Budget, BudgetValue, BudgetLatestSerializer),
+    ('fund', Fund, FundValue, FundLatestSerializer),
+    ('account', Account, AccountValue, AccountLatestSerializer),
+]
+DASHBOARD_ENTITIES = [
+    ('income', IncomeSerializer),
+    ('expense', ExpenseSerializer),
+    ('paycheck', PaycheckSerializer),
+    ('bill', BillSerializer),
+]
+MAX_DASHBOARD_RECENT = 50
+
+
+def latest_value(value_model, field, column):
+    # read through the (encapsulation, -timestamp) index of the value table
+    return Subquery(value_model.objects.filter(**{field: OuterRef('pk')}).order_by('-timestamp').values(column)[:1])
+
+
+def get_dashboard(pusher, recent, today):
+    """
+    Everything the app opens on, in a fixed number of queries: the pusher read fresh, as the access cache may
+    hold an older net worth, each encapsulation type with its latest values as subqueries, the newest entities
+    of each type and the unpaid bills due from today.
+    """
+    pusher = Pusher.objects.select_related('primaryUser').get(id=pusher.id)
+    # as a string, like every decimal the serializers return
+    data = {'pusher': PusherSerializer(pusher).data, 'net_worth': str(pusher.net_worth)}
+
+    for e_type, model, value_model, serializer_class in DASHBOARD_ENCAPSULATIONS:
+        encapsulations = model.objects.filter(pusher=pusher).select_related('pusher').order_by('id').annotate(
+            value=latest_value(value_model, e_type, 'value'),
+            value_timestamp=latest_value(value_model, e_type, 'timestamp'))
+        data[e_type + 's'] = serializer_class(encapsulations, many=True).data
+
+    data['recent'] = {}
+    for e_type, serializer_class in DASHBOARD_ENTITIES:
+        data['recent'][e_type] = serializer_class(get_entity_list(e_type, pusher)[:recent], many=True).data
+
+    upcoming = Bills.objects.filter(pusher=pusher, due_date__gte=today).exclude(status__iexact=PAID_BILL_STATUS) \
+        .select_related('user', 'budget', 'fund').order_by('due_date', 'id')[:recent]
+    data['upcoming_bills'] = BillSerializer(upcoming, many=True).data
+    return data
+
+
+# -------------------------------------- SUMMARY Handling --------------------------------------
+def parse_period(value, default):
+    # periods are passed as YYYY-MM and bucketed on the first of the month
+    if value is None:
+        return default
+    return datetime.strptime(value, '%Y-%m').date()
+
+
+def get_summary(pusher, start, end, e_types):
+    return SpendingRollup.objects.filter(pusher=pusher, period__gte=start, period__lte=end,
+                                         entity_type__in=e_types) \
+        .values('period', 'entity_type', 'category', 'budget__name', 'fund__name') \
+        .annotate(total=Sum('total'), count=Sum('count')) \
+        .filter(count__gt=0) \
+        .order_by('period', 'entity_type', 'category', 'budget__name', 'fund__name')
+
+
+# -------------------------------------- VERSION Handling --------------------------------------
+def get_version(pusher, e_type):
+    return PusherVersion.objects.filter(pusher=pusher, entity_type=e_type) \
+        .values_list('version', flat=True).first() or 0
+
+
+def get_user_pushers_version(user):
+    # pushers listed by pusher/all/ with their versions; creating, renaming or deleting one changes it
+    versions = PusherVersion.objects.filter(pusher=OuterRef('pk'), entity_type='pusher').values('version')[:1]
+    pushers = Pusher.objects.filter(primaryUser=user).order_by('id') \
+        .annotate(version=Subquery(versions)).values_list('id', 'version')
+    return hashlib.sha1(repr((user.username, list(pushers))).encode()).hexdigest()
+
+
+def get_etag(request, pusher, e_type):
+    # one indexed lookup; the query string is part of the tag so every page and filter is tagged separately
+    version = get_version(pusher, e_type)
+    digest = hashlib.sha1(request.get_full_path().encode()).hexdigest()[:16]
+    return quote_etag("%s-%d-%s" % (e_type, version, digest))
+
+
+def handle_etag(request, pusher, e_type):
+    # a 304 for a matching If-None-Match, sent before any listing query or serialization; the ETag otherwise
+    etag = get_etag(request, pusher, e_type)
+    etags = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+    if etag in etags or '*' in etags:
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+    return etag
+
+
+def tagged(response, etag):
+    if response.status_code == status.HTTP_200_OK:
+        response['ETag'] = etag
+    return response
+
+
+# -------------------------------------- NET WORTH Handling --------------------------------------
+def parse_timestamp(value, default):
+    # dates are taken as midnight, datetimes without an offset as UTC
+    if value is None:
+        return default
+    timestamp = parse_datetime(value)
+    if timestamp is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(value)
+        return day_start(day)
+    return timestamp if timezone.is_aware(timestamp) else timezone.make_aware(timestamp, dt_timezone.utc)
@@ -0,0 +1,122 @@
+import numpy as np
+
+from .budget_periods import PERIOD_STEPS, add_months
+from .models import Bills, Subscription
+
+FORECAST_BUCKETS = ['daily', 'weekly', 'monthly']
+# statuses are free text, so they are matched case-insensitively
+ACTIVE_SUBSCRIPTION_STATUS = 'active'
+PAID_BILL_STATUS = 'paid'
+
+
+def to_cents(amounts):
+    return np.rint(np.asarray(amounts, dtype=np.float64) * 100).astype(np.int64)
+
+
+def expand_day_steps(starts, steps, amounts, first, end):
+    """
+    Every occurrence in [first, end) of payments repeating every `steps` days from `starts`, as parallel
+    arrays of dates and amounts.
+    """
+    # index of the first occurrence on or after the forecast start
+    skipped = np.maximum(0, -((starts - first).astype(np.int64) // steps))
+    firsts = starts + skipped * steps
+    counts = np.maximum(0, -((end - firsts).astype(np.int64) // -steps))
+
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    dates = np.repeat(firsts, counts) + offsets * np.repeat(steps, counts)
+    return dates, np.repeat(amounts, counts)
+
+
+def expand_month_steps(starts, steps, amounts, first, end):
+    # months are stepped on the anchor's day of month, clamped to shorter months
+    start_months = starts.astype('datetime64[M]')
+    anchor_days = (starts - start_months.astype('datetime64[D]')).astype(np.int64)
+    month_steps = np.asarray(steps, dtype=np.int64)
+
+    first_month, end_month = first.astype('datetime64[M]'), end.astype('datetime64[M]')
+    skipped = np.maximum(0, -((start_months - first_month).astype(np.int64) // month_steps))
+    counts = np.maximum(0, (end_month - start_months).astype(np.int64) // month_steps - skipped + 1)
+
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    months = np.repeat(start_months, counts) + (np.repeat(skipped, counts) + offsets) * np.repeat(month_steps, counts)
+    month_days = ((months + 1).astype('datetime64[D]') - months.astype('datetime64[D]')).astype(np.int64)
+    dates = months.astype('datetime64[D]') + np.minimum(np.repeat(anchor_days, counts), month_days - 1)
+
+    # the first and last months can fall outside the window once the day is applied
+    inside = (dates >= first) & (dates < end)
+    return dates[inside], np.repeat(amounts, counts)[inside]
+
+
+def bucket_starts(dates, first, bucket):
+    if bucket == 'daily':
+        return dates
+    if bucket == 'weekly':
+        return first + ((dates - first).astype(np.int64) // 7) * 7
+    return dates.astype('datetime64[M]').astype('datetime64[D]')
+
+
+def bucket_grid(first, end, bucket):
+    if bucket == 'daily':
+        return np.arange(first, end, dtype='datetime64[D]')
+    if bucket == 'weekly':
+        return np.arange(first, end, 7, dtype='datetime64[D]')
+    return np.arange(first.astype('datetime64[M]'), end.astype('datetime64[M]') + 1,
+                     dtype='datetime64[M]').astype('datetime64[D]')
+
+
+def bucket_totals(grid, dates, cents, first, bucket):
+    index = np.searchsorted(grid, bucket_starts(dates, first, bucket))
+    return np.bincount(index, weights=cents, minlength=len(grid)).astype(np.int64)
+
+
+def get_forecast(pusher, today, months, bucket):
+    """
+    Expands every active subscription and unpaid bill of the pusher into dated outflows from today until
+    `months` months ahead, summed per daily, weekly or monthly bucket.
+    """
+    first = np.datetime64(today, 'D')
+    end = np.datetime64(add_months(today, months), 'D')
+    errors = []
+
+    # subscriptions, split by whether their pay period steps in days or months
+    by_unit = {'days': ([], [], []), 'months': ([], [], [])}
+    subscriptions = Subscription.objects.filter(pusher=pusher, status__iexact=ACTIVE_SUBSCRIPTION_STATUS) \
+        .values_list('item', 'amount', 'pay_period', 'start_date')
+    for item, amount, pay_period, start_date in subscriptions:
+        step = PERIOD_STEPS.get(pay_period.lower())
+        if step is None:
+            errors.append({'item': item, 'description': "The pay period " + pay_period + " is not allowed."})
+            continue
+        starts, steps, amounts = by_unit['months' if step[0] else 'days']
+        starts.append(start_date)
+        steps.append(step[0] or step[1])
+        amounts.append(amount)
+
+    sub_dates, sub_cents = [], []
+    for unit, expand in [('days', expand_day_steps), ('months', expand_month_steps)]:
+        starts, steps, amounts = by_unit[unit]
+        if starts:
+            dates, cents = expand(np.array(starts, dtype='datetime64[D]'), np.array(steps, dtype=np.int64),
+                                  to_cents(amounts), first, end)
+            sub_dates.append(dates)
+            sub_cents.append(cents)
+
+    bills = np.array(list(Bills.objects.filter(pusher=pusher, due_date__gte=today, due_date__lt=end.item())
+                          .exclude(status__iexact=PAID_BILL_STATUS).values_list('due_date', 'amount')), dtype=object)
+
+    grid = bucket_grid(first, end, bucket)
+    subscription_totals = np.zeros(len(grid), dtype=np.int64)
+    if sub_dates:
+        subscription_totals = bucket_totals(grid, np.concatenate(sub_dates), np.concatenate(sub_cents), first, bucket)
+    bill_totals = np.zeros(len(grid), dtype=np.int64)
+    if len(bills):
+        bill_totals = bucket_totals(grid, bills[:, 0].astype('datetime64[D]'), to_cents(bills[:, 1].astype(float)),
+                                    first, bucket)
+
+    totals = subscription_totals + bill_totals
+    series = [{'start': str(start), 'subscriptions': subs / 100, 'bills': bill / 100, 'total': total / 100}
+              for start, subs, bill, total in zip(grid, subscription_totals.tolist(), bill_totals.tolist(),
+                                                  totals.tolist())]
+    return {'start': str(first), 'end': str(end), 'bucket': bucket, 'total': int(totals.sum()) / 100,
+            'series': series, 'errors': errors}
@@ -0,0 +1,187 @@
+import contextvars
+import heapq
+import json
+import logging
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connection
+from django.db.backends.signals import connection_created
+from rest_framework.renderers import JSONRenderer
+
+logger = logging.getLogger('controller.timing')
+
+# timing of the request being handled; copied into the threads sync_to_async runs queries on
+CURRENT_TIMING = contextvars.ContextVar('request_timing', default=None)
+
+
+class RequestTiming:
+    """
+    Query count, SQL time and the time spent authenticating and serializing during one request. Auth and
+    serialize exclude the queries run inside them, so they are CPU the database cannot be blamed for.
+    """
+
+    def __init__(self, slowest):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql = 0.0
+        self.phases = {'auth': 0.0, 'serialize': 0.0}
+        self.phase = None
+        self.slowest = slowest
+        self.statements = []
+
+    def record_query(self, sql, duration):
+        self.queries += 1
+        self.sql += duration
+        if self.slowest:
+            entry = (duration, self.queries, sql)
+            if len(self.statements) < self.slowest:
+                heapq.heappush(self.statements, entry)
+            else:
+                heapq.heappushpop(self.statements, entry)
+
+    def slowest_statements(self):
+        return [{'ms': round(duration * 1000, 2), 'sql': sql}
+                for duration, _, sql in sorted(self.statements, reverse=True)]
+
+
+def record_query(execute, sql, params, many, context):
+    timing = CURRENT_TIMING.get()
+    if timing is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timing.record_query(sql, time.perf_counter() - started)
+
+
+@contextmanager
+def timed_phase(name):
+    timing = CURRENT_TIMING.get()
+    # a serializer nested in another is part of its parent's time
+    if timing is None or timing.phase is not None:
+        yield
+        return
+
+    timing.phase = name
+    started, sql = time.perf_counter(), timing.sql
+    try:
+        yield
+    finally:
+        timing.phase = None
+        timing.phases[name] += time.perf_counter() - started - (timing.sql - sql)
+
+
+class TimedAuthenticationMixin:
+    """
+    Counts an authentication class towards the request's auth time.
+    """
+
+    def authenticate(self, request):
+        with timed_phase('auth'):
+            return super().authenticate(request)
+
+
+class TimedSerializerMixin:
+    """
+    Counts validation and representation towards the request's serialize time. A many=True list serializer
+    validates and represents each row through its child, so the mixin on the child covers lists too.
+    """
+
+    def run_validation(self, *args, **kwargs):
+        with timed_phase('serialize'):
+            return super().run_validation(*args, **kwargs)
+
+    def to_representation(self, instance):
+        with timed_phase('serialize'):
+            return super().to_representation(instance)
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer counted towards the request's serialize time; the default renderer in settings.REST_FRAMEWORK.
+    """
+
+    def render(self, *args, **kwargs):
+        with timed_phase('serialize'):
+            return super().render(*args, **kwargs)
+
+
+def watch_connection(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def watch_queries():
+    # queries are only timed while a request has set CURRENT_TIMING
+    connection_created.connect(watch_connection, dispatch_uid='controller.instrumentation')
+
+
+class RequestTimingMiddleware:
+    """
+    Reports query count, SQL time, auth time and serializer time of each request in a Server-Timing header and
+    a JSON log line on the controller.timing logger. Requests slower than REQUEST_TIMING_SLOW_MS also log their
+    slowest statements. Opt-in with REQUEST_TIMING=true, as it wraps every query. Auth and serializer time come
+    from the Timed* authentication classes, serializers and renderer, which cost a context variable lookup per call
+    while no request is timed.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        watch_queries()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        # connections opened before watch_queries() are not announced by connection_created
+        watch_connection(None, connection)
+        timing = RequestTiming(settings.REQUEST_TIMING_SLOW_QUERIES)
+        token = CURRENT_TIMING.set(timing)
+        try:
+            response = self.get_response(request)
+        finally:
+            CURRENT_TIMING.reset(token)
+        return self.report(request, response, timing)
+
+    async def __acall__(self, request):
+        timing = RequestTiming(settings.REQUEST_TIMING_SLOW_QUERIES)
+        token = CURRENT_TIMING.set(timing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            CURRENT_TIMING.reset(token)
+        return self.report(request, response, timing)
+
+    def report(self, request, response, timing):
+        total = (time.perf_counter() - timing.started) * 1000
+        line = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total, 2),
+            'db_ms': round(timing.sql * 1000, 2),
+            'queries': timing.queries,
+            'auth_ms': round(timing.phases['auth'] * 1000, 2),
+            'serialize_ms': round(timing.phases['serialize'] * 1000, 2),
+        }
+
+        response['Server-Timing'] = 'db;dur=%.2f;desc="%d queries", auth;dur=%.2f, serialize;dur=%.2f, ' \
+                                    'total;dur=%.2f' % (line['db_ms'], line['queries'], line['auth_ms'],
+                                                        line['serialize_ms'], line['total_ms'])
+
+        if total >= settings.REQUEST_TIMING_SLOW_MS:
+            line['slowest'] = timing.slowest_statements()
+            logger.warning(json.dumps(line))
+        else:
+            logger.info(json.dumps(line))
+        return response
@@ -0,0 +1,59 @@
+import threading
+import time
+from collections import OrderedDict
+
+from .metrics import record_cache_lookup
+
+
+class ExpiringLRUCache:
+    """
+    Bounded, thread-safe LRU cache local to the worker process. Entries also expire after ttl seconds,
+    which bounds how long other workers can serve an entry this process has invalidated. Lookups are counted
+    in /metrics under name.
+    """
+
+    def __init__(self, name, max_size, ttl):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        value = self.lookup(key)
+        record_cache_lookup(self.name, value is not None)
+        return value
+
+    def lookup(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+
+            value, expires = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def delete_where(self, predicate):
+        # predicate(key, value) -> True for entries to drop
+        with self.lock:
+            for key in [key for key, (value, _) in self.entries.items() if predicate(key, value)]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
@@ -0,0 +1,45 @@
+import base64
+import time
+
+from django.contrib.auth import authenticate
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from controller.authentication import issue_token, revoke_token
+
+
+class Command(BaseCommand):
+    help = "Compares in-process request throughput of user/details/ under Basic and token authentication."
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('password')
+        parser.add_argument('--requests', type=int, default=50, help="requests sent per authentication scheme")
+
+    def handle(self, *args, **options):
+        user = authenticate(username=options['username'], password=options['password'])
+        if user is None:
+            raise CommandError("The username or password is not valid.")
+
+        credentials = base64.b64encode(("%s:%s" % (options['username'], options['password'])).encode()).decode()
+        key, token = issue_token(user)
+        try:
+            schemes = [('basic', 'Basic ' + credentials), ('token', 'Token ' + key)]
+            results = {name: self.run(header, options['requests']) for name, header in schemes}
+        finally:
+            revoke_token(token)
+
+        for name, elapsed in results.items():
+            self.stdout.write("%-6s %8.1f req/s  %8.2f ms/req" %
+                              (name, options['requests'] / elapsed, elapsed * 1000 / options['requests']))
+        self.stdout.write(self.style.SUCCESS("token auth is %.1fx the throughput of basic auth" %
+                                             (results['basic'] / results['token'])))
+
+    def run(self, header, requests):
+        client = Client(HTTP_AUTHORIZATION=header)
+        start = time.perf_counter()
+        for _ in range(requests):
+            response = client.get('/user/details/')
+            if response.status_code != 200:
+                raise CommandError("user/details/ answered %d." % response.status_code)
+        return time.perf_counter() - start
@@ -0,0 +1,176 @@
+import json
+import os
+import subprocess
+import tempfile
+import threading
+import warnings
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler, get_internal_wsgi_application
+from django.db import connection
+from django.utils import timezone
+
+from controller.benchmark import *
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    # headers and body are written separately, which Nagle's algorithm would hold back for a delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = "Load tests every route in configuration/urls.py over HTTP against seeded data and saves throughput, " \
+           "latency percentiles and queries per request as JSON. By default a throwaway test database and an " \
+           "in-process threaded server are used; --url drives a running server, seeding the database it shares " \
+           "with this command."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help="base url of a running server (default: boot one in-process)")
+        parser.add_argument('--concurrency', type=int, default=8, help="connections sending requests at once")
+        parser.add_argument('--seconds', type=float, default=3, help="duration of each scenario")
+        parser.add_argument('--rows', type=int, default=1000, help="seeded rows of each entity and value type")
+        parser.add_argument('--write_ratio', type=float, default=0.2,
+                            help="share of writes in the closing mixed workload; negative to skip it")
+        parser.add_argument('--scenario', action='append', default=[],
+                            help="only run scenarios whose name contains this (repeatable)")
+        parser.add_argument('--seed', type=int, default=0, help="seed of the data and the mixed workload")
+        parser.add_argument('--output', help="JSON file for the results (default: benchmarks/<commit>.json)")
+        parser.add_argument('--baseline', help="earlier results file to compare against")
+
+    def handle(self, *args, **options):
+        scenarios = [scenario for scenario in SCENARIOS
+                     if not options['scenario'] or any(part in scenario[0] for part in options['scenario'])]
+        if not scenarios:
+            raise CommandError("No scenario matches " + ", ".join(options['scenario']) + ".")
+        if options['concurrency'] < 1 or options['seconds'] <= 0:
+            raise CommandError("The concurrency and seconds must be positive.")
+
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as file:
+                baseline = json.load(file)
+
+        # DELETE /entity/ parses its timestamp parameter into a naive datetime on every request
+        warnings.filterwarnings('ignore', "DateTimeField .* received a naive datetime", RuntimeWarning)
+
+        test_database = None
+        if options['url'] is None:
+            test_database = self.create_test_database()
+        server = None
+        try:
+            fixture = seed_benchmark_data(options['rows'], options['seed'])
+            counter = None
+            base_url = options['url']
+            if base_url is None:
+                server, counter = self.start_server()
+                base_url = 'http://%s:%d' % server.server_address[:2]
+
+            results = {
+                'commit': self.commit(),
+                'date': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'server': options['url'] or 'in-process',
+                'concurrency': options['concurrency'],
+                'seconds': options['seconds'],
+                'rows': options['rows'],
+                'scenarios': {},
+            }
+
+            for scenario in scenarios:
+                run = drive(base_url, fixture, lambda rng: scenario, options['concurrency'], options['seconds'],
+                            options['seed'])
+                results['scenarios'][scenario[0]] = self.summary(run, scenario[0], options['seconds'], counter)
+                self.report(scenario[0], results['scenarios'][scenario[0]], baseline, 'scenarios')
+
+            reads = [scenario for scenario in scenarios if scenario[1] == 'read']
+            writes = [scenario for scenario in scenarios if scenario[1] == 'write']
+            if options['write_ratio'] >= 0 and (reads or writes):
+                results['mixed'] = self.mixed(base_url, fixture, reads, writes, options, counter, baseline)
+
+            if options['url'] is not None:
+                remove_benchmark_data(fixture)
+        finally:
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+            if test_database is not None:
+                connection.creation.destroy_test_db(test_database, verbosity=0)
+
+        output = options['output'] or os.path.join('benchmarks', results['commit'] + '.json')
+        if os.path.dirname(output):
+            os.makedirs(os.path.dirname(output), exist_ok=True)
+        with open(output, 'w') as file:
+            json.dump(results, file, indent=2)
+        self.stdout.write(self.style.SUCCESS("Results saved to " + output + "."))
+
+    def mixed(self, base_url, fixture, reads, writes, options, counter, baseline):
+        ratio = options['write_ratio'] if reads else 1
+        if not writes:
+            ratio = 0
+
+        def pick(rng):
+            return rng.choice(writes) if rng.random() < ratio else rng.choice(reads)
+
+        run = drive(base_url, fixture, pick, options['concurrency'], options['seconds'] * 5, options['seed'])
+        total = {'latencies': [latency for result in run.values() for latency in result['latencies']],
+                 'statuses': {}}
+        for result in run.values():
+            for code, count in result['statuses'].items():
+                total['statuses'][code] = total['statuses'].get(code, 0) + count
+
+        mixed = {'write_ratio': ratio, 'total': summarize(total, options['seconds'] * 5), 'scenarios': {}}
+        for name in run:
+            mixed['scenarios'][name] = self.summary(run, name, options['seconds'] * 5, counter)
+        self.report("mixed (%d%% writes)" % round(ratio * 100), mixed['total'],
+                    baseline and baseline.get('mixed'), 'total')
+        return mixed
+
+    def summary(self, run, name, seconds, counter):
+        queries = None
+        if counter is not None:
+            with counter.lock:
+                queries = counter.counts.pop(name, None)
+        return summarize(run.get(name, {'latencies': [], 'statuses': {}}), seconds, queries)
+
+    def report(self, name, summary, baseline, section):
+        line = "%-44s %7.1f req/s  p50 %7s  p95 %7s  p99 %7s  queries %4s  errors %d" % (
+            name, summary['throughput'], self.ms(summary['p50_ms']), self.ms(summary['p95_ms']),
+            self.ms(summary['p99_ms']), summary['queries'] if summary['queries'] is not None else '-',
+            summary['errors'])
+
+        previous = None
+        if baseline is not None:
+            previous = baseline.get(section, {}).get(name) if section == 'scenarios' else baseline.get(section)
+        if previous and previous['throughput']:
+            line += "  (%+.0f%% req/s)" % ((summary['throughput'] / previous['throughput'] - 1) * 100)
+        self.stdout.write(self.style.ERROR(line) if summary['errors'] else line)
+
+    @staticmethod
+    def ms(value):
+        return '-' if value is None else "%.1fms" % value
+
+    def create_test_database(self):
+        # a file for SQLite rather than the in-memory test database, so the server threads can share it
+        if connection.vendor == 'sqlite':
+            connection.settings_dict['TEST']['NAME'] = os.path.join(tempfile.mkdtemp(), 'benchmark.sqlite3')
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        return old_name
+
+    def start_server(self):
+        counter = QueryCounter(get_internal_wsgi_application())
+        server = ThreadedWSGIServer(('127.0.0.1', 0), QuietRequestHandler, allow_reuse_address=False)
+        server.set_app(counter)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server, counter
+
+    def commit(self):
+        try:
+            return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, check=True,
+                                  capture_output=True, text=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return 'unknown'
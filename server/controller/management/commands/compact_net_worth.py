@@ -0,0 +1,91 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from controller.budget_periods import day_start
+from controller.models import *
+from controller.serializers import bump_versions
+
+COMPACTION_RESOLUTIONS = ['day', 'week']
+
+
+def bucket_start(day, resolution):
+    if resolution == 'week':
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+class Command(BaseCommand):
+    help = "Compacts old net worth history to one point per day or week, following settings.NET_WORTH_COMPACTION."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pusher_key', help="only compact this pusher's history")
+        parser.add_argument('--batch_size', type=int, default=1000, help="rows read and deleted per statement")
+        parser.add_argument('--dry_run', action='store_true', help="report the rows that would be removed")
+
+    def handle(self, *args, **options):
+        rules = sorted(settings.NET_WORTH_COMPACTION, key=lambda rule: rule['older_than_days'])
+        for rule in rules:
+            if rule['resolution'] not in COMPACTION_RESOLUTIONS:
+                raise CommandError("The resolution " + rule['resolution'] + " is not allowed.")
+
+        pushers = Pusher.objects.all()
+        if options['pusher_key']:
+            pushers = pushers.filter(key=options['pusher_key'])
+            if not pushers.exists():
+                raise CommandError("The pusher_key " + options['pusher_key'] + " is not valid.")
+
+        today = timezone.localdate()
+        reclaimed = 0
+        for pusher in pushers.iterator():
+            # each rule covers the ages up to the next, coarser one; cutoffs sit on bucket boundaries
+            end = None
+            for rule in reversed(rules):
+                cutoff = day_start(bucket_start(today - timedelta(days=rule['older_than_days']), rule['resolution']))
+                start, end = end, cutoff
+                removed = self.compact(pusher, start, end, rule['resolution'], options['batch_size'],
+                                       options['dry_run'])
+                if removed:
+                    self.stdout.write("PUSHER %s: %d point(s) compacted to one per %s." %
+                                      (pusher.key, removed, rule['resolution']))
+                reclaimed += removed
+
+        verb = "Would reclaim" if options['dry_run'] else "Reclaimed"
+        self.stdout.write(self.style.SUCCESS("%s %d net worth row(s)." % (verb, reclaimed)))
+
+    def compact(self, pusher, start, end, resolution, batch_size, dry_run):
+        """
+        Keeps the last point of every bucket in [start, end). Rows are walked in timestamp order a batch at a
+        time and each delete is its own short statement, so writers are never blocked for the whole run.
+        """
+        points = ExpNetWorth.objects.filter(pusher=pusher, timestamp__lt=end).order_by('timestamp', 'id')
+        if start is not None:
+            points = points.filter(timestamp__gte=start)
+
+        removed = 0
+        held, held_bucket, after = None, None, None
+        while True:
+            page = points
+            if after is not None:
+                page = page.filter(timestamp__gte=after[0]).exclude(timestamp=after[0], id__lte=after[1])
+            rows = list(page.values_list('id', 'timestamp')[:batch_size])
+            if not rows:
+                break
+
+            # a point is dropped once a later one in the same bucket is seen
+            doomed = []
+            for point_id, timestamp in rows:
+                bucket = bucket_start(timezone.localtime(timestamp).date(), resolution)
+                if bucket == held_bucket:
+                    doomed.append(held)
+                held, held_bucket = point_id, bucket
+            after = rows[-1][1], rows[-1][0]
+
+            if not dry_run and doomed:
+                ExpNetWorth.objects.filter(id__in=doomed).delete()
+                bump_versions(pusher.id, ['net_worth'])
+            removed += len(doomed)
+
+        return removed
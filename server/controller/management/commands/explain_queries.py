@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from controller.models import *
+
+
+class Command(BaseCommand):
+    help = "Prints the query plan and timing of the hot per-pusher lookups. " \
+           "Run it before and after `migrate controller 0002` to compare plans."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pusher_key', help="pusher to run the lookups against (default: first pusher)")
+        parser.add_argument('--repeat', type=int, default=20, help="times each query is timed")
+
+    def handle(self, *args, **options):
+        if options['pusher_key']:
+            pusher = Pusher.objects.filter(key=options['pusher_key']).first()
+        else:
+            pusher = Pusher.objects.first()
+        if pusher is None:
+            raise CommandError("No pusher to run the lookups against.")
+
+        budget = Budget.objects.filter(pusher=pusher).first()
+        fund = Fund.objects.filter(pusher=pusher).first()
+        account = Account.objects.filter(pusher=pusher).first()
+
+        queries = [
+            ('income list', Income.objects.filter(pusher=pusher)),
+            ('expense list', Expense.objects.filter(pusher=pusher)),
+            ('paycheck list', Paycheck.objects.filter(pusher=pusher)),
+            ('bill list', Bills.objects.filter(pusher=pusher)),
+            ('net worth list', ExpNetWorth.objects.filter(pusher=pusher)),
+            ('for_sale lookup', Trade.objects.filter(pusher=pusher, item='', type='for_sale')),
+        ]
+        if budget is not None:
+            queries.append(('budget value list', BudgetValue.objects.filter(budget=budget.id)))
+        if fund is not None:
+            queries.append(('fund value list', FundValue.objects.filter(fund=fund.id)))
+        if account is not None:
+            queries.append(('account value list', AccountValue.objects.filter(account=account.id)))
+
+        for name, queryset in queries:
+            # same shape as a first page served by ResponsePagination
+            page = queryset[:50]
+            elapsed = 0.0
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                list(page)
+                elapsed += time.perf_counter() - start
+
+            self.stdout.write(self.style.MIGRATE_HEADING("%s (%.3f ms avg)" %
+                                                         (name, elapsed * 1000 / options['repeat'])))
+            self.stdout.write(page.explain())
+            self.stdout.write("")
@@ -0,0 +1,56 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from controller.models import User
+from controller.synthetic import SyntheticData
+
+
+class Command(BaseCommand):
+    help = "Generates pushers of realistic synthetic data for scale testing. Runs with the same seed and end date " \
+           "produce the same rows. Generated users have no usable password; set one with `changepassword`."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pushers', type=int, default=1, help="pushers to generate")
+        parser.add_argument('--users', type=int, default=2, help="users with access to each pusher")
+        parser.add_argument('--budgets', type=int, default=4, help="budgets per pusher")
+        parser.add_argument('--funds', type=int, default=2, help="funds per pusher")
+        parser.add_argument('--accounts', type=int, default=3, help="accounts per pusher")
+        parser.add_argument('--years', type=int, default=2, help="years of history")
+        parser.add_argument('--expenses', type=int, default=120, help="expenses per pusher a month")
+        parser.add_argument('--incomes', type=int, default=6, help="incomes per pusher a month")
+        parser.add_argument('--bills', type=int, default=5, help="monthly bills per pusher")
+        parser.add_argument('--subscriptions', type=int, default=8, help="subscriptions per pusher")
+        parser.add_argument('--trades', type=int, default=6, help="for sale and desired purchases per pusher")
+        parser.add_argument('--value_hours', type=int, default=24,
+                            help="hours between the budget, fund and account values (and net worth points)")
+        parser.add_argument('--end', type=date.fromisoformat, help="last day of the history (default: today)")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch_size', type=int, default=10000, help="rows written per bulk_create")
+        parser.add_argument('--prefix', default='synthetic', help="username prefix of the generated users")
+
+    def handle(self, *args, **options):
+        if min(options['pushers'], options['users'], options['years'], options['value_hours'],
+               options['batch_size']) < 1:
+            raise CommandError("The pushers, users, years, value_hours and batch_size must be at least 1.")
+        if User.objects.filter(username__startswith=options['prefix'] + '_').exists():
+            raise CommandError("Users prefixed " + options['prefix'] + " already exist; pick another --prefix.")
+
+        generator = SyntheticData(options['seed'], options['batch_size'], options['end'])
+        started = time.perf_counter()
+        for index in range(options['pushers']):
+            pusher, users = generator.pusher(
+                '%s_%d' % (options['prefix'], index), users=options['users'], budgets=options['budgets'],
+                funds=options['funds'], accounts=options['accounts'], years=options['years'],
+                expenses=options['expenses'], incomes=options['incomes'], bills=options['bills'],
+                subscriptions=options['subscriptions'], trades=options['trades'],
+                value_hours=options['value_hours'])
+            self.stdout.write("PUSHER %s: %d user(s), primary user %s." % (pusher.key, len(users), users[0].username))
+
+        elapsed = time.perf_counter() - started
+        for model, rows in generator.counts.items():
+            self.stdout.write("%-14s %10d" % (model, rows))
+        total = sum(generator.counts.values())
+        self.stdout.write(self.style.SUCCESS("Generated %d rows in %.1fs (%.0f rows/s)." %
+                                             (total, elapsed, total / elapsed)))
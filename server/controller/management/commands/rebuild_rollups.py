@@ -0,0 +1,65 @@
+from django.apps import apps as current_apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Sum, Value
+from django.db.models.functions import TruncMonth
+
+from controller.models import *
+
+ROLLUP_SOURCES = [
+    ('income', 'Income', False),
+    ('expense', 'Expense', True),
+    ('paycheck', 'Paycheck', False),
+    ('bill', 'Bills', True),
+]
+
+
+def rebuild_rollups(apps, pusher_ids=None):
+    """
+    Replaces the rollups of the pushers (all of them by default) with ones summed from the raw rows. Takes the
+    app registry, so migrations can run it on their historical models. Returns the rows deleted and created.
+    """
+    rollup_model = apps.get_model('controller', 'SpendingRollup')
+    with transaction.atomic():
+        existing = rollup_model.objects.all()
+        if pusher_ids is not None:
+            existing = existing.filter(pusher_id__in=pusher_ids)
+        deleted, _ = existing.delete()
+
+        created = 0
+        for e_type, model_name, has_encapsulation in ROLLUP_SOURCES:
+            groups = ['pusher', 'period', 'category']
+            if has_encapsulation:
+                groups += ['budget', 'fund']
+
+            rows = apps.get_model('controller', model_name).objects.filter(timestamp__isnull=False)
+            if pusher_ids is not None:
+                rows = rows.filter(pusher_id__in=pusher_ids)
+            rows = rows.annotate(period=TruncMonth('timestamp')).order_by()
+            if e_type == 'paycheck':
+                rows = rows.annotate(category=Value('paycheck'))
+            rows = rows.values(*groups).annotate(total=Sum('amount'), count=Count('id'))
+
+            rollups = (rollup_model(pusher_id=row['pusher'], period=row['period'].date(), entity_type=e_type,
+                                    category=row['category'], budget_id=row.get('budget'), fund_id=row.get('fund'),
+                                    total=row['total'], count=row['count'])
+                       for row in rows.iterator())
+            created += len(rollup_model.objects.bulk_create(rollups, batch_size=1000))
+    return deleted, created
+
+
+class Command(BaseCommand):
+    help = "Regenerates the spending rollup table from the raw income, expense, paycheck and bill rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pusher_key', help="only rebuild this pusher's rollups")
+
+    def handle(self, *args, **options):
+        pusher_ids = None
+        if options['pusher_key']:
+            pusher_ids = list(Pusher.objects.filter(key=options['pusher_key']).values_list('id', flat=True))
+            if not pusher_ids:
+                raise CommandError("The pusher_key " + options['pusher_key'] + " is not valid.")
+
+        deleted, created = rebuild_rollups(current_apps, pusher_ids)
+        self.stdout.write(self.style.SUCCESS("Replaced %d rollup rows with %d." % (deleted, created)))
@@ -0,0 +1,37 @@
+import decimal
+
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+
+from controller.metrics import NET_WORTH_UPDATES
+from controller.models import *
+
+
+class Command(BaseCommand):
+    help = "Verifies each pusher's running net worth against a full re-summation of its accounts."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help="overwrite drifted totals with the recomputed sum")
+
+    def handle(self, *args, **options):
+        totals = dict(Account.objects.values_list('pusher').annotate(total=Sum('cur_value')))
+
+        mismatches = 0
+        for pusher in Pusher.objects.all().iterator():
+            expected = totals.get(pusher.id) or decimal.Decimal('0.00')
+            if pusher.net_worth == expected:
+                continue
+
+            mismatches += 1
+            self.stdout.write("PUSHER %s: running total $%.2f, recomputed $%.2f" %
+                              (pusher.key, float(pusher.net_worth), float(expected)))
+            if options['fix']:
+                Pusher.objects.filter(id=pusher.id).update(net_worth=expected)
+                NET_WORTH_UPDATES.labels('reconcile').inc()
+
+        if mismatches == 0:
+            self.stdout.write(self.style.SUCCESS("All net worth totals match."))
+        elif options['fix']:
+            self.stdout.write(self.style.WARNING("Fixed %d net worth total(s)." % mismatches))
+        else:
+            self.stdout.write(self.style.ERROR("%d net worth total(s) drifted; rerun with --fix." % mismatches))
@@ -0,0 +1,85 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connection
+from prometheus_client import Counter, Histogram
+
+from .instrumentation import CURRENT_TIMING, RequestTiming, watch_connection, watch_queries
+
+# With PROMETHEUS_MULTIPROC_DIR set, every worker writes its samples to files there and /metrics sums them.
+REQUEST_LATENCY = Histogram('pennypusher_request_duration_seconds', "Time to answer a request.",
+                            ['view', 'method', 'status'])
+REQUEST_QUERIES = Histogram('pennypusher_request_queries', "Database queries run by a request.", ['view', 'method'],
+                            buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, float('inf')))
+CACHE_LOOKUPS = Counter('pennypusher_cache_lookups', "Cache lookups by result; the hit ratio is hits over all.",
+                        ['cache', 'view', 'result'])
+NET_WORTH_UPDATES = Counter('pennypusher_net_worth_updates', "Changes to a pusher's running net worth.", ['reason'])
+
+
+def record_cache_lookup(cache, hit, view=''):
+    CACHE_LOOKUPS.labels(cache, view, 'hit' if hit else 'miss').inc()
+
+
+def view_label(request):
+    match = request.resolver_match
+    if match is None:
+        return 'unmatched'
+    view = getattr(match.func, 'view_class', match.func)
+    return view.__name__
+
+
+class MetricsMiddleware:
+    """
+    Observes the latency and query count of every request, labeled by view, for /metrics. Shares the query
+    counting of RequestTimingMiddleware when both are installed.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        watch_queries()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        # connections opened before watch_queries() are not announced by connection_created
+        watch_connection(None, connection)
+        timing, token = self.start()
+        queries, started = timing.queries, time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            if token is not None:
+                CURRENT_TIMING.reset(token)
+        self.observe(request, response, time.perf_counter() - started, timing.queries - queries)
+        return response
+
+    async def __acall__(self, request):
+        timing, token = self.start()
+        queries, started = timing.queries, time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            if token is not None:
+                CURRENT_TIMING.reset(token)
+        self.observe(request, response, time.perf_counter() - started, timing.queries - queries)
+        return response
+
+    @staticmethod
+    def start():
+        timing = CURRENT_TIMING.get()
+        if timing is not None:
+            return timing, None
+        timing = RequestTiming(slowest=0)
+        return timing, CURRENT_TIMING.set(timing)
+
+    @staticmethod
+    def observe(request, response, duration, queries):
+        view = view_label(request)
+        REQUEST_LATENCY.labels(view, request.method, response.status_code).observe(duration)
+        REQUEST_QUERIES.labels(view, request.method).observe(queries)
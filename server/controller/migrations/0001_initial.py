@@ -0,0 +1,257 @@
+# Generated by Django 4.2.3 on 2026-10-18 10:11
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Account',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=15)),
+                ('priority', models.IntegerField(blank=True, default=2, null=True)),
+                ('category', models.CharField(blank=True, max_length=15, null=True)),
+                ('acct_number', models.CharField(blank=True, max_length=15, null=True)),
+                ('rout_number', models.CharField(blank=True, max_length=15, null=True)),
+                ('cur_value', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Budget',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=15)),
+                ('priority', models.IntegerField(blank=True, default=2, null=True)),
+                ('category', models.CharField(blank=True, max_length=15, null=True)),
+                ('alloc_amt', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('pay_period', models.CharField(default='Monthly', max_length=15)),
+                ('pay_start', models.DateField()),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Fund',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=15)),
+                ('priority', models.IntegerField(blank=True, default=2, null=True)),
+                ('category', models.CharField(blank=True, max_length=15, null=True)),
+                ('goal_amt', models.DecimalField(decimal_places=2, max_digits=11)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Pusher',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=30)),
+                ('key', models.CharField(max_length=8, unique=True)),
+                ('primaryUser', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Trade',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item', models.CharField(max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('status', models.CharField(max_length=20)),
+                ('type', models.CharField(max_length=20)),
+                ('pusher', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='controller.pusher')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Subscription',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item', models.CharField(max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('pay_period', models.CharField(max_length=20)),
+                ('start_date', models.DateField()),
+                ('status', models.CharField(max_length=20)),
+                ('pusher', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='controller.pusher')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='PusherAccess',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('access_time', models.DateTimeField(auto_now_add=True)),
+                ('pusher', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='controller.pusher')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Paycheck',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item', models.CharField(max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('source', models.CharField(max_length=20)),
+                ('timestamp', models.DateTimeField(auto_now_add=True)),
+                ('hours', models.DecimalField(decimal_places=2, max_digits=4)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('gross_amt', models.DecimalField(decimal_places=2, max_digits=7)),
+                ('pre_tax_deduc', models.DecimalField(blank=True, decimal_places=2, max_digits=6, null=True)),
+                ('post_tax_deduc', models.DecimalField(blank=True, decimal_places=2, max_digits=6, null=True)),
+                ('federal_with', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('state_tax', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('city_tax', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('medicare', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('oasdi', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('pusher', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='controller.pusher')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-timestamp'],
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Income',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item', models.CharField(max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('source', models.CharField(max_length=20)),
+                ('timestamp', models.DateTimeField(auto_now_add=True)),
+                ('category', models.CharField(max_length=30)),
+                ('pusher', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='controller.pusher')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-timestamp'],
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='FundValue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.DecimalField(decimal_places=2, default=0.0, max_digits=9)),
+                ('timestamp', models.DateTimeField(auto_now_add=True)),
+                ('fund', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='controller.fund')),
+            ],
+            options={
+                'ordering': ['-timestamp'],
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='fund',
+            name='pusher',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='controller.pusher'),
+        ),
+        migrations.CreateModel(
+            name='ExpNetWorth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('timestamp', models.DateTimeField(auto_now_add=True)),
+                ('pusher', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='controller.pusher')),
+            ],
+            options={
+                'ordering': ['-timestamp'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Expense',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item', models.CharField(max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('party', models.CharField(max_length=20)),
+                ('category', models.CharField(max_length=30)),
+                ('timestamp', models.DateTimeField(auto_now_add=True, null=True)),
+                ('budget', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='controller.budget')),
+                ('fund', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='controller.fund')),
+                ('pusher', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='controller.pusher')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-timestamp'],
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='BudgetValue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.DecimalField(decimal_places=2, default=0.0, max_digits=9)),
+                ('timestamp', models.DateTimeField(auto_now_add=True)),
+                ('budget', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='controller.budget')),
+            ],
+            options={
+                'ordering': ['-timestamp'],
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='budget',
+            name='pusher',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='controller.pusher'),
+        ),
+        migrations.CreateModel(
+            name='Bills',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item', models.CharField(max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('party', models.CharField(max_length=20)),
+                ('category', models.CharField(max_length=30)),
+                ('timestamp', models.DateTimeField(auto_now_add=True, null=True)),
+                ('status', models.CharField(max_length=20)),
+                ('due_date', models.DateField()),
+                ('budget', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='controller.budget')),
+                ('fund', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='controller.fund')),
+                ('pusher', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='controller.pusher')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-timestamp'],
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='AccountValue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.DecimalField(decimal_places=2, default=0.0, max_digits=9)),
+                ('timestamp', models.DateTimeField(auto_now_add=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='controller.account')),
+            ],
+            options={
+                'ordering': ['-timestamp'],
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='account',
+            name='pusher',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='controller.pusher'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.3 on 2026-10-18 10:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('controller', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='accountvalue',
+            index=models.Index(fields=['account', '-timestamp'], name='acctvalue_account_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bills',
+            index=models.Index(fields=['pusher', '-timestamp'], name='bills_pusher_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='budgetvalue',
+            index=models.Index(fields=['budget', '-timestamp'], name='budgetvalue_budget_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['pusher', '-timestamp'], name='expense_pusher_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expnetworth',
+            index=models.Index(fields=['pusher', '-timestamp'], name='expnetworth_pusher_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fundvalue',
+            index=models.Index(fields=['fund', '-timestamp'], name='fundvalue_fund_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='income',
+            index=models.Index(fields=['pusher', '-timestamp'], name='income_pusher_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paycheck',
+            index=models.Index(fields=['pusher', '-timestamp'], name='paycheck_pusher_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trade',
+            index=models.Index(fields=['pusher', 'item', 'type'], name='trade_pusher_item_type_idx'),
+        ),
+    ]
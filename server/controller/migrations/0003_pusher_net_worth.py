@@ -0,0 +1,29 @@
+# Generated by Django 4.2.3 on 2026-10-18 10:13
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def populate_net_worth(apps, schema_editor):
+    Account = apps.get_model('controller', 'Account')
+    Pusher = apps.get_model('controller', 'Pusher')
+
+    totals = Account.objects.values('pusher').annotate(total=Sum('cur_value'))
+    for row in totals:
+        Pusher.objects.filter(id=row['pusher']).update(net_worth=row['total'] or 0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('controller', '0002_timeseries_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pusher',
+            name='net_worth',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.RunPython(populate_net_worth, migrations.RunPython.noop),
+    ]
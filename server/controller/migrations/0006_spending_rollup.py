@@ -0,0 +1,31 @@
+# Generated by Django 4.2.3 on 2026-10-18 10:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('controller', '0005_auth_token'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpendingRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField()),
+                ('entity_type', models.CharField(max_length=15)),
+                ('category', models.CharField(max_length=30)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('count', models.IntegerField(default=0)),
+                ('budget', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='controller.budget')),
+                ('fund', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='controller.fund')),
+                ('pusher', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='controller.pusher')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['pusher', 'period'], name='rollup_pusher_period_idx')],
+            },
+        ),
+    ]
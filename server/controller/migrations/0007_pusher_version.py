@@ -0,0 +1,26 @@
+# Generated by Django 4.2.3 on 2026-10-18 10:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('controller', '0006_spending_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PusherVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity_type', models.CharField(max_length=20)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('pusher', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='controller.pusher')),
+            ],
+            options={
+                'unique_together': {('pusher', 'entity_type')},
+            },
+        ),
+    ]
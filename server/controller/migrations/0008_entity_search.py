@@ -0,0 +1,68 @@
+from django.db import migrations
+
+SEARCH_TABLES = ['controller_expense', 'controller_bills']
+
+
+def postgresql_statements(table):
+    # an expression index, so Postgres keeps it in step with the rows itself
+    return [
+        "CREATE INDEX %s_search_tsv_idx ON %s USING gin (to_tsvector('simple', item || ' ' || party))"
+        % (table, table),
+    ]
+
+
+def sqlite_statements(table):
+    # an external content table: the index only, rows are read from the entity table itself. SQLite migrations
+    # that rebuild the entity table (most AlterField and RemoveField) drop the triggers and must recreate them.
+    statements = [
+        "CREATE VIRTUAL TABLE %(t)s_search USING fts5(pusher_id, item, party, content='%(t)s', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2', prefix='1 2 3')",
+        "CREATE TRIGGER %(t)s_search_insert AFTER INSERT ON %(t)s BEGIN "
+        "INSERT INTO %(t)s_search(rowid, pusher_id, item, party) VALUES (new.id, new.pusher_id, new.item, new.party); "
+        "END",
+        "CREATE TRIGGER %(t)s_search_delete AFTER DELETE ON %(t)s BEGIN "
+        "INSERT INTO %(t)s_search(%(t)s_search, rowid, pusher_id, item, party) "
+        "VALUES ('delete', old.id, old.pusher_id, old.item, old.party); "
+        "END",
+        "CREATE TRIGGER %(t)s_search_update AFTER UPDATE OF pusher_id, item, party ON %(t)s BEGIN "
+        "INSERT INTO %(t)s_search(%(t)s_search, rowid, pusher_id, item, party) "
+        "VALUES ('delete', old.id, old.pusher_id, old.item, old.party); "
+        "INSERT INTO %(t)s_search(rowid, pusher_id, item, party) VALUES (new.id, new.pusher_id, new.item, new.party); "
+        "END",
+        "INSERT INTO %(t)s_search(%(t)s_search) VALUES ('rebuild')",
+    ]
+    return [statement % {'t': table} for statement in statements]
+
+
+def create_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        for table in SEARCH_TABLES:
+            for statement in postgresql_statements(table):
+                schema_editor.execute(statement)
+    elif vendor == 'sqlite':
+        for table in SEARCH_TABLES:
+            for statement in sqlite_statements(table):
+                schema_editor.execute(statement)
+
+
+def drop_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for table in SEARCH_TABLES:
+        if vendor == 'postgresql':
+            schema_editor.execute("DROP INDEX IF EXISTS %s_search_tsv_idx" % table)
+        elif vendor == 'sqlite':
+            for trigger in ['insert', 'delete', 'update']:
+                schema_editor.execute("DROP TRIGGER IF EXISTS %s_search_%s" % (table, trigger))
+            schema_editor.execute("DROP TABLE IF EXISTS %s_search" % table)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('controller', '0007_pusher_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
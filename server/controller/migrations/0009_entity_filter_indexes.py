@@ -0,0 +1,81 @@
+# Generated by Django 4.2.3 on 2026-10-18 11:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('controller', '0008_entity_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bills',
+            index=models.Index(fields=['pusher', 'amount'], name='bills_pusher_amount_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bills',
+            index=models.Index(fields=['pusher', 'user', '-timestamp'], name='bills_pusher_user_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bills',
+            index=models.Index(fields=['pusher', 'category', '-timestamp'], name='bills_pusher_cat_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bills',
+            index=models.Index(fields=['budget', '-timestamp'], name='bills_budget_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bills',
+            index=models.Index(fields=['fund', '-timestamp'], name='bills_fund_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['pusher', 'amount'], name='expense_pusher_amount_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['pusher', 'user', '-timestamp'], name='expense_pusher_user_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['pusher', 'category', '-timestamp'], name='expense_pusher_cat_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['budget', '-timestamp'], name='expense_budget_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['fund', '-timestamp'], name='expense_fund_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='income',
+            index=models.Index(fields=['pusher', 'amount'], name='income_pusher_amount_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='income',
+            index=models.Index(fields=['pusher', 'user', '-timestamp'], name='income_pusher_user_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='income',
+            index=models.Index(fields=['pusher', 'category', '-timestamp'], name='income_pusher_cat_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paycheck',
+            index=models.Index(fields=['pusher', 'amount'], name='paycheck_pusher_amount_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paycheck',
+            index=models.Index(fields=['pusher', 'user', '-timestamp'], name='paycheck_pusher_user_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['pusher', 'amount'], name='subscription_pusher_amount_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trade',
+            index=models.Index(fields=['pusher', 'type', 'amount'], name='trade_pusher_type_amount_idx'),
+        ),
+    ]
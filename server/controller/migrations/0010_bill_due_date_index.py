@@ -0,0 +1,17 @@
+# Generated by Django 4.2.3 on 2026-10-18 11:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('controller', '0009_entity_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bills',
+            index=models.Index(fields=['pusher', 'due_date'], name='bills_pusher_due_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+from django.db import migrations
+
+SEARCH_TABLES = ['controller_expense', 'controller_bills']
+
+# unaccent() is only STABLE, as its dictionary could change, so an index needs it behind an IMMUTABLE wrapper
+CREATE_UNACCENT = [
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    "CREATE OR REPLACE FUNCTION controller_unaccent(text) RETURNS text AS "
+    "$$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$ LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT",
+]
+SEARCH_VECTOR = "to_tsvector('simple', controller_unaccent(item || ' ' || party))"
+PLAIN_SEARCH_VECTOR = "to_tsvector('simple', item || ' ' || party)"
+
+
+def rebuild_search_indexes(schema_editor, vector):
+    for table in SEARCH_TABLES:
+        schema_editor.execute("DROP INDEX IF EXISTS %s_search_tsv_idx" % table)
+        schema_editor.execute("CREATE INDEX %s_search_tsv_idx ON %s USING gin (%s)" % (table, table, vector))
+
+
+def unaccent_search_indexes(apps, schema_editor):
+    # SQLite's FTS5 tables already drop diacritics (remove_diacritics 2); Postgres now does the same
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for statement in CREATE_UNACCENT:
+        schema_editor.execute(statement)
+    rebuild_search_indexes(schema_editor, SEARCH_VECTOR)
+
+
+def plain_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    rebuild_search_indexes(schema_editor, PLAIN_SEARCH_VECTOR)
+    schema_editor.execute("DROP FUNCTION IF EXISTS controller_unaccent(text)")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('controller', '0010_bill_due_date_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(unaccent_search_indexes, plain_search_indexes),
+    ]
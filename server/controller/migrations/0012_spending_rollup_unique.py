@@ -0,0 +1,26 @@
+# Generated by Django 4.2.3 on 2026-10-18 11:33
+
+from django.db import migrations, models
+import django.db.models.functions.comparison
+
+
+def backfill_rollups(apps, schema_editor):
+    # rollups were never built for rows written before 0006, and rows written since could be split over several
+    # rollups of one group; a rebuild fills the first and merges the second ahead of the constraint
+    from controller.management.commands.rebuild_rollups import rebuild_rollups
+    rebuild_rollups(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('controller', '0011_unaccent_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='spendingrollup',
+            constraint=models.UniqueConstraint(models.F('pusher'), models.F('period'), models.F('entity_type'), models.F('category'), django.db.models.functions.comparison.Coalesce(models.F('budget'), 0), django.db.models.functions.comparison.Coalesce(models.F('fund'), 0), name='rollup_group_unique'),
+        ),
+    ]
@@ -1,5 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 
 
 # ----------------------------------------- PUSHER -----------------------------------------
@@ -7,6 +9,8 @@ class Pusher(models.Model):
     primaryUser = models.ForeignKey(User, on_delete=models.CASCADE)
     name = models.CharField(max_length=30)
     key = models.CharField(max_length=8, unique=True)
+    # running sum of the pusher's Account.cur_value, maintained by handle_net_worth_update
+    net_worth = models.DecimalField(max_digits=10, decimal_places=2, default=0)
 
     def __str__(self):
         return "PUSHER: %s -> PRIMARY USER: %s" % (self.name, self.primaryUser.username)
@@ -21,6 +25,30 @@ class PusherAccess(models.Model):
         return "USER: %s -> %s -> ACCESS_TIME:%s" % (self.user.email, self.pusher, self.access_time)
 
 
+class PusherVersion(models.Model):
+    # bumped on every write to one of the pusher's entity types, so polled lists can answer 304 Not Modified
+    pusher = models.ForeignKey(Pusher, on_delete=models.CASCADE)
+    entity_type = models.CharField(max_length=20)
+    version = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        unique_together = [['pusher', 'entity_type']]
+
+    def __str__(self):
+        return "VERSION: %s %d -> PUSHER: %s" % (self.entity_type, self.version, self.pusher.name)
+
+
+class AuthToken(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # sha256 of the token handed to the client; the token itself is never stored
+    digest = models.CharField(max_length=64, unique=True)
+    created = models.DateTimeField(auto_now_add=True)
+    expires = models.DateTimeField()
+
+    def __str__(self):
+        return "TOKEN: %s -> EXPIRES: %s" % (self.user.username, self.expires)
+
+
 # ----------------------------------------- NET WORTH -----------------------------------------
 class ExpNetWorth(models.Model):
     pusher = models.ForeignKey(Pusher, on_delete=models.CASCADE)
@@ -33,6 +61,9 @@ class ExpNetWorth(models.Model):
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['pusher', '-timestamp'], name='expnetworth_pusher_ts_idx'),
+        ]
 
 
 # ----------------------------------------- ENCAPSULATION -----------------------------------------
@@ -86,6 +117,11 @@ class CommonEncapsulationValue(models.Model):
 class BudgetValue(CommonEncapsulationValue, models.Model):
     budget = models.ForeignKey(Budget, on_delete=models.CASCADE)
 
+    class Meta(CommonEncapsulationValue.Meta):
+        indexes = [
+            models.Index(fields=['budget', '-timestamp'], name='budgetvalue_budget_ts_idx'),
+        ]
+
     def __str__(self):
         return "%d VALUE: %.2f -> BUDGET: %s -> %s -> USER: %s" % (self.id, float(self.value), self.budget.name,
                                                                    self.budget.pusher,
@@ -95,6 +131,11 @@ class BudgetValue(CommonEncapsulationValue, models.Model):
 class FundValue(CommonEncapsulationValue, models.Model):
     fund = models.ForeignKey(Fund, on_delete=models.CASCADE)
 
+    class Meta(CommonEncapsulationValue.Meta):
+        indexes = [
+            models.Index(fields=['fund', '-timestamp'], name='fundvalue_fund_ts_idx'),
+        ]
+
     def __str__(self):
         return "%d VALUE: %.2f -> FUND: %s -> PUSHER: %s -> USER: %s" % (self.id, float(self.value), self.fund.name,
                                                                          self.fund.pusher.name,
@@ -104,6 +145,11 @@ class FundValue(CommonEncapsulationValue, models.Model):
 class AccountValue(CommonEncapsulationValue, models.Model):
     account = models.ForeignKey(Account, on_delete=models.CASCADE)
 
+    class Meta(CommonEncapsulationValue.Meta):
+        indexes = [
+            models.Index(fields=['account', '-timestamp'], name='acctvalue_account_ts_idx'),
+        ]
+
     def __str__(self):
         return "%d VALUE: $%.2f -> ACCOUNT: %s -> PUSHER: %s -> USER: %s" % \
             (self.id, float(self.value), self.account.name, self.account.pusher.name,
@@ -123,16 +169,28 @@ class CommonEntity(models.Model):
 class CommonIncome(CommonEntity, models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     source = models.CharField(max_length=20)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         abstract = True
         ordering = ['-timestamp']
+        # one per filter and sort of the entity listing
+        indexes = [
+            models.Index(fields=['pusher', '-timestamp'], name='%(class)s_pusher_ts_idx'),
+            models.Index(fields=['pusher', 'amount'], name='%(class)s_pusher_amount_idx'),
+            models.Index(fields=['pusher', 'user', '-timestamp'], name='%(class)s_pusher_user_ts_idx'),
+        ]
 
 
 class Income(CommonIncome, models.Model):
     category = models.CharField(max_length=30)
-    pass
+    # set on statement imports to skip rows that were already imported
+    fingerprint = models.CharField(max_length=40, null=True, blank=True, db_index=True)
+
+    class Meta(CommonIncome.Meta):
+        indexes = CommonIncome.Meta.indexes + [
+            models.Index(fields=['pusher', 'category', '-timestamp'], name='income_pusher_cat_ts_idx'),
+        ]
 
     def __str__(self):
         return "INCOME: %s -> PUSHER: %s -> USER: %s" % (self.item, self.pusher.name, self.user.email)
@@ -144,18 +202,28 @@ class CommonExpense(CommonEntity, models.Model):
     budget = models.ForeignKey(Budget, on_delete=models.SET_NULL, null=True, blank=True)
     party = models.CharField(max_length=20)
     category = models.CharField(max_length=30)
-    timestamp = models.DateTimeField(auto_now_add=True, null=True)
+    timestamp = models.DateTimeField(default=timezone.now, editable=False, null=True)
 
     class Meta:
         abstract = True
         ordering = ['-timestamp']
+        # one per filter and sort of the entity listing
+        indexes = [
+            models.Index(fields=['pusher', '-timestamp'], name='%(class)s_pusher_ts_idx'),
+            models.Index(fields=['pusher', 'amount'], name='%(class)s_pusher_amount_idx'),
+            models.Index(fields=['pusher', 'user', '-timestamp'], name='%(class)s_pusher_user_ts_idx'),
+            models.Index(fields=['pusher', 'category', '-timestamp'], name='%(class)s_pusher_cat_ts_idx'),
+            models.Index(fields=['budget', '-timestamp'], name='%(class)s_budget_ts_idx'),
+            models.Index(fields=['fund', '-timestamp'], name='%(class)s_fund_ts_idx'),
+        ]
 
     def __str__(self):
         return "EXPENSE: %s -> PUSHER: %s -> USER: %s" % (self.item, self.pusher.name, self.user.email)
 
 
 class Expense(CommonExpense, models.Model):
-    pass
+    # set on statement imports to skip rows that were already imported
+    fingerprint = models.CharField(max_length=40, null=True, blank=True, db_index=True)
 
     def __str__(self):
         return "EXPENSE: %s -> PUSHER: %s -> USER: %s" % (self.item, self.pusher.name, self.user.email)
@@ -183,6 +251,12 @@ class Bills(CommonExpense, models.Model):
     status = models.CharField(max_length=20)
     due_date = models.DateField()
 
+    class Meta(CommonExpense.Meta):
+        # upcoming bills, for the dashboard and forecast
+        indexes = CommonExpense.Meta.indexes + [
+            models.Index(fields=['pusher', 'due_date'], name='bills_pusher_due_idx'),
+        ]
+
     def __str__(self):
         return "%d BILL: $%.2f -> PUSHER: %s" % \
             (self.id, float(self.amount), self.pusher.name)
@@ -193,6 +267,11 @@ class Subscription(CommonEntity, models.Model):
     start_date = models.DateField()
     status = models.CharField(max_length=20)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['pusher', 'amount'], name='subscription_pusher_amount_idx'),
+        ]
+
     def __str__(self):
         return "%d SUBSCRIPTION: $%.2f -> PUSHER: %s" % \
             (self.id, float(self.amount), self.pusher.name)
@@ -202,6 +281,40 @@ class Trade(CommonEntity, models.Model):
     status = models.CharField(max_length=20)
     type = models.CharField(max_length=20)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['pusher', 'item', 'type'], name='trade_pusher_item_type_idx'),
+            models.Index(fields=['pusher', 'type', 'amount'], name='trade_pusher_type_amount_idx'),
+        ]
+
     def __str__(self):
         return "%d TRADE: $%.2f -> PUSHER: %s" % \
             (self.id, float(self.amount), self.pusher.name)
+
+
+# ----------------------------------------- ROLLUP -----------------------------------------
+class SpendingRollup(models.Model):
+    pusher = models.ForeignKey(Pusher, on_delete=models.CASCADE)
+    period = models.DateField()  # first day of the month the entities fall in
+    entity_type = models.CharField(max_length=15)
+    category = models.CharField(max_length=30)
+    budget = models.ForeignKey(Budget, on_delete=models.SET_NULL, null=True, blank=True)
+    fund = models.ForeignKey(Fund, on_delete=models.SET_NULL, null=True, blank=True)
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['pusher', 'period'], name='rollup_pusher_period_idx'),
+        ]
+        # one row per group; no budget or fund counts as 0, as NULLs would never conflict. adjust_rollups upserts
+        # against this index, so its expressions must stay in step with the ON CONFLICT target there.
+        constraints = [
+            models.UniqueConstraint(models.F('pusher'), models.F('period'), models.F('entity_type'),
+                                    models.F('category'), Coalesce(models.F('budget'), 0),
+                                    Coalesce(models.F('fund'), 0), name='rollup_group_unique'),
+        ]
+
+    def __str__(self):
+        return "%s ROLLUP: %s %s $%.2f -> PUSHER: %s" % \
+            (self.period, self.entity_type, self.category, float(self.total), self.pusher.name)
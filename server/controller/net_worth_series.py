@@ -0,0 +1,71 @@
+import numpy as np
+from django.db.models import Max, Min
+from django.db.models.functions import Trunc
+
+from .models import ExpNetWorth
+
+SERIES_RESOLUTIONS = ['hour', 'day', 'week', 'month']
+SERIES_MODES = ['last', 'ohlc']
+MAX_SERIES_POINTS = 5000
+
+
+def bucketed_series(pusher, start, end, resolution, mode):
+    """
+    One row per resolution bucket of the pusher's net worth between start and end, computed in the database: the
+    last value in the bucket, or its open/high/low/close.
+    """
+    points = ExpNetWorth.objects.filter(pusher=pusher, timestamp__gte=start, timestamp__lt=end)
+    buckets = list(points.annotate(bucket=Trunc('timestamp', resolution)).values('bucket')
+                   .annotate(first=Min('timestamp'), last=Max('timestamp'), high=Max('amount'), low=Min('amount'))
+                   .order_by('bucket'))
+
+    # the open and close values are read back by timestamp through the (pusher, timestamp) index
+    edges = {bucket['last'] for bucket in buckets}
+    if mode == 'ohlc':
+        edges |= {bucket['first'] for bucket in buckets}
+    amounts = dict(points.filter(timestamp__in=edges).values_list('timestamp', 'amount')) if edges else {}
+
+    if mode == 'last':
+        return [{'timestamp': bucket['bucket'], 'amount': amounts[bucket['last']]} for bucket in buckets]
+    return [{'timestamp': bucket['bucket'], 'open': amounts[bucket['first']], 'high': bucket['high'],
+             'low': bucket['low'], 'close': amounts[bucket['last']]} for bucket in buckets]
+
+
+def lttb_indices(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets: the indices of `threshold` points that keep the visual shape of the series,
+    always including the first and last point.
+    """
+    count = len(x)
+    if threshold >= count or threshold < 3:
+        return np.arange(count)
+
+    # the interior points are split into threshold - 2 buckets
+    edges = np.linspace(1, count - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, count - 1
+
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        # the next bucket's average is the third corner of the triangle
+        next_stop = edges[bucket + 2] if bucket + 2 < len(edges) else count
+        next_x, next_y = x[stop:next_stop].mean(), y[stop:next_stop].mean()
+
+        areas = np.abs((x[previous] - next_x) * (y[start:stop] - y[previous]) -
+                       (x[previous] - x[start:stop]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+
+    return selected
+
+
+def downsampled_series(pusher, start, end, points):
+    rows = list(ExpNetWorth.objects.filter(pusher=pusher, timestamp__gte=start, timestamp__lt=end)
+                .order_by('timestamp').values_list('timestamp', 'amount'))
+    if not rows:
+        return []
+
+    x = np.array([timestamp.timestamp() for timestamp, _ in rows])
+    y = np.array([float(amount) for _, amount in rows])
+    return [{'timestamp': rows[index][0], 'amount': rows[index][1]} for index in lttb_indices(x, y, points)]
@@ -0,0 +1,63 @@
+import hashlib
+import threading
+
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.response import Response
+
+from .metrics import record_cache_lookup
+
+# settings.CACHES alias; local memory by default, file based with RESPONSE_CACHE=file
+RESPONSE_CACHE_ALIAS = 'responses'
+
+
+class CacheStats:
+    """
+    Hit and miss counts per cached view, local to the worker process. /metrics has them for every worker.
+    """
+
+    def __init__(self):
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    def record(self, view, hit):
+        record_cache_lookup('response', hit, view)
+        with self.lock:
+            hits, misses = self.counts.get(view, (0, 0))
+            self.counts[view] = (hits + 1, misses) if hit else (hits, misses + 1)
+
+    def snapshot(self):
+        with self.lock:
+            return {view: {'hits': hits, 'misses': misses} for view, (hits, misses) in self.counts.items()}
+
+    def clear(self):
+        with self.lock:
+            self.counts.clear()
+
+
+RESPONSE_CACHE_STATS = CacheStats()
+
+
+def response_cache_key(view, scope, version, request):
+    """
+    Keys carry the version of the data the response was built from, so a write that bumps the version retires
+    every cached page of it at once, in every process sharing the cache. The absolute uri covers page, cursor and
+    any other query parameters, and the scheme and host the pagination links of a cached page were built with.
+    """
+    digest = hashlib.sha1(request.build_absolute_uri().encode()).hexdigest()
+    return "response:%s:%s:%s:%s" % (view, scope, version, digest)
+
+
+def get_cached_response(view, key):
+    data = caches[RESPONSE_CACHE_ALIAS].get(key)
+    RESPONSE_CACHE_STATS.record(view, data is not None)
+    if data is None:
+        return None
+    return Response(data=data)
+
+
+def cache_response(key, response):
+    if response.status_code == status.HTTP_200_OK:
+        caches[RESPONSE_CACHE_ALIAS].set(key, response.data)
+    return response
+
@@ -0,0 +1,74 @@
+import re
+import unicodedata
+
+from django.db import connection
+
+from .models import Bills, Expense
+
+SEARCH_MODELS = {'expense': Expense, 'bill': Bills}
+MAX_SEARCH_TERMS = 8
+MAX_SEARCH_RESULTS = 200
+# matches ranked per search, newest first; the index hands them over in id order without reading the rest
+SEARCH_CANDIDATES = 1000
+WORD = re.compile(r'\w+')
+POSTGRES_SEARCH_VECTOR = "to_tsvector('simple', controller_unaccent(item || ' ' || party))"
+
+
+def search_words(text):
+    # lowercase words without accents, as the search indexes see them
+    text = text.lower()
+    if not text.isascii():
+        text = ''.join(char for char in unicodedata.normalize('NFKD', text) if not unicodedata.combining(char))
+    return WORD.findall(text)
+
+
+def search_terms(query):
+    # words only, so no user input reaches the match syntax
+    return search_words(query)[:MAX_SEARCH_TERMS]
+
+
+def match_score(terms, item, party):
+    """
+    Per term, the best of: a whole word of the item (4), the start of an item word (3), a whole word of the
+    party (2) or the start of a party word (1).
+    """
+    item_words, party_words = search_words(item), search_words(party)
+    score = 0
+    for term in terms:
+        score += max([4 if word == term else 3 for word in item_words if word.startswith(term)] +
+                     [2 if word == term else 1 for word in party_words if word.startswith(term)] + [0])
+    return score
+
+
+def candidate_query(e_type, pusher, terms, vendor):
+    table = SEARCH_MODELS[e_type]._meta.db_table
+    if vendor == 'postgresql':
+        # the vector is the expression of the GIN index of migration 0011, verbatim, so the index answers the
+        # prefix query; terms are unaccented by the same function, whatever search_words left of them
+        return ("SELECT id, item, party FROM " + table + " WHERE pusher_id = %s AND " + POSTGRES_SEARCH_VECTOR +
+                " @@ to_tsquery('simple', controller_unaccent(%s)) ORDER BY id DESC LIMIT %s",
+                [pusher.id, ' & '.join(term + ':*' for term in terms), SEARCH_CANDIDATES])
+
+    # the pusher id is an indexed column of the FTS5 table too, so its posting list narrows the match
+    match = 'pusher_id:%d AND {item party}: (%s)' % (pusher.id, ' '.join('"%s"*' % term for term in terms))
+    return ("SELECT rowid, item, party FROM " + table + "_search WHERE " + table + "_search MATCH %s "
+            "ORDER BY rowid DESC LIMIT %s",
+            [match, SEARCH_CANDIDATES])
+
+
+def search_candidates(e_type, pusher, terms):
+    sql, params = candidate_query(e_type, pusher, terms, connection.vendor)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def search_ids(e_type, pusher, terms, limit):
+    """
+    Ids of the pusher's entities whose item or party has a word starting with every term, best match first and
+    newest first among equals. Only the newest SEARCH_CANDIDATES matches are ranked, as scoring every match of a
+    short prefix over a long history costs more than the request.
+    """
+    candidates = search_candidates(e_type, pusher, terms)
+    candidates.sort(key=lambda row: (-match_score(terms, row[1], row[2]), -row[0]))
+    return [row[0] for row in candidates[:limit]]
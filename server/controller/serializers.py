@@ -2,34 +2,159 @@ import decimal
 
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from .instrumentation import TimedSerializerMixin
 from .models import *
+from .metrics import NET_WORTH_UPDATES
 
 UserModel = get_user_model()
 
 
+# entity types whose listings also show a written type, through names or balances
+VERSION_DEPENDENTS = {
+    'budget': ['budget_value', 'expense', 'bill'],
+    'fund': ['fund_value', 'expense', 'bill'],
+    'account': ['account_value'],
+}
+
+
+def bump_versions(pusher_id, e_types):
+    """
+    Bumps the pusher's version counter of every written entity type and the types that display it. Called after
+    the write, inside its transaction when there is one, so a version is never seen before its data.
+    """
+    e_types = set(e_types)
+    for e_type in list(e_types):
+        e_types.update(VERSION_DEPENDENTS.get(e_type, []))
+
+    versions = PusherVersion.objects.filter(pusher_id=pusher_id, entity_type__in=e_types)
+    if versions.update(version=F('version') + 1) < len(e_types):
+        # first write of a type: counters that already existed were just bumped and are skipped as conflicts
+        PusherVersion.objects.bulk_create([PusherVersion(pusher_id=pusher_id, entity_type=e_type, version=1)
+                                           for e_type in e_types], ignore_conflicts=True)
+
+
+def bump_user_versions(user):
+    # usernames are shown on the entity and access listings of every pusher the user can reach
+    for pusher_id in PusherAccess.objects.filter(user=user).values_list('pusher_id', flat=True):
+        bump_versions(pusher_id, ['income', 'expense', 'paycheck', 'bill', 'pusher_access'])
+
+
 def handle_net_worth_update(acct_value):
-    # update account
-    account = Account.objects.get(id=acct_value.account.id)
-    account.cur_value = acct_value.value
-    account.save()
-
-    # get net worth
-    pusher = acct_value.account.pusher
-    net_value = decimal.Decimal(0.0)
-    all_accounts = list(Account.objects.filter(pusher=pusher))
-    for a in all_accounts:
-        cur_value = a.cur_value or decimal.Decimal('0.0')
-        net_value += cur_value
-
-    # add to exp Net worth
-    net_worth = ExpNetWorth.objects.create(
-        pusher=pusher,
-        amount=net_value
+    # lock the pusher, then the account, so concurrent balance posts apply their deltas in turn
+    with transaction.atomic():
+        pusher = Pusher.objects.select_for_update().get(id=acct_value.account.pusher_id)
+        account = Account.objects.select_for_update().get(id=acct_value.account_id)
+
+        # update account and adjust the running net worth by the change in balance
+        delta = acct_value.value - (account.cur_value or decimal.Decimal('0.0'))
+        account.cur_value = acct_value.value
+        account.save(update_fields=['cur_value'])
+
+        pusher.net_worth += delta
+        pusher.save(update_fields=['net_worth'])
+
+        # add to exp Net worth
+        ExpNetWorth.objects.create(
+            pusher=pusher,
+            amount=pusher.net_worth
+        )
+        bump_versions(pusher.id, ['account', 'net_worth'])
+    NET_WORTH_UPDATES.labels('account_value').inc()
+
+
+def handle_account_removal(account):
+    # take the account's balance out of the running net worth as it is deleted
+    with transaction.atomic():
+        pusher = Pusher.objects.select_for_update().get(id=account.pusher_id)
+        cur_value = Account.objects.filter(id=account.id).values_list('cur_value', flat=True).first()
+
+        pusher.net_worth -= cur_value or decimal.Decimal('0.0')
+        pusher.save(update_fields=['net_worth'])
+        account.delete()
+        bump_versions(pusher.id, ['account'])
+    NET_WORTH_UPDATES.labels('account_removal').inc()
+
+
+ROLLUP_ENTITY_TYPES = ['income', 'expense', 'paycheck', 'bill']
+
+
+def rollup_key(e_type, entity):
+    return (
+        entity.pusher_id,
+        timezone.localtime(entity.timestamp).date().replace(day=1),
+        e_type,
+        'paycheck' if e_type == 'paycheck' else entity.category,
+        getattr(entity, 'budget_id', None),
+        getattr(entity, 'fund_id', None),
     )
-    net_worth.save()
 
 
-class UserSerializer(serializers.ModelSerializer):
+def adjust_rollups(typed_entities, sign=1):
+    # collapse the (e_type, entity) pairs into one delta per rollup row before touching the table
+    deltas = {}
+    for e_type, entity in typed_entities:
+        if entity.timestamp is None:
+            continue
+        key = rollup_key(e_type, entity)
+        total, count = deltas.get(key, (decimal.Decimal('0.00'), 0))
+        deltas[key] = (total + sign * entity.amount, count + sign)
+
+    if not deltas:
+        return
+
+    # an upsert against the rollup_group_unique index, so concurrent first writes to a group add up in one row;
+    # bulk_create(update_conflicts=True) cannot name the COALESCE expressions that index is built on
+    table = SpendingRollup._meta.db_table
+    sql = ("INSERT INTO " + table + " (pusher_id, period, entity_type, category, budget_id, fund_id, total, count) "
+           "VALUES (%s, %s, %s, %s, %s, %s, %s, %s) "
+           "ON CONFLICT (pusher_id, period, entity_type, category, COALESCE(budget_id, 0), COALESCE(fund_id, 0)) "
+           "DO UPDATE SET total = " + table + ".total + excluded.total, count = " + table + ".count + excluded.count")
+    # rows are taken in one order by every writer, so two batches cannot deadlock on each other's rows
+    rows = sorted((key + delta for key, delta in deltas.items()), key=repr)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+def adjust_rollup(e_type, entity, sign=1):
+    adjust_rollups([(e_type, entity)], sign)
+
+
+def relation_id(value):
+    # budget and fund arrive as CharField strings; rows read back hold ints, and keys built from both must agree
+    return None if value is None else int(value)
+
+
+def update_changed_fields(instance, validated_data, relations=()):
+    """
+    Applies validated_data to the instance in place and writes only the columns that changed, in one UPDATE. The
+    row keeps its primary key, so value histories and entities linked to it survive the edit.
+    """
+    changed = []
+    for field, value in validated_data.items():
+        # the owning pusher and user are fixed once created
+        if field in ['pusher', 'user']:
+            continue
+        if field in relations:
+            field, value = field + '_id', relation_id(value)
+        if getattr(instance, field) != value:
+            setattr(instance, field, value)
+            changed.append(field)
+
+    if changed:
+        instance.save(update_fields=changed)
+    return instance
+
+
+class ModelSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """
+    Base of the serializers below, so their validation and output count towards a timed request's serialize time.
+    """
+
+
+class UserSerializer(ModelSerializer):
     password = serializers.CharField(write_only=True)
 
     def create(self, validated_data):
@@ -66,7 +191,7 @@ class UserSerializer(serializers.ModelSerializer):
         write_only_fields = ['password', ]
 
 
-class PusherSerializer(serializers.ModelSerializer):
+class PusherSerializer(ModelSerializer):
     primaryUser = serializers.SerializerMethodField(read_only=True)
     user = serializers.CharField(write_only=True)
 
@@ -78,13 +203,12 @@ class PusherSerializer(serializers.ModelSerializer):
             name=validated_data['name'],
             key=validated_data['key'],
         )
-        pusher.save()
 
         user_access = PusherAccess.objects.create(
             user=pusher.primaryUser,
             pusher=pusher
         )
-        user_access.save()
+        bump_versions(pusher.id, ['pusher', 'pusher_access'])
 
         return pusher
 
@@ -96,7 +220,7 @@ class PusherSerializer(serializers.ModelSerializer):
         fields = ['name', 'primaryUser', 'key', 'user']
 
 
-class PusherAccessSerializer(serializers.ModelSerializer):
+class PusherAccessSerializer(ModelSerializer):
     username = serializers.SerializerMethodField(read_only=True)
     pusher_key = serializers.SerializerMethodField(read_only=True)
     user = serializers.CharField(write_only=True)
@@ -110,7 +234,7 @@ class PusherAccessSerializer(serializers.ModelSerializer):
             user=user_instance,
             pusher=pusher_instance,
         )
-        pusher_access.save()
+        bump_versions(pusher_instance.id, ['pusher_access'])
         return pusher_access
 
     def get_pusher_key(self, obj):
@@ -125,7 +249,7 @@ class PusherAccessSerializer(serializers.ModelSerializer):
         write_only_fields = ['user', 'pusher']
 
 
-class BudgetSerializer(serializers.ModelSerializer):
+class BudgetSerializer(ModelSerializer):
     pusher_key = serializers.SerializerMethodField(read_only=True)
     pusher = serializers.CharField(write_only=True)
 
@@ -141,9 +265,11 @@ class BudgetSerializer(serializers.ModelSerializer):
             pay_start=validated_data['pay_start'],
             category=validated_data['category'],
         )
-        budget.save()
         return budget
 
+    def update(self, instance, validated_data):
+        return update_changed_fields(instance, validated_data)
+
     def get_pusher_name(self, obj):
         return obj.pusher.name
 
@@ -156,7 +282,7 @@ class BudgetSerializer(serializers.ModelSerializer):
                   'category', 'pusher', ]
 
 
-class FundSerializer(serializers.ModelSerializer):
+class FundSerializer(ModelSerializer):
     pusher_key = serializers.SerializerMethodField(read_only=True)
     pusher = serializers.CharField(write_only=True)
 
@@ -170,9 +296,11 @@ class FundSerializer(serializers.ModelSerializer):
             priority=validated_data['priority'],
             category=validated_data['category'],
         )
-        fund.save()
         return fund
 
+    def update(self, instance, validated_data):
+        return update_changed_fields(instance, validated_data)
+
     def get_pusher_key(self, obj):
         return obj.pusher.key
 
@@ -181,7 +309,7 @@ class FundSerializer(serializers.ModelSerializer):
         fields = ['pusher_key', 'name', 'goal_amt', 'priority', 'category', 'pusher']
 
 
-class AccountSerializer(serializers.ModelSerializer):
+class AccountSerializer(ModelSerializer):
     pusher_key = serializers.SerializerMethodField(read_only=True)
     pusher = serializers.CharField(write_only=True)
 
@@ -194,18 +322,47 @@ class AccountSerializer(serializers.ModelSerializer):
             acct_number=validated_data['acct_number'],
             rout_number=validated_data['rout_number']
         )
-        account.save()
         return account
 
+    def update(self, instance, validated_data):
+        return update_changed_fields(instance, validated_data)
+
     def get_pusher_key(self, obj):
         return obj.pusher.key
 
     class Meta:
         model = Account
         fields = ['pusher', 'pusher_key', 'name', 'cur_value', 'acct_number', 'rout_number']
+        # balances only change through account values, which keep the pusher's net worth in step
+        read_only_fields = ['cur_value']
+
 
+# encapsulations with the value and timestamp of their latest value, annotated by get_dashboard
+class BudgetLatestSerializer(BudgetSerializer):
+    value = serializers.DecimalField(max_digits=9, decimal_places=2, read_only=True)
+    value_timestamp = serializers.DateTimeField(read_only=True)
 
-class BudgetValueSerializer(serializers.ModelSerializer):
+    class Meta(BudgetSerializer.Meta):
+        fields = BudgetSerializer.Meta.fields + ['value', 'value_timestamp']
+
+
+class FundLatestSerializer(FundSerializer):
+    value = serializers.DecimalField(max_digits=9, decimal_places=2, read_only=True)
+    value_timestamp = serializers.DateTimeField(read_only=True)
+
+    class Meta(FundSerializer.Meta):
+        fields = FundSerializer.Meta.fields + ['value', 'value_timestamp']
+
+
+class AccountLatestSerializer(AccountSerializer):
+    value = serializers.DecimalField(max_digits=9, decimal_places=2, read_only=True)
+    value_timestamp = serializers.DateTimeField(read_only=True)
+
+    class Meta(AccountSerializer.Meta):
+        fields = AccountSerializer.Meta.fields + ['value', 'value_timestamp']
+
+
+class BudgetValueSerializer(ModelSerializer):
     budget_name = serializers.SerializerMethodField(read_only=True)
     pusher_key = serializers.SerializerMethodField(read_only=True)
     budget = serializers.CharField(write_only=True)
@@ -217,7 +374,6 @@ class BudgetValueSerializer(serializers.ModelSerializer):
             budget=budget_instance,
             value=validated_data['value'],
         )
-        budget_value.save()
         return budget_value
 
     def get_budget_name(self, obj):
@@ -231,7 +387,7 @@ class BudgetValueSerializer(serializers.ModelSerializer):
         fields = ['pusher_key', 'budget', 'budget_name', 'value', 'timestamp']
 
 
-class FundValueSerializer(serializers.ModelSerializer):
+class FundValueSerializer(ModelSerializer):
     fund_name = serializers.SerializerMethodField(read_only=True)
     pusher_key = serializers.SerializerMethodField(read_only=True)
     fund = serializers.CharField(write_only=True)
@@ -256,7 +412,7 @@ class FundValueSerializer(serializers.ModelSerializer):
         fields = ['fund', 'pusher_key', 'fund_name', 'value', 'timestamp', ]
 
 
-class AccountValueSerializer(serializers.ModelSerializer):
+class AccountValueSerializer(ModelSerializer):
     account_name = serializers.SerializerMethodField(read_only=True)
     pusher_key = serializers.SerializerMethodField(read_only=True)
     account = serializers.CharField(write_only=True)
@@ -264,13 +420,14 @@ class AccountValueSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         account_instance = Account.objects.get(id=validated_data['account'])
 
-        acct_value = AccountValue.objects.create(
-            account=account_instance,
-            value=validated_data['value'],
-        )
+        with transaction.atomic():
+            acct_value = AccountValue.objects.create(
+                account=account_instance,
+                value=validated_data['value'],
+            )
 
-        # handle account update
-        handle_net_worth_update(acct_value)
+            # handle account update
+            handle_net_worth_update(acct_value)
 
         return acct_value
 
@@ -285,7 +442,7 @@ class AccountValueSerializer(serializers.ModelSerializer):
         fields = ['pusher_key', 'account_name', 'account', 'value', 'timestamp', ]
 
 
-class ExpNetWorthSerializer(serializers.ModelSerializer):
+class ExpNetWorthSerializer(ModelSerializer):
     pusher = serializers.CharField(write_only=True)
 
     def create(self, validated_data):
@@ -295,7 +452,6 @@ class ExpNetWorthSerializer(serializers.ModelSerializer):
             pusher=pusher_instance,
             amount=validated_data['amount'],
         )
-        net_worth.save()
         return net_worth
 
     class Meta:
@@ -303,7 +459,7 @@ class ExpNetWorthSerializer(serializers.ModelSerializer):
         fields = ['pusher', 'timestamp', 'amount']
 
 
-class IncomeSerializer(serializers.ModelSerializer):
+class IncomeSerializer(ModelSerializer):
     username = serializers.SerializerMethodField(read_only=True)
     pusher = serializers.CharField(write_only=True)
     user = serializers.CharField(write_only=True)
@@ -320,8 +476,8 @@ class IncomeSerializer(serializers.ModelSerializer):
             source=validated_data['source'],
             category=validated_data['category'],
         )
-        income.save()
 
+        adjust_rollup('income', income)
         return income
 
     def get_username(self, obj):
@@ -332,7 +488,7 @@ class IncomeSerializer(serializers.ModelSerializer):
         fields = ['user', 'username', 'item', 'amount', 'source', 'category', 'timestamp', 'pusher']
 
 
-class ExpenseSerializer(serializers.ModelSerializer):
+class ExpenseSerializer(ModelSerializer):
     username = serializers.SerializerMethodField(read_only=True)
     budget_name = serializers.SerializerMethodField(read_only=True)
     fund_name = serializers.SerializerMethodField(read_only=True)
@@ -348,20 +504,15 @@ class ExpenseSerializer(serializers.ModelSerializer):
         expense = Expense.objects.create(
             user=user_instance,
             pusher=pusher_instance,
+            budget_id=relation_id(validated_data.get('budget')),
+            fund_id=relation_id(validated_data.get('fund')),
             item=validated_data['item'],
             amount=validated_data['amount'],
             party=validated_data['party'],
             category=validated_data['category'],
         )
 
-        if 'budget' in validated_data and validated_data['budget'] is not None:
-            budget_instance = Budget.objects.get(id=validated_data['budget'])
-            expense.budget = budget_instance
-
-        if 'fund' in validated_data and validated_data['fund'] is not None:
-            fund_instance = Fund.objects.get(id=validated_data['fund'])
-            expense.fund = fund_instance
-
+        adjust_rollup('expense', expense)
         return expense
 
     def get_username(self, obj):
@@ -383,7 +534,7 @@ class ExpenseSerializer(serializers.ModelSerializer):
                   'budget', 'budget_name', 'category', 'timestamp', 'pusher']
 
 
-class PaycheckSerializer(serializers.ModelSerializer):
+class PaycheckSerializer(ModelSerializer):
     username = serializers.SerializerMethodField(read_only=True)
     pusher = serializers.CharField(write_only=True)
     user = serializers.CharField(write_only=True)
@@ -410,6 +561,7 @@ class PaycheckSerializer(serializers.ModelSerializer):
             oasdi=validated_data['oasdi'],
             amount=validated_data['amount']
         )
+        adjust_rollup('paycheck', paycheck)
         return paycheck
 
     def get_username(self, obj):
@@ -422,7 +574,7 @@ class PaycheckSerializer(serializers.ModelSerializer):
                   'federal_with', 'state_tax', 'city_tax', 'medicare', 'oasdi', 'amount']
 
 
-class BillSerializer(serializers.ModelSerializer):
+class BillSerializer(ModelSerializer):
 
     username = serializers.SerializerMethodField(read_only=True)
     budget_name = serializers.SerializerMethodField(read_only=True)
@@ -439,6 +591,8 @@ class BillSerializer(serializers.ModelSerializer):
         bill = Bills.objects.create(
             user=user_instance,
             pusher=pusher_instance,
+            budget_id=relation_id(validated_data.get('budget')),
+            fund_id=relation_id(validated_data.get('fund')),
             item=validated_data['item'],
             amount=validated_data['amount'],
             party=validated_data['party'],
@@ -447,16 +601,17 @@ class BillSerializer(serializers.ModelSerializer):
             due_date=validated_data['due_date']
         )
 
-        if 'budget' in validated_data and validated_data['budget'] is not None:
-            budget_instance = Budget.objects.get(id=validated_data['budget'])
-            bill.budget = budget_instance
-
-        if 'fund' in validated_data and validated_data['fund'] is not None:
-            fund_instance = Fund.objects.get(id=validated_data['fund'])
-            bill.fund = fund_instance
-
+        adjust_rollup('bill', bill)
         return bill
 
+    def update(self, instance, validated_data):
+        # the rollup row the bill counted towards can change with its amount or budget/fund
+        with transaction.atomic():
+            adjust_rollup('bill', instance, -1)
+            update_changed_fields(instance, validated_data, relations=['budget', 'fund'])
+            adjust_rollup('bill', instance)
+        return instance
+
     def get_username(self, obj):
         return obj.user.username
 
@@ -476,7 +631,7 @@ class BillSerializer(serializers.ModelSerializer):
                   'fund_name', 'budget', 'budget_name', 'status', 'due_date', 'timestamp']
 
 
-class SubscriptionSerializer(serializers.ModelSerializer):
+class SubscriptionSerializer(ModelSerializer):
     pusher = serializers.CharField(write_only=True)
 
     def create(self, validated_data):
@@ -492,12 +647,15 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         )
         return subscription
 
+    def update(self, instance, validated_data):
+        return update_changed_fields(instance, validated_data)
+
     class Meta:
         model = Subscription
         fields = ['pusher', 'item', 'amount', 'pay_period', 'start_date', 'status']
 
 
-class TradeSerializer(serializers.ModelSerializer):
+class TradeSerializer(ModelSerializer):
     pusher = serializers.CharField(write_only=True)
     type = serializers.CharField(write_only=True)
 
@@ -513,6 +671,9 @@ class TradeSerializer(serializers.ModelSerializer):
         )
         return trade
 
+    def update(self, instance, validated_data):
+        return update_changed_fields(instance, validated_data)
+
     class Meta:
         model = Trade
         fields = ['pusher', 'item', 'amount', 'status', 'type']
@@ -0,0 +1,135 @@
+import codecs
+import csv
+import re
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from .model_categories import EXPENSE_CATEGORY, INCOME_CATEGORY
+
+CSV_DATE_FORMATS = ['%Y-%m-%d', '%m/%d/%Y', '%m/%d/%y', '%d.%m.%Y']
+CSV_COLUMNS = {
+    'date': ['date', 'posted date', 'posting date', 'transaction date'],
+    'amount': ['amount', 'transaction amount'],
+    'debit': ['debit', 'withdrawal'],
+    'credit': ['credit', 'deposit'],
+    'party': ['description', 'payee', 'name', 'party', 'merchant', 'memo'],
+    'category': ['category'],
+}
+OFX_TAG = re.compile(r'<(/?[A-Z0-9.]+)>([^<\r\n]*)')
+
+
+class StatementError(ValueError):
+    pass
+
+
+class StatementRow:
+    def __init__(self, line, date, amount, party, category):
+        self.line = line
+        self.date = date
+        self.amount = amount
+        self.party = party
+        self.category = category
+
+    @property
+    def is_income(self):
+        return self.amount > 0
+
+
+def map_category(category, is_income):
+    # statement categories are only kept when they name one of the app's categories
+    categories = INCOME_CATEGORY if is_income else EXPENSE_CATEGORY
+    category = (category or '').strip().lower()
+    return category if category in categories else 'other'
+
+
+def parse_amount(value):
+    try:
+        return Decimal(value.replace(',', '').replace('$', '').strip())
+    except (InvalidOperation, AttributeError):
+        raise StatementError("The amount [" + str(value) + "] is not a number.")
+
+
+def parse_csv_date(value):
+    for date_format in CSV_DATE_FORMATS:
+        try:
+            return datetime.strptime(value.strip(), date_format).date()
+        except (ValueError, AttributeError):
+            continue
+    raise StatementError("The date [" + str(value) + "] is not a recognized date.")
+
+
+def find_columns(header):
+    columns = {}
+    normalized = {name.strip().lower(): name for name in header if name}
+    for key, aliases in CSV_COLUMNS.items():
+        for alias in aliases:
+            if alias in normalized:
+                columns[key] = normalized[alias]
+                break
+
+    if 'date' not in columns or 'party' not in columns or \
+            ('amount' not in columns and ('debit' not in columns or 'credit' not in columns)):
+        raise StatementError("The statement needs date, description and amount (or debit and credit) columns.")
+    return columns
+
+
+def read_csv(lines):
+    reader = csv.DictReader(lines)
+    columns = find_columns(reader.fieldnames or [])
+
+    for record in reader:
+        line = reader.line_num
+        try:
+            if 'amount' in columns:
+                amount = parse_amount(record[columns['amount']])
+            else:
+                # debit/credit statements carry the outflow as a positive debit
+                debit, credit = record[columns['debit']], record[columns['credit']]
+                amount = parse_amount(credit) if (credit or '').strip() else -parse_amount(debit)
+            category = record.get(columns['category']) if 'category' in columns else None
+            yield StatementRow(line, parse_csv_date(record[columns['date']]), amount,
+                               (record[columns['party']] or '').strip(), category)
+        except StatementError as e:
+            yield StatementError("Line %d: %s" % (line, e))
+
+
+def read_ofx(lines):
+    # OFX 1.x is SGML without closing tags on leaf elements, so fields are read tag by tag
+    transaction, start = None, 0
+    for line_number, line in enumerate(lines, start=1):
+        for tag, value in OFX_TAG.findall(line):
+            if tag == 'STMTTRN':
+                transaction, start = {}, line_number
+            elif tag == '/STMTTRN' and transaction is not None:
+                yield ofx_row(start, transaction)
+                transaction = None
+            elif transaction is not None and not tag.startswith('/'):
+                transaction[tag] = value.strip()
+
+
+def ofx_row(line, transaction):
+    try:
+        date_value = transaction.get('DTPOSTED', '')
+        try:
+            date = datetime.strptime(date_value[:8], '%Y%m%d').date()
+        except ValueError:
+            raise StatementError("The date [" + date_value + "] is not a recognized date.")
+        amount = parse_amount(transaction.get('TRNAMT'))
+        category = 'interest' if transaction.get('TRNTYPE') in ['INT', 'DIV'] else None
+        party = transaction.get('NAME') or transaction.get('PAYEE') or transaction.get('MEMO') or ''
+        return StatementRow(line, date, amount, party, category)
+    except StatementError as e:
+        return StatementError("Line %d: %s" % (line, e))
+
+
+def read_statement(upload, file_type):
+    """
+    Yields a StatementRow (or a StatementError for a bad row) for every transaction of the uploaded
+    statement, decoding the upload line by line instead of reading it into memory.
+    """
+    lines = codecs.iterdecode(upload, 'utf-8-sig', errors='replace')
+    if file_type == 'csv':
+        return read_csv(lines)
+    if file_type in ['ofx', 'qfx']:
+        return read_ofx(lines)
+    raise StatementError("The file type " + str(file_type) + " is not allowed.")
@@ -0,0 +1,300 @@
+import io
+from datetime import timedelta
+
+import numpy as np
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.db import transaction
+from django.utils import timezone
+
+from .budget_periods import add_months, day_start
+from .model_categories import EXPENSE_CATEGORY, INCOME_CATEGORY
+from .models import *
+
+BUDGET_NAMES = ['food', 'rent', 'leisure', 'transport', 'utilities', 'health', 'gifts', 'education']
+FUND_NAMES = ['car', 'vacation', 'emergency', 'house', 'wedding', 'retirement']
+ACCOUNT_NAMES = ['checking', 'savings', 'brokerage', 'credit card', 'cash', 'retirement']
+
+# category -> (relative frequency, median amount, log-normal sigma)
+EXPENSE_PROFILE = {
+    'transportation': (8, 35, 0.6),
+    'workout': (3, 30, 0.4),
+    'family': (3, 50, 0.8),
+    'groceries': (10, 60, 0.5),
+    'gifts': (3, 40, 0.7),
+    'education': (1, 120, 0.9),
+    'café': (12, 6, 0.4),
+    'home': (5, 80, 0.9),
+    'utilities': (2, 90, 0.4),
+    'leisure': (6, 45, 0.7),
+    'health': (3, 70, 0.9),
+    'insurance': (1, 150, 0.3),
+    'loans': (1, 350, 0.3),
+    'entertainment': (6, 25, 0.6),
+    'vacation': (1, 300, 1.0),
+    'other': (5, 30, 1.0),
+}
+INCOME_PROFILE = {
+    'interest': (3, 5, 0.8),
+    'gift': (1, 50, 0.8),
+    'paycheck': (0, 1500, 0.2),
+    '3rd-party payment app': (3, 40, 0.9),
+    'other': (1, 100, 1.0),
+}
+# categories added to model_categories later get an even share of this profile
+DEFAULT_PROFILE = (1, 30, 1.0)
+
+# (item, category, median amount, sigma, day of the month due)
+BILL_ITEMS = [
+    ('rent', 'home', 1400, 0.02, 1),
+    ('power', 'utilities', 90, 0.3, 12),
+    ('internet', 'utilities', 60, 0.05, 18),
+    ('phone', 'utilities', 45, 0.1, 22),
+    ('car insurance', 'insurance', 120, 0.05, 5),
+    ('student loan', 'loans', 350, 0.02, 15),
+]
+SUBSCRIPTION_ITEMS = [('streaming', 15.99), ('music', 10.99), ('gym', 40.00), ('cloud storage', 2.99),
+                      ('news', 8.00), ('games', 14.99), ('software', 20.00), ('meal kit', 60.00)]
+TRADE_ITEMS = ['bike', 'couch', 'camera', 'laptop', 'guitar', 'desk', 'phone', 'tent']
+
+# DecimalField bounds of the models, so a long random walk cannot overflow a column
+MAX_AMOUNT = 999999.99
+MAX_VALUE = 9999999.99
+
+
+class SyntheticData:
+    """
+    Deterministic pushers of realistic data for scale testing: the same seed and end date always produce the same
+    rows. Everything is written with bulk_create, `batch_size` rows at a time.
+    """
+
+    def __init__(self, seed=0, batch_size=10000, end=None):
+        self.random = np.random.default_rng(seed)
+        # keys come from their own stream, so redrawing one taken in the database leaves the data unchanged
+        self.keys = np.random.default_rng([seed, 1])
+        self.batch_size = batch_size
+        self.end = day_start(end or timezone.localdate())
+        self.counts = {}
+
+    def insert(self, model, objects):
+        batch = []
+        for instance in objects:
+            batch.append(instance)
+            if len(batch) == self.batch_size:
+                model.objects.bulk_create(batch)
+                self.count(model, len(batch))
+                batch = []
+        if batch:
+            model.objects.bulk_create(batch)
+            self.count(model, len(batch))
+
+    def count(self, model, rows):
+        self.counts[model.__name__] = self.counts.get(model.__name__, 0) + rows
+
+    def amounts(self, medians, sigmas, limit=MAX_AMOUNT):
+        return np.clip(np.round(self.random.lognormal(np.log(medians), sigmas), 2), 0.01, limit)
+
+    def timestamps(self, start, size):
+        # uniform over [start, end), oldest first and a microsecond apart at least, as entities are looked up by
+        # (pusher, timestamp)
+        micros = np.sort(self.random.integers(0, int((self.end - start).total_seconds() * 1e6), size))
+        micros = np.maximum.accumulate(micros - np.arange(size)) + np.arange(size)
+        return [start + timedelta(microseconds=micro) for micro in micros.tolist()]
+
+    def categories(self, profile, categories, size):
+        weights = np.array([profile.get(category, DEFAULT_PROFILE)[0] for category in categories], dtype=float)
+        drawn = self.random.choice(len(categories), size=size, p=weights / weights.sum())
+        medians = np.array([profile.get(category, DEFAULT_PROFILE)[1] for category in categories])[drawn]
+        sigmas = np.array([profile.get(category, DEFAULT_PROFILE)[2] for category in categories])[drawn]
+        return [categories[index] for index in drawn], self.amounts(medians, sigmas)
+
+    def key(self):
+        letters = np.array(list('ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'))
+        while True:
+            key = ''.join(self.keys.choice(letters, 8))
+            if not Pusher.objects.filter(key=key).exists():
+                return key
+
+    def pusher(self, prefix, users=2, budgets=4, funds=2, accounts=3, years=2, expenses=120, incomes=6, bills=5,
+               subscriptions=8, trades=6, value_hours=24):
+        """
+        A pusher shared by `users` users, with `years` of history up to the end date: `expenses` and `incomes` a
+        month, biweekly paychecks for every user, `bills` monthly bills, and a value of every budget, fund and
+        account each `value_hours`, the account values adding up to the net worth history. Returns the pusher and
+        its users, the primary user first.
+        """
+        with transaction.atomic():
+            return self.generate(prefix, users, budgets, funds, accounts, years, expenses, incomes, bills,
+                                 subscriptions, trades, value_hours)
+
+    def generate(self, prefix, users, budgets, funds, accounts, years, expenses, incomes, bills, subscriptions,
+                 trades, value_hours):
+        start = self.end - timedelta(days=round(365.25 * years))
+        months = years * 12
+
+        members = [User(username='%s_%d' % (prefix, index), email='%s_%d@synthetic.test' % (prefix, index),
+                        password=make_password(None)) for index in range(users)]
+        self.insert(User, members)
+        members = list(User.objects.filter(username__in=[user.username for user in members]).order_by('id'))
+
+        pusher = Pusher.objects.create(primaryUser=members[0], name=prefix[:30], key=self.key())
+        self.count(Pusher, 1)
+        self.insert(PusherAccess, (PusherAccess(user=user, pusher=pusher) for user in members))
+
+        self.insert(Budget, (Budget(pusher=pusher, name=self.name(BUDGET_NAMES, index), priority=index % 3 + 1,
+                                    alloc_amt=float(self.amounts(300, 0.6, 99999.99)), pay_period='Monthly',
+                                    pay_start=start.date(), category='budget') for index in range(budgets)))
+        self.insert(Fund, (Fund(pusher=pusher, name=self.name(FUND_NAMES, index), priority=index % 3 + 1,
+                                goal_amt=float(self.amounts(5000, 0.8)), category='savings')
+                           for index in range(funds)))
+        self.insert(Account, (Account(pusher=pusher, name=self.name(ACCOUNT_NAMES, index), category='bank')
+                              for index in range(accounts)))
+        budgets = list(Budget.objects.filter(pusher=pusher).order_by('id'))
+        funds = list(Fund.objects.filter(pusher=pusher).order_by('id'))
+        accounts = list(Account.objects.filter(pusher=pusher).order_by('id'))
+
+        self.insert(Subscription, (
+            Subscription(pusher=pusher, item=self.name([item for item, _ in SUBSCRIPTION_ITEMS], index),
+                         amount=SUBSCRIPTION_ITEMS[index % len(SUBSCRIPTION_ITEMS)][1], pay_period='Monthly',
+                         start_date=start.date() + timedelta(days=int(self.random.integers(0, 365))),
+                         status='cancelled' if index % 5 == 4 else 'active') for index in range(subscriptions)))
+        self.insert(Trade, (Trade(pusher=pusher, item=self.name(TRADE_ITEMS, index), status='open',
+                                  amount=float(self.amounts(150, 0.8)),
+                                  type='for_sale' if index % 2 else 'desired_purchase') for index in range(trades)))
+
+        self.add_expenses(pusher, members, budgets, funds, start, expenses * months)
+        self.add_incomes(pusher, members, start, incomes * months)
+        self.add_paychecks(pusher, members, start)
+        self.add_bills(pusher, members, budgets, start, months, bills)
+        self.add_values(pusher, budgets, funds, accounts, start, value_hours)
+
+        # the spending rollups of everything above, as if each row had been posted through the API
+        call_command('rebuild_rollups', pusher_key=pusher.key, stdout=io.StringIO())
+        return pusher, members
+
+    @staticmethod
+    def name(names, index):
+        # names run out into numbered copies, within the 15 characters of an encapsulation name
+        if index < len(names):
+            return names[index]
+        return '%s %d' % (names[index % len(names)][:10], index // len(names) + 1)
+
+    def add_expenses(self, pusher, users, budgets, funds, start, size):
+        categories, amounts = self.categories(EXPENSE_PROFILE, EXPENSE_CATEGORY, size)
+        payers = self.random.integers(0, len(users), size)
+        # most spending is filed under a budget, some under a fund
+        filing = self.random.uniform(0, 1, size)
+        budget_of = self.random.integers(0, max(len(budgets), 1), size)
+        fund_of = self.random.integers(0, max(len(funds), 1), size)
+        parties = self.random.zipf(1.5, size) % 50
+
+        # plain lists and ids from here on, as numpy scalars and related instances slow down every row
+        user_ids = [users[payer].id for payer in payers.tolist()]
+        budget_ids = [budgets[index].id if budgets and filed < 0.7 else None
+                      for index, filed in zip(budget_of.tolist(), filing.tolist())]
+        fund_ids = [funds[index].id if funds and 0.7 <= filed < 0.8 else None
+                    for index, filed in zip(fund_of.tolist(), filing.tolist())]
+        amounts, parties = amounts.tolist(), parties.tolist()
+
+        self.insert(Expense, (
+            Expense(pusher_id=pusher.id, user_id=user_ids[row], item=categories[row][:14] + ' %d' % (row % 100),
+                    amount=amounts[row], party='%s %d' % (categories[row][:12], parties[row]),
+                    category=categories[row], timestamp=timestamp, budget_id=budget_ids[row], fund_id=fund_ids[row])
+            for row, timestamp in enumerate(self.timestamps(start, size))))
+
+    def add_incomes(self, pusher, users, start, size):
+        categories, amounts = self.categories(INCOME_PROFILE, INCOME_CATEGORY, size)
+        user_ids = [users[payee].id for payee in self.random.integers(0, len(users), size).tolist()]
+        amounts = amounts.tolist()
+        self.insert(Income, (
+            Income(pusher_id=pusher.id, user_id=user_ids[row], item=categories[row][:14] + ' %d' % (row % 100),
+                   amount=amounts[row], source=categories[row][:20], category=categories[row],
+                   timestamp=timestamp)
+            for row, timestamp in enumerate(self.timestamps(start, size))))
+
+    def add_paychecks(self, pusher, users, start):
+        checks = []
+        for index, user in enumerate(users):
+            salary = float(self.amounts(2500, 0.3, 50000))
+            first = start + timedelta(days=int(self.random.integers(0, 14)))
+            days = range(0, (self.end - first).days, 14)
+            gross = self.amounts(np.full(len(days), salary), 0.03, 99999.99)
+            for day, gross_amt in zip(days, gross):
+                # users paid on the same day are a second apart, keeping (pusher, timestamp) unique
+                paid = first + timedelta(days=day, hours=9, seconds=index)
+                deductions = [round(min(gross_amt * rate, limit), 2) for rate, limit in
+                              [(0.05, 9999.99), (0.12, 999.99), (0.04, 999.99), (0.0145, 999.99), (0.062, 999.99)]]
+                checks.append(Paycheck(pusher=pusher, user=user, item='paycheck', source='employer',
+                                       amount=round(gross_amt - sum(deductions), 2), gross_amt=float(gross_amt),
+                                       hours=80, start_date=(paid - timedelta(days=14)).date(), end_date=paid.date(),
+                                       pre_tax_deduc=deductions[0], federal_with=deductions[1],
+                                       state_tax=deductions[2], medicare=deductions[3], oasdi=deductions[4],
+                                       timestamp=paid))
+        self.insert(Paycheck, checks)
+
+    def add_bills(self, pusher, users, budgets, start, months, count):
+        bills = []
+        for index in range(count):
+            item, category, median, sigma, due_day = BILL_ITEMS[index % len(BILL_ITEMS)]
+            if index >= len(BILL_ITEMS):
+                item = '%s %d' % (item[:15], index // len(BILL_ITEMS) + 1)
+            amounts = self.amounts(np.full(months, median), sigma)
+            payer = users[int(self.random.integers(0, len(users)))]
+            budget = budgets[index % len(budgets)] if budgets else None
+
+            for month in range(months):
+                due = add_months(start.date().replace(day=due_day), month)
+                if day_start(due - timedelta(days=5)) >= self.end:
+                    break
+                # bills due on the same day, like rent and its numbered copies, are posted a second apart
+                posted = day_start(due - timedelta(days=5)) + timedelta(seconds=index)
+                bills.append(Bills(pusher=pusher, user=payer, item=item, amount=float(amounts[month]),
+                                   party=item[:20], category=category, budget=budget, due_date=due,
+                                   status='paid' if due < self.end.date() else 'open', timestamp=posted))
+        self.insert(Bills, bills)
+
+    def add_values(self, pusher, budgets, funds, accounts, start, value_hours):
+        ticks = int((self.end - start).total_seconds() // (value_hours * 3600))
+        times = [start + timedelta(hours=value_hours * tick) for tick in range(ticks)]
+        progress = np.arange(ticks) / max(ticks, 1)
+
+        # what is left of each budget's monthly allocation, spent down over the month
+        month_elapsed = np.array([(time.day - 1) / 30 for time in times])
+        for budget in budgets:
+            noise = self.random.normal(0, 0.05, ticks)
+            left = np.clip(float(budget.alloc_amt) * (1 - month_elapsed + noise), 0, MAX_VALUE)
+            self.insert(BudgetValue, (BudgetValue(budget_id=budget.id, value=value, timestamp=time)
+                                      for value, time in zip(np.round(left, 2).tolist(), times)))
+
+        # savings climbing toward the goal
+        for fund in funds:
+            saved = np.clip(float(fund.goal_amt) * progress + self.random.normal(0, 50, ticks).cumsum(), 0, MAX_VALUE)
+            self.insert(FundValue, (FundValue(fund_id=fund.id, value=value, timestamp=time)
+                                    for value, time in zip(np.round(saved, 2).tolist(), times)))
+
+        if not accounts or not ticks:
+            return
+        # the accounts take turns posting a balance, each post moving the net worth by its change
+        owner = np.arange(ticks) % len(accounts)
+        opening = self.amounts(np.full(len(accounts), 5000), 0.8, MAX_VALUE / len(accounts))
+        steps = self.random.normal(value_hours * 2, 25 * np.sqrt(value_hours), ticks)
+        balances = np.empty(ticks)
+        for index in range(len(accounts)):
+            mine = owner == index
+            balances[mine] = np.clip(opening[index] + steps[mine].cumsum(), -MAX_VALUE / len(accounts),
+                                     MAX_VALUE / len(accounts))
+        balances = np.round(balances, 2)
+        previous = np.concatenate([opening[owner[:len(accounts)]], balances[:-len(accounts)]])[:ticks]
+        net_worth = np.round(opening.sum() + np.cumsum(balances - previous), 2)
+
+        account_ids = [accounts[index].id for index in owner.tolist()]
+        self.insert(AccountValue, (AccountValue(account_id=account_id, value=value, timestamp=time)
+                                   for account_id, value, time in zip(account_ids, balances.tolist(), times)))
+        self.insert(ExpNetWorth, (ExpNetWorth(pusher_id=pusher.id, amount=amount, timestamp=time)
+                                  for amount, time in zip(net_worth.tolist(), times)))
+
+        for index, account in enumerate(accounts):
+            mine = np.flatnonzero(owner == index)
+            account.cur_value = float(balances[mine[-1]]) if len(mine) else float(opening[index])
+        Account.objects.bulk_update(accounts, ['cur_value'])
+        Pusher.objects.filter(id=pusher.id).update(net_worth=float(net_worth[-1]))
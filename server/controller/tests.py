@@ -1,3 +1,1217 @@
-from django.test import TestCase
+import base64
+import csv
+import datetime
+import decimal
+import importlib
+import io
+import json
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.db.models import Sum
+from django.conf import settings
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from prometheus_client import REGISTRY
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.serializers import BaseSerializer, ListSerializer, Serializer
+from rest_framework.test import APIClient
+
+from configuration.urls import urlpatterns
+
+from .authentication import TOKEN_CACHE
+from .benchmark import SCENARIOS, encode_request, remove_benchmark_data, seed_benchmark_data
+from .control.views_helper import pusher_access_key
+from .models import *
+from .response_cache import RESPONSE_CACHE_ALIAS, RESPONSE_CACHE_STATS
+from .search import POSTGRES_SEARCH_VECTOR, SEARCH_CANDIDATES, candidate_query, search_terms
+from .synthetic import SyntheticData
+
+
+def create_pusher(username, key):
+    user = User.objects.create(username=username, email=username + '@test.com')
+    pusher = Pusher.objects.create(primaryUser=user, name=username + ' pusher', key=key)
+    PusherAccess.objects.create(user=user, pusher=pusher)
+    return user, pusher
+
+
+class PusherTestCase(TestCase):
+    def setUp(self):
+        # process-level caches outlive the per-test transaction rollback
+        caches[RESPONSE_CACHE_ALIAS].clear()
+        RESPONSE_CACHE_STATS.clear()
+        self.user, self.pusher = create_pusher('owner', 'OWNER001')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+class CursorPaginationTest(PusherTestCase):
+    def setUp(self):
+        super().setUp()
+        self.budget = Budget.objects.create(pusher=self.pusher, name='food', alloc_amt=100, pay_start='2023-01-01')
+        # most rows share one timestamp, so pages have to split a run of ties
+        shared = timezone.now() - datetime.timedelta(days=1)
+        for i in range(8):
+            Expense.objects.create(pusher=self.pusher, user=self.user, item='item %d' % i, amount=i, party='party',
+                                   category='other')
+            BudgetValue.objects.create(budget=self.budget, value=i)
+            ExpNetWorth.objects.create(pusher=self.pusher, amount=i)
+            Budget.objects.create(pusher=self.pusher, name='budget %d' % i, alloc_amt=i, pay_start='2023-01-01')
+        for model in [Expense, BudgetValue, ExpNetWorth]:
+            model.objects.filter(id__in=model.objects.order_by('id').values('id')[1:7]).update(timestamp=shared)
+
+    def walk(self, path, params):
+        rows, url, data = [], path, dict(params, pagination='cursor', page_size=3)
+        while url is not None:
+            response = self.client.get(url, data)
+            self.assertEqual(response.status_code, 200)
+            rows += response.json()['results']
+            url, data = response.json()['next'], None
+        return rows
+
+    def test_entity_pages(self):
+        rows = self.walk('/entity/', {'pusher_key': self.pusher.key, 'type': 'expense'})
+        expected = Expense.objects.order_by('-timestamp', '-id').values_list('item', flat=True)
+        self.assertEqual([row['item'] for row in rows], list(expected))
+
+    def test_encapsulation_value_pages(self):
+        rows = self.walk('/encapsulation/value/', {'pusher_key': self.pusher.key, 'type': 'budget', 'name': 'food'})
+        expected = BudgetValue.objects.order_by('-timestamp', '-id').values_list('value', flat=True)
+        self.assertEqual([decimal.Decimal(row['value']) for row in rows], list(expected))
+
+    def test_net_worth_pages(self):
+        rows = self.walk('/net_worth/', {'pusher_key': self.pusher.key})
+        expected = ExpNetWorth.objects.order_by('-timestamp', '-id').values_list('amount', flat=True)
+        self.assertEqual([decimal.Decimal(row['amount']) for row in rows], list(expected))
+
+    def test_encapsulation_pages(self):
+        rows = self.walk('/encapsulation/', {'pusher_key': self.pusher.key, 'type': 'budget'})
+        expected = Budget.objects.order_by('id').values_list('name', flat=True)
+        self.assertEqual([row['name'] for row in rows], list(expected))
+
+
+class ListQueryCountTest(PusherTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.budget = Budget.objects.create(pusher=self.pusher, name='food', alloc_amt=100, pay_start='2023-01-01')
+        self.fund = Fund.objects.create(pusher=self.pusher, name='car', goal_amt=1000)
+        self.account = Account.objects.create(pusher=self.pusher, name='checking')
+
+    def add_rows(self, count):
+        start = Expense.objects.count()
+        for i in range(start, start + count):
+            Expense.objects.create(pusher=self.pusher, user=self.user, item='item', amount=1, party='party',
+                                   category='other', budget=self.budget if i % 2 else None,
+                                   fund=None if i % 2 else self.fund)
+            Bills.objects.create(pusher=self.pusher, user=self.user, item='bill %d' % i, amount=1, party='party',
+                                 category='Bills', status='open', due_date='2023-01-01', budget=self.budget)
+            Income.objects.create(pusher=self.pusher, user=self.user, item='item', amount=1, source='job',
+                                  category='other')
+            Budget.objects.create(pusher=self.pusher, name='budget %d' % i, alloc_amt=1, pay_start='2023-01-01')
+            BudgetValue.objects.create(budget=self.budget, value=i)
+            FundValue.objects.create(fund=self.fund, value=i)
+            AccountValue.objects.create(account=self.account, value=i)
+            other, _ = create_pusher('user %d' % i, 'KEY%05d' % i)
+            PusherAccess.objects.create(user=other, pusher=self.pusher)
+            PusherAccess.objects.create(user=self.user, pusher=Pusher.objects.get(primaryUser=other))
+
+    def count_queries(self, path, params):
+        caches[RESPONSE_CACHE_ALIAS].clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def assert_constant_queries(self, path, params):
+        self.add_rows(2)
+        small = self.count_queries(path, params)
+        self.add_rows(20)
+        large = self.count_queries(path, params)
+        self.assertEqual(small, large)
+
+    def test_expense_list(self):
+        self.assert_constant_queries('/entity/', {'pusher_key': self.pusher.key, 'type': 'expense'})
+
+    def test_bill_list(self):
+        self.assert_constant_queries('/entity/', {'pusher_key': self.pusher.key, 'type': 'bill'})
+
+    def test_income_list(self):
+        self.assert_constant_queries('/entity/', {'pusher_key': self.pusher.key, 'type': 'income'})
+
+    def test_encapsulation_list(self):
+        self.assert_constant_queries('/encapsulation/', {'pusher_key': self.pusher.key, 'type': 'budget'})
+
+    def test_encapsulation_value_lists(self):
+        for e_type, name in [('budget', 'food'), ('fund', 'car'), ('account', 'checking')]:
+            self.assert_constant_queries('/encapsulation/value/',
+                                         {'pusher_key': self.pusher.key, 'type': e_type, 'name': name})
+
+    def test_pusher_access_lists(self):
+        self.assert_constant_queries('/pusher/access/all/', {'pusher_key': self.pusher.key})
+        self.assert_constant_queries('/pusher/access/', {'pusher_key': self.pusher.key})
+
+
+class DashboardTest(PusherTestCase):
+    def setUp(self):
+        super().setUp()
+        self.budget = Budget.objects.create(pusher=self.pusher, name='food', alloc_amt=100, pay_start='2023-01-01')
+        self.fund = Fund.objects.create(pusher=self.pusher, name='car', goal_amt=1000)
+        self.account = Account.objects.create(pusher=self.pusher, name='checking')
+
+    def add_rows(self, count):
+        today = timezone.localdate()
+        for i in range(count):
+            BudgetValue.objects.create(budget=self.budget, value=i)
+            FundValue.objects.create(fund=self.fund, value=i)
+            Expense.objects.create(pusher=self.pusher, user=self.user, item='item %d' % i, amount=1, party='party',
+                                   category='other', budget=self.budget)
+            Income.objects.create(pusher=self.pusher, user=self.user, item='item %d' % i, amount=1, source='job',
+                                  category='other')
+            Bills.objects.create(pusher=self.pusher, user=self.user, item='bill %d' % i, amount=1, party='party',
+                                 category='Bills', status='Paid' if i % 3 == 0 else 'open', fund=self.fund,
+                                 due_date=today + datetime.timedelta(days=i - 2))
+
+    def dashboard(self, **params):
+        response = self.client.get('/pusher/dashboard/', {'pusher_key': self.pusher.key, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_contents(self):
+        self.add_rows(8)
+        self.client.post('/encapsulation/value/new/', {'pusher_key': self.pusher.key, 'type': 'account',
+                                                       'account': 'checking', 'value': '250.00'}, format='json')
+
+        data = self.dashboard(recent=3)
+        self.assertEqual(data['pusher']['key'], self.pusher.key)
+        self.assertEqual(data['net_worth'], '250.00')
+        self.assertEqual([(budget['name'], budget['value']) for budget in data['budgets']], [('food', '7.00')])
+        self.assertEqual(data['funds'][0]['value'], '7.00')
+        self.assertEqual((data['accounts'][0]['cur_value'], data['accounts'][0]['value']), ('250.00', '250.00'))
+        self.assertEqual([expense['item'] for expense in data['recent']['expense']], ['item 7', 'item 6', 'item 5'])
+        self.assertEqual(data['recent']['paycheck'], [])
+        # due from today on and not paid, soonest first
+        self.assertEqual([bill['item'] for bill in data['upcoming_bills']], ['bill 2', 'bill 4', 'bill 5'])
+
+    def test_net_worth_is_read_fresh(self):
+        self.dashboard()
+        Pusher.objects.filter(id=self.pusher.id).update(net_worth=42)
+        self.assertEqual(self.dashboard()['net_worth'], '42.00')
+
+    def test_constant_queries(self):
+        counts = []
+        for rows in [1, 20]:
+            self.add_rows(rows)
+            caches[RESPONSE_CACHE_ALIAS].clear()
+            with CaptureQueriesContext(connection) as context:
+                self.dashboard(recent=50)
+            counts.append(len(context.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_invalid_recent(self):
+        for recent in ['0', '51', 'many']:
+            response = self.client.get('/pusher/dashboard/', {'pusher_key': self.pusher.key, 'recent': recent})
+            self.assertEqual(response.status_code, 400)
+
+
+class NetWorthTest(PusherTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.checking = Account.objects.create(pusher=self.pusher, name='checking')
+        self.savings = Account.objects.create(pusher=self.pusher, name='savings')
+
+    def post_value(self, name, value):
+        response = self.client.post('/encapsulation/value/new/', {'pusher_key': self.pusher.key, 'type': 'account',
+                                                                  'account': name, 'value': value}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_running_total_follows_balance_posts(self):
+        self.post_value('checking', '100.00')
+        self.post_value('savings', '50.00')
+        self.post_value('checking', '80.00')
+
+        self.pusher.refresh_from_db()
+        self.assertEqual(self.pusher.net_worth, decimal.Decimal('130.00'))
+        self.assertEqual(ExpNetWorth.objects.filter(pusher=self.pusher).first().amount, decimal.Decimal('130.00'))
+
+    def test_account_deletion_updates_running_total(self):
+        self.post_value('checking', '100.00')
+        self.post_value('savings', '50.00')
+
+        response = self.client.delete('/encapsulation/?pusher_key=%s&type=account&name=savings' % self.pusher.key)
+        self.assertEqual(response.status_code, 204)
+
+        self.pusher.refresh_from_db()
+        self.assertEqual(self.pusher.net_worth, decimal.Decimal('100.00'))
+
+
+class NetWorthSeriesTest(PusherTestCase):
+    def setUp(self):
+        super().setUp()
+
+        # two points a day for ten days, the second one higher
+        start = datetime.datetime(2023, 3, 1, tzinfo=datetime.timezone.utc)
+        for day in range(10):
+            for hour, amount in [(8, 100 + day), (20, 200 + day)]:
+                point = ExpNetWorth.objects.create(pusher=self.pusher, amount=amount)
+                ExpNetWorth.objects.filter(id=point.id).update(
+                    timestamp=start + datetime.timedelta(days=day, hours=hour))
+
+    def series(self, **params):
+        response = self.client.get('/net_worth/series/', {'pusher_key': self.pusher.key, 'from': '2023-03-01',
+                                                          'to': '2023-03-11', **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data['series']
+
+    def test_last_value_per_day(self):
+        series = self.series(resolution='day')
+        self.assertEqual(len(series), 10)
+        self.assertEqual([point['amount'] for point in series[:2]], [decimal.Decimal('200.00'),
+                                                                     decimal.Decimal('201.00')])
+
+    def test_ohlc_per_week(self):
+        series = self.series(resolution='week', mode='ohlc', **{'from': '2023-03-06'})
+        self.assertEqual(len(series), 1)
+        self.assertEqual([series[0][key] for key in ['open', 'high', 'low', 'close']],
+                         [decimal.Decimal(value) for value in ['105.00', '209.00', '105.00', '209.00']])
+
+    def test_lttb_keeps_endpoints(self):
+        series = self.series(resolution='lttb', points=5)
+        self.assertEqual(len(series), 5)
+        self.assertEqual(series[0]['amount'], decimal.Decimal('100.00'))
+        self.assertEqual(series[-1]['amount'], decimal.Decimal('209.00'))
+
+    def test_bad_resolution(self):
+        response = self.client.get('/net_worth/series/', {'pusher_key': self.pusher.key, 'resolution': 'year'})
+        self.assertEqual(response.status_code, 400)
+
+
+class NetWorthCompactionTest(PusherTestCase):
+    def point(self, days_ago, hour, amount):
+        point = ExpNetWorth.objects.create(pusher=self.pusher, amount=amount)
+        timestamp = timezone.now().replace(hour=hour, minute=0) - datetime.timedelta(days=days_ago)
+        ExpNetWorth.objects.filter(id=point.id).update(timestamp=timestamp)
+
+    def test_old_history_is_compacted_by_age(self):
+        for hour in [1, 2, 3]:
+            self.point(1, hour, hour)  # recent, kept at full resolution
+            self.point(100, hour, 10 + hour)  # one per day
+        for day in range(7):
+            self.point(500 + day, 12, 100 + day)  # one per week
+
+        out = io.StringIO()
+        call_command('compact_net_worth', batch_size=2, stdout=out)
+        self.assertIn("Reclaimed", out.getvalue())
+
+        amounts = sorted(int(amount) for amount in ExpNetWorth.objects.values_list('amount', flat=True))
+        self.assertEqual(amounts[:4], [1, 2, 3, 13])
+        # seven consecutive days span one or two weeks, each keeping its latest point
+        self.assertIn(100, amounts)
+        self.assertIn(len(amounts), [5, 6])
+
+    def test_dry_run_removes_nothing(self):
+        for hour in [1, 2]:
+            self.point(100, hour, hour)
+
+        out = io.StringIO()
+        call_command('compact_net_worth', dry_run=True, stdout=out)
+        self.assertIn("Would reclaim 1", out.getvalue())
+        self.assertEqual(ExpNetWorth.objects.count(), 2)
+
+
+class InPlaceModificationTest(PusherTestCase):
+    def test_budget_edit_keeps_history_and_links(self):
+        budget = Budget.objects.create(pusher=self.pusher, name='food', alloc_amt=100, pay_start='2023-01-01')
+        BudgetValue.objects.create(budget=budget, value=40)
+        expense = Expense.objects.create(pusher=self.pusher, user=self.user, item='lunch', amount=12, party='cafe',
+                                         category='dining', budget=budget)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch('/encapsulation/', {'pusher_key': self.pusher.key, 'type': 'budget',
+                                                             'name': 'food', 'data': {'alloc_amt': '150.00'}},
+                                         format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('UPDATE "controller_budget"')]), 1)
+
+        budget.refresh_from_db()
+        self.assertEqual(budget.alloc_amt, decimal.Decimal('150.00'))
+        self.assertEqual(BudgetValue.objects.filter(budget=budget).count(), 1)
+        expense.refresh_from_db()
+        self.assertEqual(expense.budget_id, budget.id)
+
+    def test_account_edit_keeps_balance_history(self):
+        Account.objects.create(pusher=self.pusher, name='checking')
+        self.client.post('/encapsulation/value/new/', {'pusher_key': self.pusher.key, 'type': 'account',
+                                                       'account': 'checking', 'value': '100.00'}, format='json')
+
+        response = self.client.put('/encapsulation/', {'pusher_key': self.pusher.key, 'type': 'account',
+                                                       'name': 'checking',
+                                                       'data': {'acct_number': '1234', 'rout_number': '5678'}},
+                                   format='json')
+        self.assertEqual(response.status_code, 200)
+
+        account = Account.objects.get(pusher=self.pusher, name='checking')
+        self.assertEqual(account.acct_number, '1234')
+        self.assertEqual(account.cur_value, decimal.Decimal('100.00'))
+        self.assertEqual(AccountValue.objects.filter(account=account).count(), 1)
+        self.pusher.refresh_from_db()
+        self.assertEqual(self.pusher.net_worth, decimal.Decimal('100.00'))
+
+    def test_bill_edit_keeps_identity_and_moves_rollup(self):
+        bill = Bills.objects.create(pusher=self.pusher, user=self.user, item='power', amount=50, party='utility',
+                                    category='Bills', status='unpaid', due_date='2023-05-01')
+        SpendingRollup.objects.create(pusher=self.pusher, period=timezone.localdate().replace(day=1),
+                                      entity_type='bill', category='Bills', total=50, count=1)
+
+        response = self.client.patch('/entity/', {'pusher_key': self.pusher.key, 'type': 'bill',
+                                                  'data': {'item': 'power', 'due_date': '2023-05-01',
+                                                           'amount': '65.00', 'status': 'paid'}}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        updated = Bills.objects.get(pusher=self.pusher, item='power')
+        self.assertEqual((updated.id, updated.timestamp), (bill.id, bill.timestamp))
+        self.assertEqual((updated.amount, updated.status), (decimal.Decimal('65.00'), 'paid'))
+        self.assertEqual(SpendingRollup.objects.get(pusher=self.pusher, entity_type='bill').total,
+                         decimal.Decimal('65.00'))
+
+
+class ConditionalGetTest(PusherTestCase):
+    def get(self, path, params, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(path, params, **headers)
+        return response, len(context.captured_queries)
+
+    def test_unchanged_list_is_not_modified(self):
+        Subscription.objects.create(pusher=self.pusher, item='tv', amount=10, pay_period='monthly',
+                                    start_date='2023-01-01', status='active')
+        params = {'pusher_key': self.pusher.key, 'type': 'subscription'}
+        response, _ = self.get('/entity/', params)
+        self.assertEqual(response.status_code, 200)
+
+        response, queries = self.get('/entity/', params, response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(queries, 1)
+
+        # other pages are tagged separately
+        response, _ = self.get('/entity/', {**params, 'page': 2}, response['ETag'])
+        self.assertNotEqual(response.status_code, 304)
+
+    def test_writes_change_the_etag(self):
+        budget = Budget.objects.create(pusher=self.pusher, name='food', alloc_amt=100, pay_start='2023-01-01')
+        Expense.objects.create(pusher=self.pusher, user=self.user, item='rice', amount=3, party='shop',
+                               category='groceries', budget=budget)
+        params = {'pusher_key': self.pusher.key, 'type': 'expense'}
+        etag = self.get('/entity/', params)[0]['ETag']
+
+        response = self.client.post('/entity/new/', {'pusher_key': self.pusher.key, 'type': 'expense',
+                                                     'data': {'item': 'lunch', 'amount': '12.00', 'party': 'cafe',
+                                                              'category': 'dining', 'budget': 'food'}},
+                                    format='json')
+        self.assertEqual(response.status_code, 200)
+        response, _ = self.get('/entity/', params, etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        # renaming a budget changes the expense listing too
+        self.client.patch('/encapsulation/', {'pusher_key': self.pusher.key, 'type': 'budget', 'name': 'food',
+                                              'data': {'category': 'groceries'}}, format='json')
+        self.assertEqual(self.get('/entity/', params, etag)[0].status_code, 200)
+
+    def test_account_values_change_net_worth(self):
+        Account.objects.create(pusher=self.pusher, name='checking')
+        ExpNetWorth.objects.create(pusher=self.pusher, amount=0)
+        etag = self.get('/net_worth/', {'pusher_key': self.pusher.key})[0]['ETag']
+
+        self.client.post('/encapsulation/value/new/', {'pusher_key': self.pusher.key, 'type': 'account',
+                                                       'account': 'checking', 'value': '100.00'}, format='json')
+        self.assertEqual(self.get('/net_worth/', {'pusher_key': self.pusher.key}, etag)[0].status_code, 200)
+
+
+class ResponseCacheTest(PusherTestCase):
+    def setUp(self):
+        super().setUp()
+        self.member, _ = create_pusher('member', 'MEMBER01')
+        PusherAccess.objects.create(user=self.member, pusher=self.pusher)
+        self.member_client = APIClient()
+        self.member_client.force_authenticate(self.member)
+        Budget.objects.create(pusher=self.pusher, name='food', alloc_amt=100, pay_start='2023-01-01')
+
+    def test_users_of_a_pusher_share_cached_lists(self):
+        params = {'pusher_key': self.pusher.key, 'type': 'budget'}
+        self.assertEqual(self.client.get('/encapsulation/', params).status_code, 200)
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.member_client.get('/encapsulation/', params)
+        self.assertEqual([budget['name'] for budget in response.data], ['food'])
+        # access check and version lookup only
+        self.assertEqual(len(context.captured_queries), 2)
+        self.assertEqual(RESPONSE_CACHE_STATS.snapshot()['encapsulation'], {'hits': 1, 'misses': 1})
+
+    def test_writes_retire_cached_lists(self):
+        params = {'pusher_key': self.pusher.key, 'type': 'budget'}
+        self.client.get('/encapsulation/', params)
+
+        response = self.client.post('/encapsulation/new/', {'pusher_key': self.pusher.key, 'type': 'budget',
+                                                            'name': 'rent', 'data': {
+            'alloc_amt': '900.00', 'priority': 1, 'pay_period': 'Monthly', 'pay_start': '2023-01-01',
+            'category': 'housing'}}, format='json')
+        self.assertEqual(response.status_code, 200)
+        response = self.member_client.get('/encapsulation/', params)
+        self.assertEqual(sorted(budget['name'] for budget in response.data), ['food', 'rent'])
+
+    def test_pagination_links_follow_the_request_host(self):
+        for amount in range(3):
+            Expense.objects.create(pusher=self.pusher, user=self.user, item='item', amount=amount, party='party',
+                                   category='other')
+        params = {'pusher_key': self.pusher.key, 'type': 'expense', 'page_size': 1, 'page': 1}
+        self.client.get('/entity/', params, HTTP_HOST='internal:8000')
+
+        response = self.member_client.get('/entity/', params, HTTP_HOST='api.example.com', secure=True)
+        self.assertTrue(response.json()['next'].startswith('https://api.example.com/entity/'))
+        self.assertEqual(RESPONSE_CACHE_STATS.snapshot()['entity'], {'hits': 0, 'misses': 2})
+
+    def test_value_and_net_worth_lists_are_cached(self):
+        budget = Budget.objects.get(name='food')
+        BudgetValue.objects.create(budget=budget, value=10)
+        ExpNetWorth.objects.create(pusher=self.pusher, amount=10)
+        for path, params, model in [('/encapsulation/value/', {'type': 'budget', 'name': 'food'}, BudgetValue),
+                                    ('/net_worth/', {}, ExpNetWorth)]:
+            params = {'pusher_key': self.pusher.key, **params}
+            expected = self.client.get(path, params).json()
+            with CaptureQueriesContext(connection) as context:
+                response = self.member_client.get(path, params)
+            self.assertEqual(response.json(), expected)
+            # the page comes from the cache, not from the listing's table
+            self.assertFalse([query for query in context.captured_queries
+                              if model._meta.db_table in query['sql']])
+
+        self.assertEqual(RESPONSE_CACHE_STATS.snapshot()['encapsulation_value'], {'hits': 1, 'misses': 1})
+        self.assertEqual(RESPONSE_CACHE_STATS.snapshot()['net_worth'], {'hits': 1, 'misses': 1})
+
+    def test_pusher_lists_follow_access_changes(self):
+        self.assertEqual(len(self.client.get('/pusher/access/all/', {'pusher_key': self.pusher.key}).data), 2)
+        self.assertEqual(len(self.client.get('/pusher/all/').data), 1)
+
+        create_pusher('guest', 'GUEST001')
+        response = self.client.post('/pusher/access/new', {'pusher_key': self.pusher.key, 'username': 'guest'},
+                                    format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.client.get('/pusher/access/all/', {'pusher_key': self.pusher.key}).data), 3)
+
+        self.client.post('/pusher/new/', {'name': 'household'}, format='json')
+        self.assertEqual(len(self.client.get('/pusher/all/').data), 2)
+
+
+@override_settings(MIDDLEWARE=['controller.instrumentation.RequestTimingMiddleware'] + settings.MIDDLEWARE)
+class RequestTimingTest(PusherTestCase):
+    def setUp(self):
+        super().setUp()
+        for amount in range(3):
+            Expense.objects.create(pusher=self.pusher, user=self.user, item='item', amount=amount, party='party',
+                                   category='other')
+
+    def timings(self, response):
+        timings = {}
+        for metric in response['Server-Timing'].split(', '):
+            name, duration = metric.split(';')[:2]
+            timings[name] = float(duration[len('dur='):])
+        return timings
+
+    def test_reports_queries_and_phases(self):
+        with CaptureQueriesContext(connection) as queries:
+            with self.assertLogs('controller.timing', 'INFO') as logs:
+                response = self.client.get('/entity/', {'pusher_key': self.pusher.key, 'type': 'expense'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('desc="%d queries"' % len(queries), response['Server-Timing'])
+
+        timings = self.timings(response)
+        self.assertGreater(timings['serialize'], 0)
+        self.assertLessEqual(timings['db'] + timings['auth'] + timings['serialize'], timings['total'])
+
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual((line['path'], line['status'], line['queries']), ('/entity/', 200, len(queries)))
+        self.assertNotIn('slowest', line)
+
+    def test_times_through_drf_hooks(self):
+        with self.assertLogs('controller.timing', 'INFO'):
+            self.client.get('/entity/', {'pusher_key': self.pusher.key, 'type': 'expense'})
+        # DRF's own classes are left as they are
+        for method in [Request._authenticate, BaseSerializer.is_valid, Serializer.data.fget, ListSerializer.data.fget,
+                       JSONRenderer.render]:
+            self.assertFalse(hasattr(method, '__wrapped__'))
+
+        self.user.set_password('password')
+        self.user.save()
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Basic ' + base64.b64encode(b'owner:password').decode())
+        with self.assertLogs('controller.timing', 'INFO') as logs:
+            response = client.get('/entity/', {'pusher_key': self.pusher.key, 'type': 'expense'})
+        self.assertEqual(response.status_code, 200)
+        # a password hash is well over the precision of the line
+        self.assertGreater(json.loads(logs.records[0].getMessage())['auth_ms'], 0)
+
+    @override_settings(REQUEST_TIMING_SLOW_MS=0, REQUEST_TIMING_SLOW_QUERIES=2)
+    def test_slow_requests_log_slowest_statements(self):
+        with self.assertLogs('controller.timing', 'WARNING') as logs:
+            self.client.get('/entity/', {'pusher_key': self.pusher.key, 'type': 'expense'})
+        slowest = json.loads(logs.records[0].getMessage())['slowest']
+        self.assertEqual(len(slowest), 2)
+        self.assertGreaterEqual(slowest[0]['ms'], slowest[1]['ms'])
+
+class MetricsTest(PusherTestCase):
+    def sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_request_latency_and_queries_by_view(self):
+        labels = {'view': 'entity_func', 'method': 'GET'}
+        observed = self.sample('pennypusher_request_duration_seconds_count', status='200', **labels)
+        queries = self.sample('pennypusher_request_queries_sum', **labels)
+        Expense.objects.create(pusher=self.pusher, user=self.user, item='item', amount=1, party='party',
+                               category='other')
+
+        with CaptureQueriesContext(connection) as captured:
+            self.client.get('/entity/', {'pusher_key': self.pusher.key, 'type': 'expense'})
+        self.assertEqual(self.sample('pennypusher_request_duration_seconds_count', status='200', **labels),
+                         observed + 1)
+        self.assertEqual(self.sample('pennypusher_request_queries_sum', **labels), queries + len(captured))
+
+    def test_cache_lookups_and_net_worth_updates(self):
+        labels = {'cache': 'response', 'view': 'entity', 'result': 'hit'}
+        hits = self.sample('pennypusher_cache_lookups_total', **labels)
+        updates = self.sample('pennypusher_net_worth_updates_total', reason='account_value')
+        Expense.objects.create(pusher=self.pusher, user=self.user, item='item', amount=1, party='party',
+                               category='other')
+        Account.objects.create(pusher=self.pusher, name='checking')
+
+        for _ in range(2):
+            self.client.get('/entity/', {'pusher_key': self.pusher.key, 'type': 'expense'})
+        self.client.post('/encapsulation/value/new/', {'pusher_key': self.pusher.key, 'type': 'account',
+                                                       'account': 'checking', 'value': '10.00'}, format='json')
+        self.assertEqual(self.sample('pennypusher_cache_lookups_total', **labels), hits + 1)
+        self.assertEqual(self.sample('pennypusher_net_worth_updates_total', reason='account_value'), updates + 1)
+
+    def test_exposition(self):
+        response = Client().get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'pennypusher_request_duration_seconds_bucket{', response.content)
+
+        self.assertEqual(Client(REMOTE_ADDR='203.0.113.7').get('/metrics').status_code, 403)
+
+
+class EntityFilterTest(PusherTestCase):
+    def setUp(self):
+        super().setUp()
+        self.budget = Budget.objects.create(pusher=self.pusher, name='food', alloc_amt=100, pay_start='2023-01-01')
+        self.other, _ = create_pusher('other', 'OTHER001')
+        PusherAccess.objects.create(user=self.other, pusher=self.pusher)
+        rows = [('bread', 5, 'groceries', self.budget, self.user, '2023-01-05'),
+                ('bus', 2, 'transportation', None, self.user, '2023-02-10'),
+                ('cheese', 12, 'groceries', self.budget, self.other, '2023-03-15'),
+                ('taxi', 30, 'transportation', None, self.other, '2023-04-20')]
+        for item, amount, category, budget, user, day in rows:
+            expense = Expense.objects.create(pusher=self.pusher, user=user, item=item, amount=amount, party='party',
+                                             category=category, budget=budget)
+            Expense.objects.filter(id=expense.id).update(timestamp=day + 'T12:00:00Z')
+
+    def items(self, **params):
+        response = self.client.get('/entity/', {'pusher_key': self.pusher.key, 'type': 'expense', **params})
+        self.assertEqual(response.status_code, 200)
+        return [entity['item'] for entity in response.json()['results']]
+
+    def test_filters(self):
+        self.assertEqual(self.items(category='groceries'), ['cheese', 'bread'])
+        self.assertEqual(self.items(min_amount='5', max_amount='12.00'), ['cheese', 'bread'])
+        self.assertEqual(self.items(budget='food', user='owner'), ['bread'])
+        self.assertEqual(self.items(**{'from': '2023-02-01', 'to': '2023-04-01'}), ['cheese', 'bus'])
+        self.assertEqual(self.items(category='housing'), [])
+
+    def test_sorts(self):
+        self.assertEqual(self.items(sort='amount'), ['bus', 'bread', 'cheese', 'taxi'])
+        self.assertEqual(self.items(sort='-amount', category='transportation'), ['taxi', 'bus'])
+
+        response = self.client.get('/entity/', {'pusher_key': self.pusher.key, 'type': 'expense', 'sort': '-amount',
+                                                'pagination': 'cursor', 'page_size': 3})
+        items = [entity['item'] for entity in response.json()['results']]
+        items += [entity['item'] for entity in self.client.get(response.json()['next']).json()['results']]
+        self.assertEqual(items, ['taxi', 'cheese', 'bread', 'bus'])
+
+    def test_invalid_filters(self):
+        params = {'pusher_key': self.pusher.key, 'type': 'expense'}
+        for invalid in [{'budget': 'missing'}, {'user': 'nobody'}, {'min_amount': 'ten'}, {'max_amount': 'NaN'},
+                        {'from': '2023-13-01'}, {'sort': 'item'}]:
+            with self.subTest(invalid):
+                self.assertEqual(self.client.get('/entity/', {**params, **invalid}).status_code, 400)
+        self.assertEqual(self.client.get('/entity/', {**params, 'type': 'paycheck', 'budget': 'food'}).status_code,
+                         400)
+
+    def test_sort_only_reorders_entity_listings(self):
+        for i in range(3):
+            ExpNetWorth.objects.create(pusher=self.pusher, amount=10 - i)
+            BudgetValue.objects.create(budget=self.budget, value=i)
+        cursor = {'pusher_key': self.pusher.key, 'pagination': 'cursor'}
+        for path, params in [('/net_worth/', {}), ('/encapsulation/', {'type': 'budget'}),
+                             ('/encapsulation/value/', {'type': 'budget', 'name': 'food'})]:
+            for sort in ['bogus', 'amount', '-amount']:
+                with self.subTest(path=path, sort=sort):
+                    sorted_page = self.client.get(path, {**cursor, **params, 'sort': sort})
+                    self.assertEqual(sorted_page.status_code, 200)
+                    self.assertEqual(sorted_page.json()['results'],
+                                     self.client.get(path, {**cursor, **params}).json()['results'])
+
+    def test_pages_read_an_index_in_order(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("query plans are checked on SQLite")
+        for params in [{}, {'category': 'groceries'}, {'budget': 'food'}, {'user': 'other'}, {'sort': '-amount'},
+                       {'min_amount': '3', 'sort': 'amount'}, {'from': '2023-02-01'}]:
+            with self.subTest(params):
+                caches[RESPONSE_CACHE_ALIAS].clear()
+                with CaptureQueriesContext(connection) as context:
+                    self.items(**params)
+                page = [query['sql'] for query in context.captured_queries
+                        if 'FROM "controller_expense"' in query['sql'] and 'LIMIT' in query['sql']][0]
+                with connection.cursor() as cursor:
+                    cursor.execute('EXPLAIN QUERY PLAN ' + page)
+                    plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+                self.assertIn('USING INDEX expense_', plan)
+                self.assertNotIn('TEMP B-TREE', plan)
+
+
+class SearchTest(PusherTestCase):
+    def setUp(self):
+        super().setUp()
+        for item, party in [('groceries', 'corner market'), ('coffee', 'grounds cafe'), ('rent', 'landlord')]:
+            Expense.objects.create(pusher=self.pusher, user=self.user, item=item, amount=1, party=party,
+                                   category='other')
+
+    def search(self, q, e_type='expense', **params):
+        response = self.client.get('/entity/search/', {'pusher_key': self.pusher.key, 'type': e_type, 'q': q,
+                                                       **params})
+        self.assertEqual(response.status_code, 200)
+        return [entity['item'] for entity in response.json()]
+
+    def test_prefix_matches_ranked(self):
+        self.assertEqual(self.search('gro'), ['groceries', 'coffee'])
+        self.assertEqual(self.search('GRO caf'), ['coffee'])
+        self.assertEqual(self.search('market'), ['groceries'])
+        self.assertEqual(self.search('gro', limit=1), ['groceries'])
+        self.assertEqual(self.search('bakery'), [])
+
+    def test_index_follows_writes(self):
+        Expense.objects.filter(item='rent').update(item='mortgage')
+        Expense.objects.bulk_create([Expense(pusher=self.pusher, user=self.user, item='mortar', amount=1,
+                                             party='hardware', category='home')])
+        Expense.objects.filter(item='coffee').delete()
+        self.assertEqual(sorted(self.search('mor')), ['mortar', 'mortgage'])
+        self.assertEqual(self.search('rent'), [])
+        self.assertEqual(self.search('grounds'), [])
+
+    def test_scoped_to_pusher_and_type(self):
+        outsider, pusher = create_pusher('outsider', 'OUTSIDE1')
+        Expense.objects.create(pusher=pusher, user=outsider, item='groceries', amount=1, party='x', category='other')
+        Bills.objects.create(pusher=self.pusher, user=self.user, item='grocery box', amount=1, party='delivery',
+                             category='other', status='unpaid', due_date='2023-01-01')
+        self.assertEqual(self.search('groceries'), ['groceries'])
+        self.assertEqual(self.search('gro', 'bill'), ['grocery box'])
+
+    def test_accents_are_ignored(self):
+        Expense.objects.create(pusher=self.pusher, user=self.user, item='Crème brûlée', amount=1, party='Café Noël',
+                               category='other')
+        self.assertEqual(self.search('creme'), ['Crème brûlée'])
+        self.assertEqual(self.search('brûl noel'), ['Crème brûlée'])
+
+    def test_postgres_query_uses_the_unaccented_index(self):
+        migration = importlib.import_module('controller.migrations.0011_unaccent_search')
+        sql, params = candidate_query('expense', self.pusher, search_terms('Café crè'), 'postgresql')
+        self.assertIn(' AND ' + migration.SEARCH_VECTOR + ' @@ ', sql)
+        self.assertEqual(POSTGRES_SEARCH_VECTOR, migration.SEARCH_VECTOR)
+        self.assertIn("to_tsquery('simple', controller_unaccent(%s))", sql)
+        self.assertEqual(params, [self.pusher.id, 'cafe:* & cre:*', SEARCH_CANDIDATES])
+
+    def test_invalid_searches(self):
+        params = {'pusher_key': self.pusher.key, 'type': 'expense'}
+        self.assertEqual(self.client.get('/entity/search/', {**params, 'q': '%*"'}).status_code, 400)
+        self.assertEqual(self.client.get('/entity/search/', {**params, 'q': 'a', 'limit': 0}).status_code, 400)
+        self.assertEqual(self.client.get('/entity/search/', {**params, 'q': 'a', 'type': 'income'}).status_code, 400)
+
+
+class BulkIngestionTest(PusherTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.budget = Budget.objects.create(pusher=self.pusher, name='food', alloc_amt=100, pay_start='2023-01-01')
+        Bills.objects.create(pusher=self.pusher, user=self.user, item='rent', amount=900, party='landlord',
+                             category='Bills', status='open', due_date='2023-02-01')
+
+    def test_mixed_batch_reports_row_errors(self):
+        records = [
+            {'type': 'expense', 'item': 'lunch', 'amount': '12.50', 'party': 'cafe', 'category': 'café',
+             'budget': 'food'},
+            {'type': 'income', 'item': 'gift', 'amount': '20.00', 'source': 'mom', 'category': 'gift'},
+            {'type': 'bill', 'item': 'power', 'amount': '60.00', 'party': 'utility', 'status': 'open',
+             'due_date': '2023-02-01', 'budget': 'food'},
+            {'type': 'bill', 'item': 'rent', 'amount': '900.00', 'party': 'landlord', 'status': 'open',
+             'due_date': '2023-02-01', 'budget': 'food'},
+            {'type': 'expense', 'item': 'gas', 'amount': '30.00', 'party': 'station', 'category': 'transportation',
+             'budget': 'missing'},
+            {'type': 'stock', 'item': 'x'},
+        ]
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post('/entity/bulk/', {'pusher_key': self.pusher.key, 'data': records},
+                                        format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], {'income': 1, 'expense': 1, 'paycheck': 0, 'bill': 1})
+        self.assertEqual([error['index'] for error in response.data['errors']], [3, 4, 5])
+        self.assertEqual(Expense.objects.get(item='lunch').budget, self.budget)
+        self.assertLess(len(context.captured_queries), 15)
+
+
+class ExportTest(PusherTestCase):
+    def setUp(self):
+        super().setUp()
+
+        for i in range(3):
+            Expense.objects.create(pusher=self.pusher, user=self.user, item='item %d' % i, amount=1, party='party',
+                                   category='other')
+        Income.objects.create(pusher=self.pusher, user=self.user, item='gift', amount=5, source='mom',
+                              category='gift')
+
+    def export(self, output):
+        response = self.client.get('/entity/export/', {'pusher_key': self.pusher.key, 'output': output})
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode().splitlines()
+
+    def test_ndjson(self):
+        rows = [json.loads(line) for line in self.export('ndjson')]
+        self.assertEqual([row['type'] for row in rows], ['income', 'expense', 'expense', 'expense'])
+
+    def test_csv(self):
+        rows = list(csv.DictReader(self.export('csv')))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[0]['source'], 'mom')
+        self.assertEqual(rows[1]['party'], 'party')
+
+
+class StatementImportTest(PusherTestCase):
+    CSV_STATEMENT = "Date,Description,Amount,Category\n" \
+                    "2023-03-01,Coffee Shop,-4.50,café\n" \
+                    "2023-03-01,Coffee Shop,-4.50,café\n" \
+                    "2023-03-02,Employer,1500.00,paycheck\n" \
+                    "2023-03-03,Grocer,-52.10,food\n" \
+                    "not a date,Grocer,-1.00,\n"
+    OFX_STATEMENT = "OFXHEADER:100\n<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>\n" \
+                    "<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20230305120000<TRNAMT>-20.00<NAME>Gas Station</STMTTRN>\n" \
+                    "<STMTTRN>\n<TRNTYPE>INT\n<DTPOSTED>20230331\n<TRNAMT>1.25\n<NAME>Bank\n</STMTTRN>\n" \
+                    "</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>\n"
+
+    def upload(self, name, content):
+        statement = SimpleUploadedFile(name, content.encode())
+        response = self.client.post('/entity/import/', {'pusher_key': self.pusher.key, 'file': statement},
+                                    format='multipart')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_csv_import_skips_reimported_rows(self):
+        result = self.upload('statement.csv', self.CSV_STATEMENT)
+        self.assertEqual(result['created'], {'expense': 3, 'income': 1})
+        self.assertEqual(len(result['errors']), 1)
+
+        result = self.upload('statement.csv', self.CSV_STATEMENT)
+        self.assertEqual(result['created'], {'expense': 0, 'income': 0})
+        self.assertEqual(result['duplicates'], 4)
+
+        self.assertEqual(Income.objects.get().category, 'paycheck')
+        self.assertEqual(Expense.objects.get(item='Grocer').category, 'other')
+        self.assertEqual(Expense.objects.get(item='Grocer').timestamp.date(), datetime.date(2023, 3, 3))
+
+    def test_separate_imports_get_distinct_timestamps(self):
+        self.upload('first.csv', "Date,Description,Amount\n2024-05-03,Bakery,-3.00\n")
+        self.upload('second.csv', "Date,Description,Amount\n2024-05-03,Florist,-12.00\n")
+        first, second = Expense.objects.get(item='Bakery'), Expense.objects.get(item='Florist')
+        self.assertNotEqual(first.timestamp, second.timestamp)
+        self.assertEqual(second.timestamp.date(), datetime.date(2024, 5, 3))
+
+        response = self.client.delete('/entity/?pusher_key=%s&type=expense&timestamp=%s' %
+                                      (self.pusher.key, first.timestamp.strftime('%Y-%m-%dT%H:%M:%S.%fZ')))
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(list(Expense.objects.values_list('item', flat=True)), ['Florist'])
+
+    def test_ofx_import(self):
+        result = self.upload('statement.ofx', self.OFX_STATEMENT)
+        self.assertEqual(result['created'], {'expense': 1, 'income': 1})
+        self.assertEqual(Expense.objects.get().amount, decimal.Decimal('20.00'))
+        self.assertEqual(Income.objects.get().category, 'interest')
+
+
+class PusherAccessTest(PusherTestCase):
+    def test_access_check_is_one_query_then_cached(self):
+        with CaptureQueriesContext(connection) as context:
+            self.client.get('/pusher/', {'pusher_key': self.pusher.key})
+        self.assertEqual(len(context.captured_queries), 1)
+
+        with CaptureQueriesContext(connection) as context:
+            self.client.get('/pusher/', {'pusher_key': self.pusher.key})
+        self.assertEqual(len(context.captured_queries), 0)
+
+    def test_revoked_access_is_not_served_from_cache(self):
+        member = User.objects.create(username='member')
+        PusherAccess.objects.create(user=member, pusher=self.pusher)
+        member_client = APIClient()
+        member_client.force_authenticate(member)
+        self.assertEqual(member_client.get('/pusher/', {'pusher_key': self.pusher.key}).status_code, 200)
+
+        response = self.client.delete('/pusher/access/?pusher_key=%s&username=member' % self.pusher.key)
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(member_client.get('/pusher/', {'pusher_key': self.pusher.key}).status_code, 401)
+
+    def test_revocation_clears_the_shared_cache(self):
+        # other workers read the same cache, so the entry has to be gone from it, not just from this process
+        members = {}
+        for username in ['member', 'leaver']:
+            members[username] = User.objects.create(username=username)
+            PusherAccess.objects.create(user=members[username], pusher=self.pusher)
+            client = APIClient()
+            client.force_authenticate(members[username])
+            client.get('/pusher/', {'pusher_key': self.pusher.key})
+        shared = caches[RESPONSE_CACHE_ALIAS]
+        self.assertIsNotNone(shared.get(pusher_access_key(members['member'].id, self.pusher.key)))
+
+        self.client.delete('/pusher/access/?pusher_key=%s&username=member' % self.pusher.key)
+        self.assertIsNone(shared.get(pusher_access_key(members['member'].id, self.pusher.key)))
+
+        admin = User.objects.create(username='admin', is_staff=True)
+        client = APIClient()
+        client.force_authenticate(admin)
+        self.assertEqual(client.delete('/user/delete/', {'user': 'leaver'}, format='json').status_code, 204)
+        self.assertIsNone(shared.get(pusher_access_key(members['leaver'].id, self.pusher.key)))
+
+        self.client.get('/pusher/', {'pusher_key': self.pusher.key})
+        self.client.delete('/pusher/?pusher_key=%s' % self.pusher.key)
+        self.assertIsNone(shared.get(pusher_access_key(self.user.id, self.pusher.key)))
+
+    def test_unknown_pusher(self):
+        self.assertEqual(self.client.get('/pusher/', {'pusher_key': 'MISSING1'}).status_code, 400)
+
+
+class TokenAuthenticationTest(TestCase):
+    def setUp(self):
+        TOKEN_CACHE.clear()
+        self.user = User.objects.create_user(username='owner', email='owner@test.com', password='password')
+        self.client = APIClient()
+
+    def login(self, password='password'):
+        return self.client.post('/user/login/', {'username': 'owner', 'password': password}, format='json')
+
+    def test_login_issues_working_token(self):
+        self.assertEqual(self.login('wrong').status_code, 401)
+
+        token = self.login().data['token']
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token)
+        self.assertEqual(self.client.get('/user/details/').data['username'], 'owner')
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token not-a-token')
+        self.assertEqual(self.client.get('/user/details/').status_code, 403)
+
+    def test_logout_revokes_token(self):
+        token = self.login().data['token']
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token)
+        self.assertEqual(self.client.get('/user/details/').status_code, 200)
+
+        self.assertEqual(self.client.post('/user/logout/').status_code, 204)
+        self.assertEqual(self.client.get('/user/details/').status_code, 403)
+
+    def test_password_change_revokes_tokens(self):
+        token = self.login().data['token']
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token)
+        response = self.client.put('/user/modify/', {'username': 'owner', 'email': 'owner@test.com',
+                                                     'first_name': 'a', 'last_name': 'b',
+                                                     'password': 'new password'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get('/user/details/').status_code, 403)
+
+    def test_other_changes_keep_tokens(self):
+        token = self.login().data['token']
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token)
+        response = self.client.put('/user/modify/', {'username': 'owner', 'email': 'new@test.com',
+                                                     'first_name': 'a', 'last_name': 'b',
+                                                     'password': 'password'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get('/user/details/').data['email'], 'new@test.com')
+
+    def test_expired_token_is_rejected(self):
+        token = self.login().data['token']
+        AuthToken.objects.update(expires=timezone.now())
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token)
+        self.assertEqual(self.client.get('/user/details/').status_code, 403)
+
+
+class SpendingRollupTest(PusherTestCase):
+    def setUp(self):
+        super().setUp()
+        self.budget = Budget.objects.create(pusher=self.pusher, name='food', alloc_amt=100, pay_start='2023-01-01')
+
+    def summary(self, **params):
+        this_month = timezone.localdate().strftime('%Y-%m')
+        params.update({'pusher_key': self.pusher.key, 'from': this_month, 'to': this_month})
+        response = self.client.get('/summary/', params)
+        self.assertEqual(response.status_code, 200)
+        return [(row['entity_type'], row['category'], row['budget__name'], row['total'], row['count'])
+                for row in response.data]
+
+    def add_expense(self, item, amount, category):
+        response = self.client.post('/entity/new/', {'pusher_key': self.pusher.key, 'type': 'expense', 'data': {
+            'item': item, 'amount': amount, 'party': 'party', 'category': category, 'budget': 'food'}},
+                                    format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_writes_update_one_row_per_group(self):
+        for item in ['lunch', 'dinner', 'snack']:
+            self.add_expense(item, '5.00', 'café')
+        self.client.post('/entity/bulk/', {'pusher_key': self.pusher.key, 'data': [
+            {'type': 'expense', 'item': 'tea', 'amount': '5.00', 'party': 'party', 'category': 'café',
+             'budget': 'food'}]}, format='json')
+        self.client.post('/entity/new/', {'pusher_key': self.pusher.key, 'type': 'bill', 'data': {
+            'item': 'power', 'amount': '40.00', 'party': 'utility', 'status': 'open', 'due_date': '2023-01-01',
+            'budget': 'food'}}, format='json')
+
+        rollups = SpendingRollup.objects.filter(pusher=self.pusher)
+        self.assertEqual(list(rollups.order_by('entity_type').values_list('entity_type', 'budget_id', 'total',
+                                                                           'count')),
+                         [('bill', self.budget.id, decimal.Decimal('40.00'), 1),
+                          ('expense', self.budget.id, decimal.Decimal('20.00'), 4)])
+
+    def test_delete_is_atomic_with_its_rollup(self):
+        self.add_expense('lunch', '10.00', 'café')
+        lunch = Expense.objects.get(item='lunch')
+        path = '/entity/?pusher_key=%s&type=expense&timestamp=%s' % (
+            self.pusher.key, lunch.timestamp.strftime('%Y-%m-%dT%H:%M:%S.%fZ'))
+
+        with mock.patch('controller.control.entity_controller.bump_versions', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.client.delete(path)
+        self.assertTrue(Expense.objects.filter(id=lunch.id).exists())
+        self.assertEqual(self.summary(), [('expense', 'café', 'food', decimal.Decimal('10.00'), 1)])
+
+        self.assertEqual(self.client.delete(path).status_code, 204)
+        self.assertEqual(SpendingRollup.objects.get().count, 0)
+
+    def test_groups_are_unique(self):
+        row = {'pusher': self.pusher, 'period': datetime.date(2023, 1, 1), 'entity_type': 'income', 'category': 'gift'}
+        SpendingRollup.objects.create(**row, total=1, count=1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            SpendingRollup.objects.create(**row, total=1, count=1)
+        SpendingRollup.objects.create(**row, budget=self.budget, total=1, count=1)
+
+    def test_migration_backfills_existing_rows(self):
+        for item in ['lunch', 'dinner']:
+            self.add_expense(item, '5.00', 'café')
+        expected = self.summary()
+        SpendingRollup.objects.all().delete()
+
+        migration = importlib.import_module('controller.migrations.0012_spending_rollup_unique')
+        migration.backfill_rollups(apps, None)
+        self.assertEqual(self.summary(), expected)
+        self.assertEqual(SpendingRollup.objects.count(), 1)
+
+    def test_rollups_follow_writes_and_match_rebuild(self):
+        self.add_expense('lunch', '10.00', 'café')
+        self.add_expense('dinner', '15.50', 'café')
+        self.add_expense('bus', '2.75', 'transportation')
+        self.client.post('/entity/bulk/', {'pusher_key': self.pusher.key, 'data': [
+            {'type': 'income', 'item': 'gift', 'amount': '20.00', 'source': 'mom', 'category': 'gift'}]},
+                         format='json')
+
+        bus = Expense.objects.get(item='bus')
+        response = self.client.delete('/entity/?pusher_key=%s&type=expense&timestamp=%s' %
+                                      (self.pusher.key, bus.timestamp.strftime('%Y-%m-%dT%H:%M:%S.%fZ')))
+        self.assertEqual(response.status_code, 204)
+
+        expected = [('expense', 'café', 'food', decimal.Decimal('25.50'), 2),
+                    ('income', 'gift', None, decimal.Decimal('20.00'), 1)]
+        self.assertEqual(self.summary(), expected)
+        self.assertEqual(self.summary(type='income'), expected[1:])
+
+        call_command('rebuild_rollups', stdout=io.StringIO())
+        self.assertEqual(self.summary(), expected)
+
+
+class BudgetUsageTest(PusherTestCase):
+    def setUp(self):
+        super().setUp()
+        today = timezone.localdate()
+        self.budget = Budget.objects.create(pusher=self.pusher, name='food', alloc_amt=100,
+                                            pay_period='Weekly', pay_start=today - datetime.timedelta(days=20))
+
+    def spend(self, days_ago, amount, model=Expense, **fields):
+        timestamp = timezone.now() - datetime.timedelta(days=days_ago)
+        return model.objects.create(pusher=self.pusher, user=self.user, item='item', amount=amount, party='party',
+                                    category='groceries', budget=self.budget, timestamp=timestamp, **fields)
+
+    def usage(self):
+        response = self.client.get('/encapsulation/budget/usage/', {'pusher_key': self.pusher.key})
+        self.assertEqual(response.status_code, 200)
+        return response.data['budgets'][0]
+
+    def test_current_and_closed_periods(self):
+        self.spend(0, 30)
+        self.spend(1, 10, model=Bills, status='paid', due_date='2023-01-01')
+        self.spend(10, 25)
+        self.spend(30, 99)  # before pay_start
+
+        usage = self.usage()
+        self.assertEqual(usage['current']['spent'], decimal.Decimal('40.00'))
+        self.assertEqual(usage['current']['remaining'], decimal.Decimal('60.00'))
+        self.assertEqual([period['spent'] for period in usage['history']],
+                         [decimal.Decimal('0.00'), decimal.Decimal('25.00')])
+
+    def test_closed_periods_are_cached_until_written(self):
+        lunch = self.spend(10, 25)
+        dinner = self.spend(10, 5)
+        self.assertEqual(self.usage()['history'][-1]['spent'], decimal.Decimal('30.00'))
+
+        # changes made behind the app's back are not seen while the closed period is cached
+        Expense.objects.filter(id=dinner.id).update(amount=7)
+        self.assertEqual(self.usage()['history'][-1]['spent'], decimal.Decimal('30.00'))
+
+        # deleting through the API drops the cached periods of the budget
+        response = self.client.delete('/entity/?pusher_key=%s&type=expense&timestamp=%s' %
+                                      (self.pusher.key, lunch.timestamp.strftime('%Y-%m-%dT%H:%M:%S.%fZ')))
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.usage()['history'][-1]['spent'], decimal.Decimal('7.00'))
+
+    def test_cached_periods_are_shared_and_retired_by_writes(self):
+        self.spend(10, 25, model=Bills, status='paid', due_date='2023-01-01')
+        self.assertEqual(self.usage()['history'][-1]['spent'], decimal.Decimal('25.00'))
+        # in the cache every worker reads, not in this process
+        self.assertTrue(any(key.startswith(':1:closed_period:%d:' % self.budget.id)
+                            for key in caches[RESPONSE_CACHE_ALIAS]._cache))
+
+        # correcting a bill of a closed period moves the bill version on, so no worker reads the old total
+        response = self.client.patch('/entity/', {'pusher_key': self.pusher.key, 'type': 'bill',
+                                                  'data': {'item': 'item', 'due_date': '2023-01-01',
+                                                           'amount': '40.00'}}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.usage()['history'][-1]['spent'], decimal.Decimal('40.00'))
+
+
+class ForecastTest(PusherTestCase):
+    def forecast(self, **params):
+        response = self.client.get('/forecast/', {'pusher_key': self.pusher.key, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_monthly_subscriptions_and_unpaid_bills(self):
+        today = timezone.localdate()
+        Subscription.objects.create(pusher=self.pusher, item='rent', amount=1000, pay_period='Monthly',
+                                    start_date=today - datetime.timedelta(days=400), status='Active')
+        Subscription.objects.create(pusher=self.pusher, item='gym', amount=30, pay_period='Monthly',
+                                    start_date=today, status='cancelled')
+        Subscription.objects.create(pusher=self.pusher, item='odd', amount=5, pay_period='fortnightly',
+                                    start_date=today, status='active')
+        for status, amount in [('unpaid', 50), ('paid', 70)]:
+            Bills.objects.create(pusher=self.pusher, user=self.user, item='power', amount=amount, party='utility',
+                                 category='utilities', status=status, due_date=today + datetime.timedelta(days=3))
+
+        forecast = self.forecast(months=12)
+        self.assertEqual(sum(bucket['subscriptions'] for bucket in forecast['series']), 12000)
+        self.assertEqual(sum(bucket['bills'] for bucket in forecast['series']), 50)
+        self.assertEqual(forecast['total'], 12050)
+        self.assertEqual([error['item'] for error in forecast['errors']], ['odd'])
+
+    def test_weekly_buckets(self):
+        today = timezone.localdate()
+        Subscription.objects.create(pusher=self.pusher, item='paper', amount=2.5, pay_period='daily',
+                                    start_date=today - datetime.timedelta(days=3), status='active')
+
+        forecast = self.forecast(months=1, bucket='weekly')
+        self.assertEqual(forecast['series'][0]['start'], str(today))
+        self.assertEqual(forecast['series'][0]['subscriptions'], 17.5)
+        days = (datetime.date.fromisoformat(forecast['end']) - today).days
+        self.assertEqual(forecast['total'], days * 2.5)
+
+    def test_bad_bucket(self):
+        response = self.client.get('/forecast/', {'pusher_key': self.pusher.key, 'bucket': 'hourly'})
+        self.assertEqual(response.status_code, 400)
+
+
+class BenchmarkScenarioTest(PusherTestCase):
+    def setUp(self):
+        super().setUp()
+        self.fixture = seed_benchmark_data(rows=20)
+
+    def send(self, request):
+        method, url, body, headers = encode_request(request)
+        extra = {'HTTP_AUTHORIZATION': headers['Authorization']} if 'Authorization' in headers else {}
+        return Client().generic(method, url, body, headers.get('Content-Type', 'application/octet-stream'), **extra)
+
+    def test_every_route_has_a_scenario(self):
+        paths = {build(self.fixture, next(self.fixture['sequence']))['path'] for name, kind, build in SCENARIOS}
+        routes = {'/' + str(pattern.pattern) for pattern in urlpatterns if '<' not in str(pattern.pattern)}
+        self.assertEqual(routes - paths, set())
+
+    def test_scenarios_succeed(self):
+        for name, kind, build in SCENARIOS:
+            with self.subTest(name):
+                response = self.send(build(self.fixture, next(self.fixture['sequence'])))
+                self.assertLess(response.status_code, 400)
+
+    def test_removal(self):
+        builds = {name: build for name, kind, build in SCENARIOS}
+        self.send(builds['POST /pusher/new/'](self.fixture, 0))
+        remove_benchmark_data(self.fixture)
+        self.assertFalse(User.objects.filter(username__contains=self.fixture['suffix']).exists())
+        self.assertFalse(Expense.objects.filter(pusher=self.fixture['pusher']).exists())
+
+
+class SyntheticDataTest(TestCase):
+    def generate(self, prefix, seed=3):
+        generator = SyntheticData(seed, batch_size=100, end=datetime.date(2024, 6, 30))
+        pusher, users = generator.pusher(prefix, users=2, years=1, expenses=30, incomes=4, bills=3, value_hours=48)
+        return generator, pusher, users
+
+    def test_seeded_runs_match(self):
+        _, first, _ = self.generate('first')
+        _, second, _ = self.generate('second')
+        for model in [Expense, Income, Bills]:
+            rows = [list(model.objects.filter(pusher=pusher).order_by('timestamp', 'id')
+                         .values_list('timestamp', 'amount', 'category')) for pusher in [first, second]]
+            self.assertEqual(rows[0], rows[1])
+
+        _, other, _ = self.generate('other', seed=4)
+        self.assertNotEqual(list(Expense.objects.filter(pusher=first).values_list('amount', flat=True)),
+                            list(Expense.objects.filter(pusher=other).values_list('amount', flat=True)))
+
+    def test_timestamps_are_unique_per_pusher(self):
+        for seed in range(5):
+            generator = SyntheticData(seed, batch_size=100, end=datetime.date(2024, 6, 30))
+            pusher, _ = generator.pusher('unique %d' % seed, users=4, years=1, expenses=30, incomes=4, bills=14,
+                                         value_hours=48)
+            for model in [Expense, Income, Paycheck, Bills]:
+                rows = model.objects.filter(pusher=pusher)
+                self.assertEqual(rows.values('timestamp').distinct().count(), rows.count())
+
+    def test_volumes_and_consistency(self):
+        generator, pusher, users = self.generate('volume')
+        self.assertEqual(generator.counts['Expense'], 30 * 12)
+        self.assertEqual(generator.counts['Income'], 4 * 12)
+        self.assertEqual(PusherAccess.objects.filter(pusher=pusher).count(), 2)
+        self.assertEqual(users[0], pusher.primaryUser)
+
+        # the running net worth is the sum of the latest balances, and the last point of its history
+        pusher.refresh_from_db()
+        balances = Account.objects.filter(pusher=pusher).aggregate(total=Sum('cur_value'))['total']
+        self.assertEqual(pusher.net_worth, balances)
+        self.assertEqual(ExpNetWorth.objects.filter(pusher=pusher).order_by('-timestamp').first().amount, balances)
+
+        # rollups match the raw rows
+        rollups = SpendingRollup.objects.filter(pusher=pusher, entity_type='expense').aggregate(total=Sum('total'))
+        expenses = Expense.objects.filter(pusher=pusher).aggregate(total=Sum('amount'))
+        self.assertEqual(rollups['total'], expenses['total'])